@@ -0,0 +1,386 @@
+"""Parser for the model's {message, action/actions} JSON replies.
+
+The model is asked for bare JSON but sometimes wraps it in prose or code fences,
+stops mid-object, or invents actions. `parse_reply()` scans the output once and
+takes the first top-level JSON object. A truncated object is closed off rather
+than thrown away. Actions are checked against ACTION_SCHEMAS, the same list the
+system prompt in prompts.py gives the model. `MessageEmitter` is the streaming
+side: it yields the "message" value as it arrives.
+"""
+
+import json
+import re
+
+# Field specs: 'str' | 'num' | 'bool' | 'date' | 'dict', or a tuple of allowed
+# strings. A trailing '?' (or None in a tuple) also allows null. Fields not
+# listed are passed through untouched.
+ACTION_SCHEMAS = {
+    "ADD_DEADLINE": {
+        "fields": {"title": "str", "subject": "str?", "dueDate": "date?", "startDate": "date?",
+                   "type": ("assignment", "exam", "project", "job_application", None),
+                   "askingForStartDate": "bool?"},
+        "required": ("title",),
+    },
+    "UPDATE_DEADLINE": {"fields": {"id": "str", "updates": "dict"}, "required": ("id", "updates")},
+    "COMPLETE_DEADLINE": {"fields": {"id": "str?", "title": "str?"}, "any_of": ("id", "title")},
+    "DELETE_DEADLINE": {"fields": {"id": "str"}, "required": ("id",)},
+    "ADD_NOTE": {"fields": {"text": "str", "date": "date?"}, "required": ("text",)},
+    "DELETE_NOTE": {"fields": {"id": "str"}, "required": ("id",)},
+    "LOG_GYM": {"fields": {"date": "date", "didGo": "bool"}, "required": ("date", "didGo")},
+    "LOG_PERIOD_START": {"fields": {"date": "date"}, "required": ("date",)},
+    "LOG_PERIOD_END": {"fields": {"startDate": "date?", "endDate": "date?"}},
+    "GET_CYCLE_PREDICTION": {"fields": {}},
+    "ADD_STUDY_TASK": {
+        "fields": {"subject": "str", "task": "str", "startDate": "date?", "endDate": "date?"},
+        "required": ("subject", "task"),
+    },
+    "COMPLETE_STUDY_TASK": {"fields": {"subject": "str", "id": "str"}, "required": ("subject", "id")},
+    "REMOVE_STUDY_TASK": {"fields": {"subject": "str", "id": "str"}, "required": ("subject", "id")},
+    "ADD_TOPIC": {"fields": {"subject": "str"}, "required": ("subject",)},
+    "COMPLETE_TOPIC": {"fields": {"subject": "str", "topic": "str"}, "required": ("subject", "topic")},
+    "LOG_DAILY_PROGRESS": {"fields": {"summary": "str", "date": "date?"}, "required": ("summary",)},
+    "START_QUIZ": {
+        "fields": {"quizType": ("leetcode", "subject", "mixed", None), "count": "num?", "subject": "str?"},
+    },
+    "GRADE_QUIZ": {"fields": {"score": "num", "total": "num", "subject": "str?"}, "required": ("score", "total")},
+    "ADD_SUBJECT": {"fields": {"subject": "str"}, "required": ("subject",)},
+    "REMOVE_SUBJECT": {"fields": {"subject": "str"}, "required": ("subject",)},
+    "SET_BALANCE": {"fields": {"amount": "num"}, "required": ("amount",)},
+    "ADD_TRANSACTION": {
+        "fields": {"amount": "num", "description": "str?", "type": ("expense", "income", None), "date": "date?"},
+        "required": ("amount",),
+    },
+    "ADD_SPLITWISE": {"fields": {"amount": "num", "description": "str?", "date": "date?"}, "required": ("amount",)},
+    "COMPLETE_SPLITWISE": {"fields": {"id": "str?", "description": "str?"}, "any_of": ("id", "description")},
+}
+
+# Shown when the model sent actions but no message to go with them
+DEFAULT_CONFIRMATION = "Done! ✅"
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_MISSING = object()
+
+
+def _coerce(value, spec):
+    """Value conforming to `spec`, or _MISSING if it can't be made to."""
+    if isinstance(spec, tuple):
+        if value is None and None in spec:
+            return None
+        if isinstance(value, str) and value.lower() in spec:
+            return value.lower()
+        return _MISSING
+
+    nullable = spec.endswith('?')
+    kind = spec.rstrip('?')
+    if value is None or (value == '' and kind != 'str'):
+        return None if nullable else _MISSING
+
+    if kind == 'str':
+        return str(value) if isinstance(value, (str, int, float)) and not isinstance(value, bool) else _MISSING
+    if kind == 'num':
+        if isinstance(value, bool):
+            return _MISSING
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return float(str(value).replace('$', '').replace(',', '').strip())
+        except ValueError:
+            return _MISSING
+    if kind == 'bool':
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        return _MISSING
+    if kind == 'date':
+        return value[:10] if isinstance(value, str) and _DATE.match(value) else _MISSING
+    if kind == 'dict':
+        return value if isinstance(value, dict) else _MISSING
+    return value
+
+
+def validate_action(action):
+    """Normalized copy of `action`, or None if the client couldn't execute it."""
+    if not isinstance(action, dict) or not isinstance(action.get('type'), str):
+        return None
+    action_type = action['type'].strip().upper()
+    schema = ACTION_SCHEMAS.get(action_type)
+    if schema is None:
+        return None
+    data = action.get('data')
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return None
+
+    clean = dict(data)
+    for field, spec in schema["fields"].items():
+        if field not in clean:
+            continue
+        value = _coerce(clean[field], spec)
+        if value is _MISSING:
+            if field in schema.get("required", ()):
+                return None
+            del clean[field]
+        else:
+            clean[field] = value
+
+    if any(clean.get(f) in (None, '') for f in schema.get("required", ())):
+        return None
+    if "any_of" in schema and not any(clean.get(f) not in (None, '') for f in schema["any_of"]):
+        return None
+    return {"type": action_type, "data": clean}
+
+
+def scan_objects(text):
+    """Yield (start, end, complete) for each top-level {...} span in `text`, in one pass.
+
+    Text outside braces is skipped, so quotes in surrounding prose don't confuse the
+    scanner. An object still open at the end is yielded with complete=False.
+    """
+    depth = 0
+    start = None
+    in_str = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if depth == 0:
+            if ch == '{':
+                depth, start = 1, i
+            continue
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in '{[':
+            depth += 1
+        elif ch in '}]':
+            depth -= 1
+            if depth == 0:
+                yield start, i + 1, True
+    if depth > 0:
+        yield start, len(text), False
+
+
+def close_partial(fragment):
+    """Best-effort completion of a truncated JSON object (close strings and brackets)."""
+    stack = []
+    in_str = False
+    escaped = False
+    for ch in fragment:
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]' and stack:
+            stack.pop()
+
+    out = fragment
+    if escaped:
+        out = out[:-1]
+    if in_str:
+        out += '"'
+    # Drop a dangling separator or a key with no value yet
+    out = re.sub(r'(,\s*"[^"]*"\s*:?|,|:)\s*$', '', out.rstrip())
+    return out + ''.join(reversed(stack))
+
+
+def extract_json_object(text):
+    """First top-level JSON object in `text`: (obj, start, end), or (None, -1, -1)."""
+    for start, end, complete in scan_objects(text):
+        fragment = text[start:end]
+        try:
+            obj = json.loads(fragment if complete else close_partial(fragment))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(obj, dict):
+            return obj, start, end
+    return None, -1, -1
+
+
+def _strip_fences(text):
+    return re.sub(r"```(?:json)?", "", text).strip()
+
+
+def parse_reply(text):
+    """Turn raw model output into the {message, action} contract handleAction expects.
+
+    Invalid actions are dropped (and logged) rather than failing the whole reply.
+    """
+    text = text or ""
+    obj, start, end = extract_json_object(text)
+    if obj is None:
+        return {"message": _strip_fences(text), "action": None}
+
+    result = {"message": obj.get('message'), "action": None}
+    dropped = []
+
+    if obj.get('action') is not None:
+        action = validate_action(obj['action'])
+        if action:
+            result["action"] = action
+        else:
+            dropped.append(obj['action'])
+
+    if isinstance(obj.get('actions'), list):
+        actions = []
+        for raw in obj['actions']:
+            action = validate_action(raw)
+            if action:
+                actions.append(action)
+            else:
+                dropped.append(raw)
+        if actions:
+            result["actions"] = actions
+
+    message = result["message"]
+    if not isinstance(message, str) or not message.strip():
+        # Prose around the object first; then a plain confirmation if there is something
+        # to do, else the raw reply, so the user never gets an empty bubble
+        message = _strip_fences(text[:start] + text[end:])
+        if not message:
+            message = DEFAULT_CONFIRMATION if result["action"] or result.get("actions") else _strip_fences(text)
+        result["message"] = message
+
+    if dropped:
+        print(f"⚠️ Dropped {len(dropped)} invalid action(s): {json.dumps(dropped)[:200]}")
+    return result
+
+
+class MessageEmitter:
+    """Streams the top-level "message" string out of a JSON reply while it is generated.
+
+    feed() returns whatever new message text became available. Structure is
+    tracked char by char, so a "message" key nested in an action or inside
+    another string is ignored. Escapes split across chunks are held back until
+    the rest arrives. `buffer` holds the full raw output for parse_reply().
+    """
+
+    ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._str_start = 0
+        self._expect_key = False
+        self._key = None
+        self._after_colon = False
+        self._capturing = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.done:
+            return ""
+        out = []
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf) and not self.done:
+            ch = buf[i]
+
+            if self._capturing:
+                if ch == '"':
+                    self._capturing = False
+                    self.done = True
+                    i += 1
+                    break
+                if ch == '\\':
+                    decoded, used = self._escape(buf, i)
+                    if used == 0:
+                        break  # wait for the rest of the escape
+                    out.append(decoded)
+                    i += used
+                    continue
+                out.append(ch)
+                i += 1
+                continue
+
+            if self._in_str:
+                if ch == '\\':
+                    if i + 1 >= len(buf):
+                        break
+                    i += 2
+                    continue
+                if ch == '"':
+                    self._in_str = False
+                    if self._depth == 1 and self._expect_key:
+                        self._key = buf[self._str_start:i]
+                        self._expect_key = False
+                i += 1
+                continue
+
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                    self._expect_key = True
+            elif ch == '"':
+                if self._depth == 1 and self._after_colon and self._key == 'message':
+                    self._capturing = True
+                else:
+                    self._in_str = True
+                    self._str_start = i + 1
+                self._after_colon = False
+            elif ch in '{[':
+                self._depth += 1
+                self._after_colon = False
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True  # top-level object ended without a string message
+            elif self._depth == 1:
+                if ch == ':':
+                    self._after_colon = True
+                elif ch == ',':
+                    self._expect_key = True
+                    self._key = None
+                elif not ch.isspace() and self._after_colon and self._key == 'message':
+                    self.done = True  # message is null / not a string
+            i += 1
+
+        self._pos = i
+        return ''.join(out)
+
+    def _escape(self, buf, i):
+        """(decoded text, chars consumed) for the escape at buf[i], or ('', 0) if incomplete."""
+        if i + 1 >= len(buf):
+            return '', 0
+        esc = buf[i + 1]
+        if esc != 'u':
+            return self.ESCAPES.get(esc, esc), 2
+        if i + 6 > len(buf):
+            return '', 0
+        try:
+            code = int(buf[i + 2:i + 6], 16)
+        except ValueError:
+            return '', 6
+        if 0xD800 <= code < 0xDC00:
+            # High surrogate: needs its low half before it can be emitted
+            if i + 8 > len(buf):
+                return '', 0
+            if buf[i + 6:i + 8] != '\\u':
+                return '', 6
+            if i + 12 > len(buf):
+                return '', 0
+            try:
+                low = int(buf[i + 8:i + 12], 16)
+            except ValueError:
+                return '', 6
+            if 0xDC00 <= low < 0xE000:
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+            return '', 6
+        return chr(code), 6
@@ -1,16 +1,31 @@
 import os
 import json
 import requests
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
-from openai import OpenAI
-from datetime import datetime
+import openai
+from datetime import datetime, timedelta, timezone
 from supabase_client import (
-    log_period_start, log_period_end, get_period_history,
-    calculate_cycle_stats, predict_cycle_phases,
-    save_user_data, get_all_user_data
+    log_period_start, log_period_end, log_periods_bulk, get_period_history, MAX_BULK_PERIODS,
+    calculate_cycle_stats, predict_cycle_phases, predict_cycle_phase_range,
+    save_user_data, get_all_user_data, parse_timestamp, save_push_subscription, delete_push_subscription,
+    append_chat_messages, get_chat_messages, CHAT_PAGE_SIZE,
+    supabase as supabase_db
 )
+import assets
+import http_pool
+import jobs
+import metrics
+import intents
+import model_router
+import llm_client
+import user_context
+import reminders
+from action_parser import parse_reply, MessageEmitter
+from prompts import build_system_prompt, build_history_messages, prompt_token_report
+from leetcode_client import LeetCodeStatsCache, UserNotFound
+from quiz_pool import QuizPool, pool_key, split_questions, join_questions
 
 load_dotenv()
 
@@ -18,239 +33,116 @@ app = Flask(__name__)
 CORS(app)
 
 # --- CONFIGURATION & LOGGING ---
+# OpenAI-compatible endpoint; override to point at a local stand-in (see benchmark.py)
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+
 print("\n--- Aria Boot Sequence ---")
 grok_key = os.environ.get("GROK_API_KEY")
 gemini_key = os.environ.get("GEMINI_API_KEY")
 
+endpoints = []
 if grok_key:
     print(f"📡 Found GROK_API_KEY (prefix: {grok_key[:6]}...)")
-    api_key = grok_key
-elif gemini_key:
-    print(f"📡 Found GEMINI_API_KEY (prefix: {gemini_key[:6]}...)")
-    api_key = gemini_key
-else:
-    print("❌ CRITICAL: No API key found in Environment Variables!")
-    api_key = None
-
-client = None
-if api_key:
     try:
-        client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.groq.com/openai/v1",
-        )
+        endpoints.append(llm_client.Endpoint("groq", llm_client.make_client(grok_key, LLM_BASE_URL, "groq")))
         print("✅ OpenAI client initialized for Groq")
     except Exception as e:
         print(f"❌ Failed to initialize OpenAI client: {e}")
-else:
-    print("⚠️ Client NOT initialized - API key missing")
-
-print("--- End Boot Sequence ---\n")
-
-
-def build_system_prompt(context):
-    user_name = context.get('userName', 'friend')
-    subjects = context.get('subjects', [])
-    deadlines = context.get('deadlines', [])
-    topics = context.get('topics', {})
-    gym = context.get('gym', {})
-    period_ctx = context.get('periodContext', {})
-    notes = context.get('notes', [])
-    quiz_history = context.get('quizHistory', [])
-    is_pms_week = context.get('isPmsWeek', False)
-    in_quiz = context.get('inQuiz', False)
-    today = context.get('today', datetime.now().strftime('%Y-%m-%d'))
-    pending_deadline = context.get('pendingDeadline', None)
-    balance = context.get('balance', 0)
-    splitwise = context.get('splitwiseReminders', [])
-
-    pms_instruction = ""
-    if is_pms_week:
-        pms_instruction = (
-            "\n\U0001f338 IMPORTANT: The user is likely in their PMS week. "
-            "Be extra gentle, warm, and supportive. Avoid pushy or critical tone."
-        )
-
-    pending_instruction = ""
-    if pending_deadline:
-        pending_instruction = (
-            f"\n\u26a1 PENDING DEADLINE: You asked for a start date for: "
-            f"{json.dumps(pending_deadline)}. The user's next message likely contains the start date. "
-            "Extract the date and return the complete ADD_DEADLINE action with askingForStartDate: false."
-        )
-
-    quiz_instruction = ""
-    if in_quiz:
-        quiz_instruction = (
-            "\n\U0001f4dd QUIZ IN PROGRESS: You are mid-quiz. Grade the user's last answer, "
-            "give brief feedback, then present the next question. When all questions are answered, "
-            "give a friendly score summary and return the GRADE_QUIZ action."
-        )
-
-    deadlines_str = json.dumps(deadlines, indent=2) if deadlines else "None"
-    topics_str = json.dumps(topics, indent=2) if topics else "None"
-    notes_list = '; '.join([n.get('text', '') for n in notes[:10]]) if notes else "None"
-    splitwise_str = json.dumps([s for s in splitwise if s.get('status') == 'pending'], indent=2) if splitwise else "None"
-    
-    # Format period information
-    period_str = ""
-    if period_ctx:
-        period_str = f"""Cycle length: {period_ctx.get('avg_cycle_length', 28)} days
-Last period: {period_ctx.get('last_period_start', 'N/A')}
-Next predicted period: {period_ctx.get('predicted_next_period', 'N/A')}
-Current phase: {period_ctx.get('phase', 'Unknown')}"""
-    else:
-        period_str = "No cycle data yet"
+if gemini_key:
+    print(f"📡 Found GEMINI_API_KEY (prefix: {gemini_key[:6]}...)")
 
-    return f"""You are Aria, a warm, witty, and smart personal AI assistant. You are talking to {user_name}.
+fallback = llm_client.fallback_endpoint()
+if fallback:
+    endpoints.append(fallback)
+    print(f"✅ Fallback LLM endpoint: {fallback.base_url} (model: {fallback.model})")
 
-YOUR PERSONALITY:
-- Always address the user as "{user_name}" naturally (not in every sentence — just occasionally)
-- Warm, friendly, slightly witty — like a brilliant best friend, not a robot
-- Encouraging but will gently call out procrastination
-- Use emojis occasionally (1-2 per message max)
-- Keep responses SHORT and punchy unless detail is needed
-- If user asks "what should I focus on today" → give a prioritized, actionable answer based on deadlines{pms_instruction}{pending_instruction}{quiz_instruction}
+api_key = grok_key or llm_client.LLM_FALLBACK_API_KEY
+if not api_key:
+    print("❌ CRITICAL: No API key found in Environment Variables!")
 
-TODAY'S DATE: {today}
+# `client` is the first configured endpoint's raw SDK client; `llm` wraps all of them
+client = endpoints[0].client if endpoints else None
+llm = llm_client.ResilientLLM(endpoints) if endpoints else None
+if not client:
+    print("⚠️ Client NOT initialized - API key missing")
 
-CURRENT USER DATA:
-- Name: {user_name}
-- Subjects: {', '.join(subjects) if subjects else 'Not set'}
-- LeetCode username: {context.get('leetcodeUsername', 'Not set')}
-- Deadlines: {deadlines_str}
-- Topics: {topics_str}
-- Gym: streak={gym.get('currentStreak', 0)} days, best={gym.get('bestStreak', 0)} days, this week={gym.get('thisWeek', 0)} days
-- Period & Cycle: {period_str}
-- Notes: {notes_list}
-- Quiz sessions completed: {len(quiz_history)}
-- Current Balance: ${balance}
-- Pending Splitwise Items: {splitwise_str}
+# Server-sent reminders read subscriptions and deadlines from Supabase
+if supabase_db:
+    reminders.scheduler.start()
+    print(f"🔔 Reminders enabled (sender: {reminders.PUSH_SENDER}, VAPID key {'set' if reminders.VAPID_PUBLIC_KEY else 'missing'})")
 
-WHAT YOU CAN DO:
-1. DEADLINES — add/update/complete/list deadlines from natural language
-2. STUDY TOPICS — track topic plans and completions per subject
-3. GYM — log gym visits/skips, analyze streaks
-4. PERIOD & CYCLE — log start/end dates, predict next period, track phases (follicular/ovulation/luteal/PMS)
-5. DAILY WRAP-UP — ask what they accomplished, then log it
-6. QUIZ — generate questions and grade answers conversationally
-7. NOTES — save and recall quick notes
-8. FINANCES — log balance, track expenses/income, manage splitwise reminders
-9. MILESTONES — break down major projects (e.g. Dissertation) into multiple deadlines with the same 'subject'.
-10. GENERAL — study advice, focus recommendations, accountability
+assets_info = assets.manifest.summary()
+print(f"📦 Static assets: {assets_info['files']} files, {assets_info['bytes'] // 1024} KB "
+      f"→ {assets_info['compressed_bytes'] // 1024} KB {'brotli' if assets_info['brotli'] else 'gzip'}")
+app.add_template_global(assets.asset_url)
 
-STRATEGY FOR PROJECTS:
-- When a user adds a large project (like a dissertation or thesis), suggest breaking it down into 3-5 milestones or "reports".
-- Each milestone should be added as a separate ADD_DEADLINE action with the same 'subject' (e.g., 'Dissertation').
-- This ensures they stay grouped together in the user's view.
-
-CRITICAL: YOUR RESPONSE FORMAT
-You MUST ALWAYS respond with ONLY valid JSON. No text before or after. No markdown fences.
-
-{{"message": "Your natural language response", "action": null}}
-
-{{"message": "Your natural language response", "action": {{"type": "ACTION_TYPE", "data": {{}}}}}}
-
-OR with multiple actions:
-
-{{"message": "Your natural language response", "actions": [ {{"type": "ACTION_TYPE", "data": {{}}}}, {{"type": "ACTION_TYPE", "data": {{}}}} ]}}
-
-AVAILABLE ACTIONS AND DATA SCHEMAS:
-
-ADD_DEADLINE:
-  data: {{ "title": "str", "subject": "str", "dueDate": "YYYY-MM-DD", "startDate": "YYYY-MM-DD or null", "type": "assignment|exam|project|job_application", "askingForStartDate": true/false }}
-  RULE: If the user did NOT provide a start date, set startDate to null, askingForStartDate to true, and ASK for it in your message.
-  RULE: If they provided both dates, set askingForStartDate to false and save immediately.
-
-UPDATE_DEADLINE:
-  data: {{ "id": "str", "updates": {{ ... }} }}
-
-COMPLETE_DEADLINE:
-  data: {{ "id": "str", "title": "str" }}
-
-DELETE_DEADLINE:
-  data: {{ "id": "str" }}
-
-ADD_NOTE:
-  data: {{ "text": "str", "date": "YYYY-MM-DD or null" }}
-  RULE: If the user says "remind me on [date]" or "note for [date]", include that date. This helps items reflect on the calendar.
-
-DELETE_NOTE:
-  data: {{ "id": "str" }}
-
-LOG_GYM:
-  data: {{ "date": "YYYY-MM-DD", "didGo": true/false }}
-
-LOG_PERIOD_START:
-  data: {{ "date": "YYYY-MM-DD" }}
-
-LOG_PERIOD_END:
-  data: {{ "startDate": "YYYY-MM-DD", "endDate": "YYYY-MM-DD" }}
-
-GET_CYCLE_PREDICTION:
-  data: {{ "action": "predict" }}
-
-ADD_STUDY_TASK:
-  data: {{ "subject": "str", "task": "str", "startDate": "YYYY-MM-DD|null", "endDate": "YYYY-MM-DD|null" }}
-  RULE: If user mentions a sub-task/report/deadline for a subject, use this.
-
-COMPLETE_STUDY_TASK:
-  data: {{ "subject": "str", "id": "str" }}
-
-REMOVE_STUDY_TASK:
-  data: {{ "subject": "str", "id": "str" }}
-
-LOG_DAILY_PROGRESS:
-  data: {{ "summary": "str", "date": "YYYY-MM-DD" }}
-
-START_QUIZ:
-  data: {{ "quizType": "leetcode|subject|mixed", "count": 5, "subject": "optional str" }}
-  NOTE: Use this ONLY for the initial quiz request. The quiz questions will be fetched separately.
-
-GRADE_QUIZ:
-  data: {{ "score": int, "total": int, "subject": "str" }}
-
-ADD_SUBJECT:
-  data: {{ "subject": "str" }}
-
-REMOVE_SUBJECT:
-  data: {{ "subject": "str" }}
-
-SET_BALANCE:
-  data: {{ "amount": float }}
-  RULE: Use when user states their current total balance
-
-ADD_TRANSACTION:
-  data: {{ "amount": float, "description": "str", "type": "expense|income", "date": "YYYY-MM-DD or null" }}
+print("--- End Boot Sequence ---\n")
 
-ADD_SPLITWISE:
-  data: {{ "amount": float, "description": "str", "date": "YYYY-MM-DD or null" }}
+quiz_pool = QuizPool()
+leetcode_cache = LeetCodeStatsCache()
 
-COMPLETE_SPLITWISE:
-  data: {{ "id": "str", "description": "str" }}
 
-RULES:
-1. Return ONLY valid JSON — nothing else ever
-2. Make "message" warm, natural, conversational
-3. Never fabricate deadline data — only use what's in CURRENT USER DATA
-4. For "daily wrapup" → first ask what they accomplished (action: null), THEN when they tell you, return LOG_DAILY_PROGRESS
-5. Parse natural dates intelligently: "next friday", "in 2 weeks", "april 2nd" → YYYY-MM-DD based on today={today}
-6. When listing deadlines, format them nicely in the message text (not raw JSON)
-7. If the user marks a deadline complete, find its ID from the deadlines list and use COMPLETE_DEADLINE
-8. For Finance: parse implicit money updates, e.g. "I spent $20 on groceries" triggers ADD_TRANSACTION. Include the date if specified.
-9. If user says they added something to Splitwise, find it in Pending Splitwise Items and trigger COMPLETE_SPLITWISE
-10. STUDY HUB: This is for tracking academic tasks (reports, labs, study sessions) with specific dates. If the user mentions a task for a subject (e.g. "Data Mining: Report, March 16"), ALWAYS trigger ADD_STUDY_TASK.
-11. PROACTIVE STUDY CHECK-IN: If `startDate` < {today} < `endDate` for a task in STUDY HUB, ask about progress.
-12. FOR STUDY/HOMEWORK/ASSIGNMENTS: Prefer ADD_STUDY_TASK over ADD_DEADLINE if it's related to a course subject.
-13. For PERIOD TRACKING: Use LOG_PERIOD_START/END actions.
-14. CYCLE PREDICTION: Use GET_CYCLE_PREDICTION action.
-15. CALENDAR: Ensure ALL dates use YYYY-MM-DD for consistency.
-16. SUBJECT AUTOMATION: Adding a study task automatically creates or updates the subject across all views.
-17. PERFORMANCE: Keep messages concise and direct. Do not repeat user data unnecessarily.
-"""
 @app.route('/')
 def index():
-    return render_template('index.html')
+    response = app.make_response(render_template('index.html'))
+    # The page names the current asset hashes, so it must be revalidated on every visit
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    return assets.serve(filename)
+
+
+@app.route('/service-worker.js')
+def service_worker():
+    # Served from the root so its scope covers the whole app; never cached so updates are picked up
+    response = Response(assets.service_worker_script(), mimetype='text/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.before_request
+def start_trace():
+    metrics.begin_trace()
+
+
+def record_trace(endpoint, method, status):
+    """Close the current trace: one request-duration sample plus a ⏱️ log line with its spans."""
+    trace = metrics.end_trace()
+    if trace is None:
+        return
+    total, spans = trace
+    metrics.observe('aria_http_request_duration_seconds', total,
+                    endpoint=endpoint, method=method, status=status)
+    if spans:
+        print(f"⏱️ {method} {endpoint} {status} {metrics.format_trace(total, spans)}")
+
+
+@app.after_request
+def add_server_timing(response):
+    spans = metrics.current_spans()
+    if spans:
+        response.headers['Server-Timing'] = metrics.server_timing(spans)
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    method, status = request.method, response.status_code
+    if response.is_streamed:
+        # The body (and its LLM spans) runs after the view returns; close the trace once it's sent
+        g.trace_deferred = True
+        response.call_on_close(lambda: record_trace(endpoint, method, status))
+    else:
+        g.trace = (endpoint, method, status)
+    return response
+
+
+@app.teardown_request
+def finish_trace(exc):
+    if g.get('trace_deferred'):
+        return
+    endpoint, method, status = g.get('trace') or (
+        request.url_rule.rule if request.url_rule else 'unmatched', request.method, 500)
+    record_trace(endpoint, method, status)
 
 
 @app.route('/api/health', methods=['GET'])
@@ -263,6 +155,81 @@ def health():
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms and token counters in Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+MISSING_KEY_REPLY = {
+    "message": "⚠️ I'm missing my API key on Render. Please double check that GROK_API_KEY is added to your Environment Variables in the Render dashboard.",
+    "action": None
+}
+
+
+def fast_path_reply(message, context):
+    """Reply for a one-line command handled by the intent rules, or None to ask the LLM."""
+    matched = intents.match(message, context)
+    if not matched:
+        return None
+    name, reply = matched
+    metrics.inc('aria_intent_fastpath_total', intent=name)
+    print(f"⚡ Fast path: {name}")
+    return reply
+
+
+def resolve_chat_context(data):
+    """Context for a chat request.
+
+    Clients either post the full `context`, or just `syncKey` + `contextVersion` +
+    `live` fields and let the server use its snapshot of their synced data.
+    Returns None when that snapshot isn't available; the client then resends
+    the full context.
+    """
+    if data.get('context'):
+        return data['context']
+    sync_key = data.get('syncKey')
+    if not sync_key:
+        return {}
+    snapshot = user_context.get_snapshot(sync_key, data.get('contextVersion'))
+    if snapshot is None:
+        return None
+    return snapshot.render(data.get('live') or {})
+
+
+NEED_CONTEXT_REPLY = {"error": "No server-side context for this syncKey; send the full context", "needContext": True}
+
+
+def build_chat_messages(context, message, chat_history):
+    """Build the message list sent to Groq for a chat turn."""
+    return (
+        [{"role": "system", "content": build_system_prompt(context, message)}]
+        + build_history_messages(chat_history, message)
+        + [{"role": "user", "content": message}]
+    )
+
+
+@app.route('/api/jobs', methods=['GET'])
+def jobs_stats():
+    """Background job queue depth per worker."""
+    return jsonify(jobs.stats())
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status of a recent background job (e.g. the `job` id returned by /api/sync/push)."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job id"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/http/pools', methods=['GET'])
+def http_pools():
+    """Per-upstream outbound connection pool statistics."""
+    return jsonify(http_pool.pool_stats())
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
@@ -271,74 +238,49 @@ def chat():
             return jsonify({"error": "No data provided"}), 400
 
         message = data.get('message', '')
-        context = data.get('context', {})
         chat_history = data.get('chatHistory', [])
+        with metrics.span('context'):
+            context = resolve_chat_context(data)
+        if context is None:
+            return jsonify(NEED_CONTEXT_REPLY), 409
 
         print(f"📩 Incoming /api/chat request: {len(message)} chars from {context.get('userName', 'unknown')}")
-        
-        if not client:
-            print("❌ Request failed: Client NOT initialized")
-            return jsonify({
-                "message": "⚠️ I'm missing my API key on Render. Please double check that GROK_API_KEY is added to your Environment Variables in the Render dashboard.",
-                "action": None
-            })
 
-        # Mock responses for Finance testing
-        user_msg = message.lower()
-        if "balance" in user_msg and "500" in user_msg:
-            return jsonify({
-                "message": "Got it! I've set your balance to $500.00.",
-                "action": {"type": "SET_BALANCE", "data": {"amount": 500}}
-            })
-        elif "groceries" in user_msg and "23" in user_msg:
-            return jsonify({
-                "message": "Ouch, groceries are expensive. I've logged the $23.00 expense for you!",
-                "action": {"type": "ADD_TRANSACTION", "data": {"amount": 23, "description": "groceries", "type": "expense"}}
-            })
-        elif "pizza" in user_msg and "splitwise" in user_msg and "15" in user_msg:
-            return jsonify({
-                "message": "Yum, pizza! I've added a $15.00 reminder for Splitwise.",
-                "action": {"type": "ADD_SPLITWISE", "data": {"amount": 15, "description": "pizza tonight"}}
-            })
-
-        system_prompt = build_system_prompt(context)
+        # Deterministic one-liners never need the model (and work without an API key)
+        fast = fast_path_reply(message, context)
+        if fast:
+            return jsonify(fast)
 
-        # Build conversation history
-        history_text = ""
-        for msg in chat_history[-20:]:
-            role = "User" if msg.get('role') == 'user' else "Aria"
-            history_text += f"\n{role}: {msg.get('content', '')}"
+        if not client:
+            print("❌ Request failed: Client NOT initialized")
+            return jsonify(MISSING_KEY_REPLY)
 
-        # Create the full prompt with history
-        full_prompt = f"{system_prompt}\n\n--- CONVERSATION HISTORY ---{history_text}\n\n--- NEW MESSAGE ---\nUser: {message}"
+        with metrics.span('prompt_build'):
+            messages = build_chat_messages(context, message, chat_history)
 
-        print(f"🤖 Calling Groq API (model: llama-3.3-70b-versatile)...")
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ]
-        )
+        route = model_router.route(message, context)
+        print(f"🤖 Calling Groq API (model: {route.model}, {route.tier}/{route.reason})...")
+        with model_router.timed(route):
+            response = llm.create(model=route.model, messages=messages)
         text = response.choices[0].message.content
+        metrics.record_llm_usage(response.model or route.model, getattr(response, 'usage', None))
         print(f"✅ Groq responded successfully ({len(text)} chars)")
 
-        if '```json' in text:
-            text = text.split('```json')[1].split('```')[0].strip()
-        elif '```' in text:
-            text = text.split('```')[1].split('```')[0].strip()
+        report = prompt_token_report(context, getattr(response, 'usage', None), message,
+                                     system_prompt=messages[0]['content'])
+        print(f"🧮 Prompt: {report['static_tokens']} static + {report['context_tokens']} context tokens "
+              f"(provider cached: {report.get('provider_cached_tokens', 'n/a')})")
 
-        try:
-            result = json.loads(text)
-            if 'message' not in result:
-                result['message'] = text
-            if 'action' not in result:
-                result['action'] = None
-        except json.JSONDecodeError:
-            result = {"message": text, "action": None}
-
-        return jsonify(result)
+        with metrics.span('parse'):
+            reply = parse_reply(text)
+        return jsonify(reply)
 
+    except llm_client.LLMError as e:
+        print(f"⚠️ LLM unavailable in /api/chat: {e}")
+        resp = jsonify(llm_error_reply(e))
+        if e.retry_after:
+            resp.headers['Retry-After'] = str(int(e.retry_after + 0.999))
+        return resp, e.status if e.status in (429, 502, 504) else 503
 
     except Exception as e:
         print(f"🔥 UNHANDLED ERROR in /api/chat: {str(e)}")
@@ -350,71 +292,129 @@ def chat():
         }), 200
 
 
+def llm_error_reply(error):
+    """Chat reply for an LLMError, once retries and the fallback endpoint are exhausted."""
+    if error.status == 429:
+        wait = f" in {int(error.retry_after + 0.999)} seconds" if error.retry_after else " in a moment"
+        message = f"I'm getting a lot of requests right now 😅 Try again{wait}?"
+    else:
+        message = "I couldn't reach my brain just now 😅 Try again in a moment?"
+    return {"message": message, "action": None, "error": str(error)[:200]}
+
+
+def sse_event(event, payload):
+    """Format one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming variant of /api/chat.
+
+    Emits `delta` events carrying message text as Groq generates it, then a single
+    `done` event with the same {message, action/actions} payload /api/chat returns.
+    """
+    data = request.json
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    message = data.get('message', '')
+    chat_history = data.get('chatHistory', [])
+    with metrics.span('context'):
+        context = resolve_chat_context(data)
+    if context is None:
+        return jsonify(NEED_CONTEXT_REPLY), 409
+
+    print(f"📩 Incoming /api/chat/stream request: {len(message)} chars from {context.get('userName', 'unknown')}")
+
+    def generate():
+        try:
+            fast = fast_path_reply(message, context)
+            if fast:
+                yield sse_event('delta', {"text": fast['message']})
+                yield sse_event('done', fast)
+                return
+
+            if not client:
+                print("❌ Request failed: Client NOT initialized")
+                yield sse_event('done', MISSING_KEY_REPLY)
+                return
+
+            with metrics.span('prompt_build'):
+                messages = build_chat_messages(context, message, chat_history)
+
+            route = model_router.route(message, context)
+            print(f"🤖 Streaming from Groq API (model: {route.model}, {route.tier}/{route.reason})...")
+            emitter = MessageEmitter()
+            with model_router.timed(route):
+                stream = llm.create(model=route.model, messages=messages, stream=True)
+                for chunk in stream:
+                    if getattr(chunk, 'usage', None):
+                        metrics.record_llm_usage(route.model, chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    piece = chunk.choices[0].delta.content
+                    if not piece:
+                        continue
+                    text = emitter.feed(piece)
+                    if text:
+                        yield sse_event('delta', {"text": text})
+
+            print(f"✅ Groq stream finished ({len(emitter.buffer)} chars)")
+            with metrics.span('parse'):
+                reply = parse_reply(emitter.buffer)
+            yield sse_event('done', reply)
+
+        except llm_client.LLMError as e:
+            print(f"⚠️ LLM unavailable in /api/chat/stream: {e}")
+            yield sse_event('done', llm_error_reply(e))
+
+        except Exception as e:
+            print(f"🔥 UNHANDLED ERROR in /api/chat/stream: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            yield sse_event('done', {
+                "message": f"Hmm, something went wrong on my end 😅 Try again? (Error: {str(e)[:120]})",
+                "action": None
+            })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/prompt/report', methods=['POST'])
+def prompt_report():
+    """Token-count breakdown of the system prompt for a given context."""
+    data = request.json or {}
+    return jsonify(prompt_token_report(data.get('context', {}), message=data.get('message', '')))
+
+
 @app.route('/api/leetcode', methods=['GET'])
 def leetcode_stats():
     username = request.args.get('username', '').strip()
     if not username:
         return jsonify({"error": "Username required"}), 400
 
-    query = """
-    query getUserProfile($username: String!) {
-        matchedUser(username: $username) {
-            username
-            submitStats: submitStatsGlobal {
-                acSubmissionNum {
-                    difficulty
-                    count
-                    submissions
-                }
-            }
-            profile {
-                ranking
-                starRating
-            }
-        }
-        allQuestionsCount {
-            difficulty
-            count
-        }
-    }
-    """
-
     try:
-        resp = requests.post(
-            'https://leetcode.com/graphql',
-            json={'query': query, 'variables': {'username': username}},
-            headers={
-                'Content-Type': 'application/json',
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Referer': f'https://leetcode.com/{username}/',
-                'Accept': 'application/json',
-                'Origin': 'https://leetcode.com',
-                'x-csrftoken': 'na'
-            },
-            timeout=10
-        )
-        return jsonify(resp.json())
+        payload, cache_state = leetcode_cache.get(username)
+        resp = jsonify(payload)
+        resp.headers['X-Cache'] = cache_state
+        return resp
     except requests.exceptions.Timeout:
         return jsonify({"error": "LeetCode API timed out. Try again!"}), 504
+    except UserNotFound as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/quiz', methods=['POST'])
-def generate_quiz():
-    try:
-        data = request.json
-        quiz_type = data.get('quizType', 'mixed')
-        count = min(int(data.get('count', 5)), 10)
-        subject = data.get('subject', '')
-        context = data.get('context', {})
-        topics = context.get('topics', {})
-        
-        if not client:
-            return jsonify({"error": "⚠️ Groq API key not configured on Render. Please add GROK_API_KEY to Environment Variables."}), 500
-
-        if quiz_type == 'leetcode':
-            prompt = f"""Generate exactly {count} LeetCode-style coding interview questions.
+def build_quiz_prompt(quiz_type, count, subject='', focus=()):
+    """Prompt for `count` quiz questions. quiz_type is 'leetcode', 'subject' or 'mixed'."""
+    if quiz_type == 'leetcode':
+        return f"""Generate exactly {count} LeetCode-style coding interview questions.
 Mix difficulty: some easy, some medium.
 For each question:
 - Clear problem statement
@@ -431,13 +431,8 @@ Q2. [continue...]
 
 Return ONLY the questions, no answers."""
 
-        elif quiz_type == 'subject' and subject:
-            subject_data = topics.get(subject, {})
-            completed = [t.get('topic', '') for t in subject_data.get('completed', [])]
-            all_topics = subject_data.get('topics', [])
-            focus = completed if completed else (all_topics if all_topics else [subject])
-
-            prompt = f"""Generate exactly {count} quiz questions for the subject: {subject}.
+    elif quiz_type == 'subject':
+        return f"""Generate exactly {count} quiz questions for the subject: {subject}.
 Focus on these topics: {', '.join(focus[:5]) if focus else subject}
 Mix question types: conceptual understanding, application, analysis.
 Make them thought-provoking but fair for a college student.
@@ -449,8 +444,8 @@ Q2. [Question text]
 
 Return ONLY the questions, no answers."""
 
-        else:  # mixed
-            prompt = f"""Generate exactly {count} mixed study questions for a college CS student.
+    # mixed
+    return f"""Generate exactly {count} mixed study questions for a college CS student.
 Cover: data structures, algorithms, system design fundamentals, and CS concepts.
 Make them interesting and educational.
 
@@ -461,25 +456,76 @@ Q2. [Question text]
 
 Return ONLY the questions, no answers."""
 
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}]
+
+def request_quiz_questions(quiz_type, count, subject='', focus=()):
+    """Ask the quiz model for `count` questions and return the raw numbered text."""
+    route = model_router.Route('fast', model_router.QUIZ_MODEL, 'quiz_generation')
+    with model_router.timed(route):
+        response = llm.create(
+            model=route.model,
+            messages=[{"role": "user", "content": build_quiz_prompt(quiz_type, count, subject, focus)}]
+        )
+    metrics.record_llm_usage(route.model, getattr(response, 'usage', None))
+    return response.choices[0].message.content
+
+
+@app.route('/api/quiz', methods=['POST'])
+def generate_quiz():
+    try:
+        data = request.json
+        quiz_type = data.get('quizType', 'mixed')
+        count = min(int(data.get('count', 5)), 10)
+        subject = data.get('subject', '')
+        context = data.get('context', {})
+        topics = context.get('topics', {})
+        
+        if not client:
+            return jsonify({"error": "⚠️ Groq API key not configured on Render. Please add GROK_API_KEY to Environment Variables."}), 500
+
+        focus = []
+        if quiz_type == 'subject' and subject:
+            subject_data = topics.get(subject, {})
+            completed = [t.get('topic', '') for t in subject_data.get('completed', [])]
+            all_topics = subject_data.get('topics', [])
+            focus = (completed if completed else (all_topics if all_topics else [subject]))[:5]
+            prompt_type = 'subject'
+        elif quiz_type == 'leetcode':
+            prompt_type = 'leetcode'
+        else:
+            prompt_type = 'mixed'
+
+        key = pool_key(prompt_type, subject, focus)
+        pooled = quiz_pool.take(key, count)
+        if pooled:
+            questions = join_questions(pooled)
+        else:
+            questions = request_quiz_questions(prompt_type, count, subject, focus)
+            quiz_pool.add(key, split_questions(questions), serves=1)
+
+        # Keep the pool stocked so the next request for this quiz is served without an LLM call
+        quiz_pool.refill_async(
+            key, lambda n: split_questions(request_quiz_questions(prompt_type, n, subject, focus))
         )
 
         return jsonify({
-            "questions": response.choices[0].message.content,
+            "questions": questions,
             "count": count,
             "type": quiz_type,
-            "subject": subject
+            "subject": subject,
+            "cached": bool(pooled)
         })
 
+    except llm_client.LLMError as e:
+        print(f"⚠️ LLM unavailable in /api/quiz: {e}")
+        return jsonify({"error": llm_error_reply(e)["message"]}), e.status if e.status in (429, 502, 504) else 503
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/sync/push', methods=['POST'])
 def api_sync_push():
-    """Push local data to Supabase."""
+    """Push changed local data keys to Supabase."""
     try:
         data = request.json
         sync_key = data.get('syncKey')
@@ -488,26 +534,153 @@ def api_sync_push():
         if not sync_key or not payload:
             return jsonify({"error": "syncKey and payload required"}), 400
             
+        # Written before replying: the client records these keys as synced on success
         result = save_user_data(sync_key, payload)
+        if result.get('success'):
+            user_context.apply_push(sync_key, payload, result.get('cursor'))
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+MAX_CHAT_APPEND = 100
+MAX_CHAT_MESSAGE_CHARS = 20000
+
+
+@app.route('/api/chat/messages', methods=['POST'])
+def api_chat_append():
+    """Append chat messages ({id, role, content, ts}) to the sync key's server-side log."""
+    try:
+        data = request.json or {}
+        sync_key = data.get('syncKey')
+        messages = data.get('messages')
+        if not sync_key or not isinstance(messages, list) or not messages:
+            return jsonify({"error": "syncKey and messages required"}), 400
+        if len(messages) > MAX_CHAT_APPEND:
+            return jsonify({"error": f"Too many messages (max {MAX_CHAT_APPEND})"}), 400
+
+        rows = []
+        for i, m in enumerate(messages):
+            m = m if isinstance(m, dict) else {}
+            try:
+                ts = datetime.fromisoformat(m.get('ts')).astimezone(timezone.utc)
+            except (TypeError, ValueError):
+                ts = None
+            if (not isinstance(m.get('id'), str) or not 0 < len(m['id']) <= 64
+                    or m.get('role') not in ('user', 'aria')
+                    or not isinstance(m.get('content'), str) or ts is None):
+                return jsonify({"error": f"messages[{i}]: needs id, role (user|aria), content and an ISO ts"}), 400
+            rows.append({"id": m['id'], "role": m['role'], "content": m['content'][:MAX_CHAT_MESSAGE_CHARS],
+                         "ts": ts.isoformat(timespec='milliseconds')})
+
+        result = append_chat_messages(sync_key, rows, defer=True)
+        return jsonify(result), (500 if result.get('error') else 200)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/chat/messages', methods=['GET'])
+def api_chat_history():
+    """Latest page of chat history, or the page before the `before` cursor from a previous call."""
+    try:
+        sync_key = request.args.get('syncKey')
+        if not sync_key:
+            return jsonify({"error": "syncKey required"}), 400
+        limit = request.args.get('limit', CHAT_PAGE_SIZE, type=int)
+        result = get_chat_messages(sync_key, before=request.args.get('before'), limit=limit)
+        return jsonify(result), (500 if result.get('error') else 200)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/sync/pull', methods=['GET'])
 def api_sync_pull():
-    """Pull remote data from Supabase."""
+    """Pull remote data from Supabase.
+
+    Pass `since` (the cursor from the previous pull) to get only keys changed
+    since shortly before it; 304 means nothing changed.
+    """
     try:
         sync_key = request.args.get('syncKey')
+        since = request.args.get('since')
         if not sync_key:
             return jsonify({"error": "syncKey required"}), 400
+        if since and parse_timestamp(since) is None:
+            return jsonify({"error": "since must be a cursor from an earlier pull"}), 400
             
-        result = get_all_user_data(sync_key)
+        result = get_all_user_data(sync_key, since)
+        if since and result.get('success') and not result.get('data'):
+            return '', 304
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/push/key', methods=['GET'])
+def push_key():
+    """VAPID public key the browser needs to subscribe to Web Push."""
+    return jsonify({"publicKey": reminders.VAPID_PUBLIC_KEY, "sender": reminders.PUSH_SENDER})
+
+
+@app.route('/api/push/subscribe', methods=['POST'])
+def push_subscribe():
+    """Register this device for server-sent reminders for a sync key."""
+    try:
+        data = request.json or {}
+        sync_key = data.get('syncKey')
+        subscription = data.get('subscription') or {}
+        if not sync_key or not subscription.get('endpoint'):
+            return jsonify({"error": "syncKey and subscription required"}), 400
+
+        result = save_push_subscription(sync_key, subscription, data.get('userId'), data.get('tzOffset', 0))
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/push/unsubscribe', methods=['POST'])
+def push_unsubscribe():
+    try:
+        endpoint = (request.json or {}).get('endpoint')
+        if not endpoint:
+            return jsonify({"error": "endpoint required"}), 400
+        result = delete_push_subscription(endpoint)
+        if result.get('success'):
+            # If the scheduler runs in another worker, its next sweep drops the endpoint
+            reminders.scheduler.forget(endpoint)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/push/test', methods=['POST'])
+def push_test():
+    """Send a test notification to this sync key's devices right away."""
+    try:
+        sync_key = (request.json or {}).get('syncKey')
+        if not sync_key:
+            return jsonify({"error": "syncKey required"}), 400
+        return jsonify({"success": True, **reminders.send_test(sync_key)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/reminders', methods=['GET'])
+def upcoming_reminders():
+    """Reminders the server will push for a sync key, soonest first."""
+    try:
+        sync_key = request.args.get('syncKey')
+        if not sync_key:
+            return jsonify({"error": "syncKey required"}), 400
+        upcoming = [
+            {**reminders.payload_for(r), "fireAt": datetime.fromtimestamp(r.fire_at, timezone.utc).isoformat()}
+            for r in reminders.scheduler.upcoming(sync_key)
+        ]
+        return jsonify({"success": True, "data": upcoming})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/period/log-start', methods=['POST'])
 def api_log_period_start():
     """Log period start date."""
@@ -541,6 +714,46 @@ def api_log_period_end():
         return jsonify({"error": str(e)}), 500
 
 
+def _iso_day(value):
+    """'YYYY-MM-DD' if value is a valid date in that form, else None."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+@app.route('/api/period/bulk', methods=['POST'])
+def api_log_periods_bulk():
+    """Log many start/end pairs in one round trip; returns the recomputed cycle stats."""
+    try:
+        data = request.json or {}
+        user_id = data.get('userId', 'default_user')
+        entries = data.get('periods')
+        if not isinstance(entries, list) or not entries:
+            return jsonify({"error": "periods must be a non-empty list"}), 400
+        if len(entries) > MAX_BULK_PERIODS:
+            return jsonify({"error": f"Too many periods (max {MAX_BULK_PERIODS})"}), 400
+
+        # One row per start date; a later entry for the same start overrides an earlier one
+        periods = {}
+        for i, entry in enumerate(entries):
+            entry = entry if isinstance(entry, dict) else {}
+            start = _iso_day(entry.get('startDate'))
+            end = _iso_day(entry.get('endDate')) if entry.get('endDate') else None
+            if not start or (entry.get('endDate') and (not end or end < start)):
+                return jsonify({"error": f"periods[{i}]: startDate must be YYYY-MM-DD and endDate, if set, on or after it"}), 400
+            previous = periods.get(start) or {}
+            periods[start] = {"start_date": start, "end_date": end or previous.get('end_date'),
+                              "notes": entry.get('notes') or previous.get('notes')}
+
+        result = log_periods_bulk(user_id, list(periods.values()))
+        if result.get('error'):
+            return jsonify(result), 500
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/period/history', methods=['GET'])
 def api_period_history():
     """Get period history for a user."""
@@ -569,6 +782,10 @@ def api_period_phases():
     try:
         user_id = request.args.get('userId', 'default_user')
         target_date = request.args.get('date')
+        if target_date:
+            target_date = _iso_day(target_date)
+            if not target_date:
+                return jsonify({"error": "date must be YYYY-MM-DD"}), 400
         
         phases = predict_cycle_phases(user_id, target_date)
         return jsonify({"success": True, "data": phases})
@@ -576,6 +793,35 @@ def api_period_phases():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/period/range', methods=['GET'])
+def api_period_range():
+    """Get the cycle phase for every day in a range (start/end) or a month (YYYY-MM)."""
+    try:
+        user_id = request.args.get('userId', 'default_user')
+        month = request.args.get('month')
+        if month:
+            try:
+                first = datetime.strptime(month, '%Y-%m')
+            except ValueError:
+                return jsonify({"error": "month must be YYYY-MM"}), 400
+            next_month = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+            start = first.strftime('%Y-%m-%d')
+            end = (next_month - timedelta(days=1)).strftime('%Y-%m-%d')
+        else:
+            start = request.args.get('start')
+            end = request.args.get('end')
+            if not start or not end:
+                return jsonify({"error": "month or start and end required"}), 400
+
+        result = predict_cycle_phase_range(user_id, start, end)
+        if "error" in result:
+            status = 200 if result["error"] == "No period data available" else 400
+            return jsonify({"success": False, "error": result["error"]}), status
+        return jsonify({"success": True, "data": result})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/list-models', methods=['GET'])
 def list_models():
     """List available Grok models."""
@@ -598,39 +844,45 @@ def list_models():
 
 @app.route('/api/test-key', methods=['GET'])
 def test_api_key():
-    """Test if the Grok API key is valid."""
+    """Test if the configured LLM API key is valid (one direct call, no retries or fallback)."""
     if not client:
         return jsonify({"status": "error", "message": "No API key configured"}), 400
 
     try:
         response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
+            model=endpoints[0].model or model_router.FAST_MODEL,
             messages=[{"role": "user", "content": "Say 'API key is working!' in exactly one sentence."}]
         )
         return jsonify({
             "status": "success",
-            "message": "✅ Groq API key is valid!",
+            "message": f"✅ {endpoints[0].name.title()} API key is valid!",
             "response": response.choices[0].message.content
         })
-    except Exception as e:
+    except openai.APIStatusError as e:
         error_msg = str(e)
-        if "429" in error_msg:
+        if e.status_code == 429:
+            retry_after = llm_client.retry_after_seconds(e)
             return jsonify({
                 "status": "error",
-                "message": "❌ 429 QUOTA EXCEEDED — Check your xAI billing",
+                "message": "❌ 429 RATE LIMITED / QUOTA EXCEEDED — Check your provider's limits and billing",
+                "retry_after": retry_after,
                 "error": error_msg[:200]
             }), 429
-        elif "401" in error_msg or "invalid" in error_msg.lower():
+        elif e.status_code in (401, 403):
             return jsonify({
                 "status": "error",
                 "message": "❌ API Key is invalid or expired",
                 "error": error_msg[:200]
             }), 401
-        else:
-            return jsonify({
-                "status": "error",
-                "message": f"❌ Error: {error_msg[:120]}",
-            }), 500
+        return jsonify({
+            "status": "error",
+            "message": f"❌ Error {e.status_code}: {error_msg[:120]}",
+        }), 502
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"❌ Error: {str(e)[:120]}",
+        }), 500
 
 
 if __name__ == '__main__':
@@ -0,0 +1,223 @@
+"""Content-hashed, precompressed static assets.
+
+At boot every file under static/ is read once, fingerprinted with a hash of
+its bytes and compressed (gzip, plus brotli when the module is installed).
+Templates link to /assets/<name>.<hash>.<ext> through asset_url(); a given
+URL never changes content, so it is served with a one-year immutable
+Cache-Control and the hash as its ETag. A deploy that changes a file changes
+its URL, and everything else stays cached in the browser.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from flask import Response, abort, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+ASSET_URL_PREFIX = '/assets/'
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+# Re-hash a file when its mtime changes (local `python app.py` editing); off in production
+ASSETS_RELOAD = os.environ.get("ARIA_ASSETS_RELOAD", "0") == "1"
+
+# What the service worker precaches: the page and the files it links
+SHELL_PAGE = '/'
+SHELL_TEMPLATE = os.path.join(BASE_DIR, 'templates', 'index.html')
+SHELL_ASSETS = ('aria_style.css', 'aria_core.js')
+SERVICE_WORKER = 'service-worker.js'
+
+# Text formats worth compressing; images and fonts are already compressed
+COMPRESSIBLE = ('.js', '.css', '.html', '.svg', '.json', '.map', '.txt', '.webmanifest')
+MIN_COMPRESS_BYTES = 1024
+
+_HASHED_RE = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{10})(?P<ext>\.[^./]+)$')
+
+
+def hashed_name(name, digest):
+    """aria_core.js -> aria_core.<digest>.js"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+class Asset:
+    """One static file: its bytes, fingerprint and precompressed variants."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.digest = hashlib.sha256(data).hexdigest()[:10]
+        self.url_name = hashed_name(name, self.digest)
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.bodies = {'identity': data}
+        if name.endswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_BYTES:
+            # mtime=0 keeps the gzip bytes (and so every worker's copy) identical
+            self._keep('gzip', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._keep('br', brotli.compress(data, quality=11))
+
+    def _keep(self, encoding, body):
+        if len(body) < len(self.bodies['identity']):
+            self.bodies[encoding] = body
+
+    def pick_encoding(self, accept_encodings):
+        """Smallest variant the client accepts; brotli beats gzip when both are there."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+
+class AssetManifest:
+    """Logical name -> Asset for everything under `root`, plus the reverse hashed-name lookup."""
+
+    def __init__(self, root=STATIC_DIR, reload=ASSETS_RELOAD):
+        self.root = root
+        self.reload = reload
+        self._assets = {}
+        self._by_url = {}
+        self._lock = threading.Lock()
+        self._built = False
+
+    def build(self):
+        """Hash and compress every file under the root. Returns the asset count."""
+        assets = {}
+        for folder, _, files in os.walk(self.root):
+            for filename in files:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(folder, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                assets[name] = Asset(name, path)
+        with self._lock:
+            self._assets = assets
+            self._by_url = {a.url_name: a for a in assets.values()}
+            self._built = True
+        return len(assets)
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def _fresh(self, asset):
+        if not self.reload:
+            return asset
+        try:
+            if os.path.getmtime(asset.path) == asset.mtime:
+                return asset
+            updated = Asset(asset.name, asset.path)
+        except OSError:
+            return asset
+        with self._lock:
+            self._assets[asset.name] = updated
+            self._by_url.pop(asset.url_name, None)
+            self._by_url[updated.url_name] = updated
+        return updated
+
+    def get(self, name):
+        self._ensure_built()
+        asset = self._assets.get(name)
+        return self._fresh(asset) if asset else None
+
+    def url(self, name):
+        """Fingerprinted URL for a file under static/, or the plain /static/ URL if it isn't one."""
+        asset = self.get(name)
+        if asset is None:
+            return f"/static/{name}"
+        return ASSET_URL_PREFIX + asset.url_name
+
+    def lookup(self, url_name):
+        """(asset, immutable) for a requested /assets/ path.
+
+        A hash that no longer matches (a page rendered before a deploy) still
+        gets the current file, just without the long-lived caching.
+        """
+        self._ensure_built()
+        asset = self._by_url.get(url_name)
+        if asset is not None:
+            return self._fresh(asset), True
+        match = _HASHED_RE.match(url_name)
+        if match:
+            asset = self.get(match['stem'] + match['ext'])
+            if asset is not None:
+                return asset, False
+        return None, False
+
+    def summary(self):
+        self._ensure_built()
+        raw = sum(len(a.bodies['identity']) for a in self._assets.values())
+        best = sum(len(a.bodies.get('br') or a.bodies.get('gzip') or a.bodies['identity'])
+                   for a in self._assets.values())
+        return {"files": len(self._assets), "bytes": raw, "compressed_bytes": best,
+                "brotli": brotli is not None}
+
+
+manifest = AssetManifest()
+
+
+def asset_url(name):
+    """Jinja global: {{ asset_url('aria_core.js') }} -> /assets/aria_core.<hash>.js"""
+    return manifest.url(name)
+
+
+def serve(url_name):
+    """Response for GET /assets/<url_name>, negotiated on Accept-Encoding and conditional on the ETag."""
+    asset, immutable = manifest.lookup(url_name)
+    if asset is None:
+        abort(404)
+    encoding = asset.pick_encoding(request.accept_encodings)
+    response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Each encoding is a different byte stream, so it gets its own strong ETag
+    response.set_etag(asset.digest if encoding == 'identity' else f"{asset.digest}-{encoding}")
+    if immutable:
+        response.headers['Cache-Control'] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def service_worker_script():
+    """static/service-worker.js with its CACHE_VERSION and PRECACHE_URLS filled in.
+
+    The version covers the worker, the page template and every shell asset, so
+    any deploy that changes one of them makes the browser install a new worker
+    (which re-precaches the shell and drops the old cache).
+    """
+    worker = manifest.get(SERVICE_WORKER)
+    if worker is None:
+        abort(404)
+    urls = [SHELL_PAGE] + [asset_url(name) for name in SHELL_ASSETS]
+    version = hashlib.sha256()
+    version.update(worker.digest.encode())
+    with open(SHELL_TEMPLATE, 'rb') as f:
+        version.update(f.read())
+    for url in urls:
+        version.update(url.encode())
+    header = (f"const CACHE_VERSION = {json.dumps(version.hexdigest()[:10])};\n"
+              f"const PRECACHE_URLS = {json.dumps(urls)};\n\n")
+    return header + worker.bodies['identity'].decode('utf-8')
+
+
+if __name__ == '__main__':
+    # Build check: print each file's fingerprinted name and compressed sizes
+    manifest.build()
+    for name, asset in sorted(manifest._assets.items()):
+        sizes = ', '.join(f"{enc} {len(body):,}" for enc, body in asset.bodies.items())
+        print(f"{name} -> {ASSET_URL_PREFIX}{asset.url_name} ({sizes})")
+    if brotli is None:
+        print("⚠️ brotli not installed, serving gzip only")
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""Offline load test for the Aria API.
+
+Runs `app` against two local stand-ins — an OpenAI-compatible LLM stub with
+configurable latency/token rate and an in-memory Supabase (PostgREST) stub —
+then drives the main endpoints at a fixed concurrency and reports latency
+percentiles, throughput and errors. No network access or API keys needed.
+
+    python benchmark.py
+    python benchmark.py --concurrency 32 --requests 400 --llm-ttft 0.8 --llm-tps 250
+    python benchmark.py --scenarios chat,quiz --json bench_output.json
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+# ---------------------------------------------------------------------------
+# OpenAI-compatible LLM stand-in
+# ---------------------------------------------------------------------------
+
+class LLMStub:
+    """Deterministic /v1/chat/completions with a time-to-first-token and a token rate."""
+
+    def __init__(self, ttft=0.3, tokens_per_second=300.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def reply_for(messages):
+        """Canned completion text for a request, shaped like the real model's output."""
+        last = messages[-1]['content'] if messages else ''
+        quiz = re.search(r'Generate exactly (\d+)', last)
+        if quiz:
+            return '\n\n'.join(
+                f"Q{i}. Benchmark question {i}: explain the trade-offs of approach {random.randint(1, 999)}."
+                for i in range(1, int(quiz.group(1)) + 1)
+            )
+        return json.dumps({
+            "message": "Got it! Here's a short, friendly benchmark reply so the parser has something "
+                       "realistic to chew on. Keep going, you're doing great ✦",
+            "action": None
+        })
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip('/').endswith('/models'):
+                    return self._json(200, {"object": "list", "data": [
+                        {"id": "llama-3.3-70b-versatile", "object": "model"},
+                        {"id": "llama-3.1-8b-instant", "object": "model"}
+                    ]})
+                self._json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with stub._lock:
+                    stub.calls += 1
+                messages = body.get('messages', [])
+                text = stub.reply_for(messages)
+                # ~4 chars per token
+                pieces = [text[i:i + 4] for i in range(0, len(text), 4)]
+                prompt_tokens = sum(len(m.get('content') or '') for m in messages) // 4
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                         "total_tokens": prompt_tokens + len(pieces)}
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()),
+                        "model": body.get('model', 'stub')}
+                per_token = 1.0 / stub.tokens_per_second if stub.tokens_per_second else 0
+
+                time.sleep(stub.ttft)
+                if not body.get('stream'):
+                    time.sleep(per_token * len(pieces))
+                    return self._json(200, {**base, "object": "chat.completion", "usage": usage, "choices": [{
+                        "index": 0, "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": text}
+                    }]})
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for i, piece in enumerate(pieces):
+                    chunk = {**base, "object": "chat.completion.chunk", "choices": [{
+                        "index": 0, "finish_reason": None,
+                        "delta": {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+                    }]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(per_token)
+                final = {**base, "object": "chat.completion.chunk", "usage": usage,
+                         "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                self.close_connection = True
+
+        return Handler
+
+
+# ---------------------------------------------------------------------------
+# Supabase / PostgREST stand-in
+# ---------------------------------------------------------------------------
+
+# Columns that make a row unique, per table (used for upserts and insert conflicts)
+TABLE_KEYS = {
+    'user_sync': ('user_id', 'data_key'),
+    'period_logs': ('user_id', 'start_date'),
+    'cycle_stats': ('user_id',),
+    'push_subscriptions': ('endpoint',),
+    'chat_messages': ('user_id', 'client_id'),
+}
+
+
+def _match(row, column, expr):
+    op, _, raw = expr.partition('.')
+    raw = raw.strip('"')
+    value = row.get(column)
+    if op == 'in':
+        return str(value) in [v.strip('"') for v in raw.strip('()').split(',')]
+    if op == 'is':
+        return value is None if raw == 'null' else str(value).lower() == raw
+    if value is None:
+        return op == 'neq'
+    value = str(value)
+    return {
+        'eq': value == raw, 'neq': value != raw,
+        'gt': value > raw, 'gte': value >= raw,
+        'lt': value < raw, 'lte': value <= raw,
+    }.get(op, False)
+
+
+def _match_or(row, expr):
+    """PostgREST `or=(a.eq.1,and(b.eq.2,c.lt.3))` — one level of nested and() is enough here."""
+    for part in re.findall(r'and\([^)]*\)|[^,]+', expr.strip('()')):
+        if part.startswith('and('):
+            conds = part[4:-1].split(',')
+            if all(_match(row, c.split('.', 1)[0], c.split('.', 1)[1]) for c in conds):
+                return True
+        elif _match(row, part.split('.', 1)[0], part.split('.', 1)[1]):
+            return True
+    return False
+
+
+class PostgRESTStub:
+    """In-memory tables behind the subset of the PostgREST API that supabase-py uses here."""
+
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.tables = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _filtered(self, table, params):
+        rows = self.tables.setdefault(table, [])
+        out = []
+        for row in rows:
+            ok = True
+            for column, values in params.items():
+                if column in ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns'):
+                    continue
+                for expr in values:
+                    if column == 'or':
+                        ok = ok and _match_or(row, expr)
+                    else:
+                        ok = ok and _match(row, column, expr)
+            if ok:
+                out.append(row)
+        return out
+
+    def select(self, table, params):
+        rows = list(self._filtered(table, params))
+        for spec in reversed(params.get('order', [''])[0].split(',')):
+            if spec:
+                column, _, direction = spec.partition('.')
+                rows.sort(key=lambda r: (r.get(column) is None, str(r.get(column))), reverse=direction.startswith('desc'))
+        offset = int(params.get('offset', ['0'])[0])
+        if 'limit' in params:
+            rows = rows[offset:offset + int(params['limit'][0])]
+        columns = params.get('select', ['*'])[0]
+        if columns != '*':
+            names = [c.strip() for c in columns.split(',')]
+            rows = [{c: r.get(c) for c in names} for r in rows]
+        return rows
+
+    def write(self, table, items, upsert, conflict_cols, ignore_duplicates=False):
+        rows = self.tables.setdefault(table, [])
+        keys = tuple(conflict_cols) if conflict_cols else TABLE_KEYS.get(table, ('id',))
+        out = []
+        for item in items:
+            existing = next((r for r in rows if all(str(r.get(k)) == str(item.get(k)) for k in keys)), None)
+            if existing is not None:
+                if ignore_duplicates:
+                    continue
+                if not upsert:
+                    raise ValueError('duplicate key value violates unique constraint')
+                existing.update(item)
+                out.append(dict(existing))
+            else:
+                row = dict(item)
+                row.setdefault('id', self._next_id)
+                self._next_id += 1
+                rows.append(row)
+                out.append(dict(row))
+        return out
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self):
+                parsed = urlparse(self.path)
+                table = unquote(parsed.path.rsplit('/', 1)[-1])
+                return table, parse_qs(parsed.query, keep_blank_values=True)
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length', 0))
+                return json.loads(self.rfile.read(length)) if length else None
+
+            def _handle(self, fn):
+                time.sleep(stub.latency)
+                try:
+                    with stub._lock:
+                        stub.calls += 1
+                        status, payload = fn()
+                    self._reply(status, payload)
+                except ValueError as e:
+                    self._reply(409, {"code": "23505", "message": str(e), "details": None, "hint": None})
+
+            def do_GET(self):
+                table, params = self._route()
+                self._handle(lambda: (200, stub.select(table, params)))
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_POST(self):
+                table, params = self._route()
+                body = self._body()
+                items = body if isinstance(body, list) else [body]
+                prefer = self.headers.get('Prefer', '')
+                upsert = 'merge-duplicates' in prefer
+                ignore = 'ignore-duplicates' in prefer
+                conflict = params.get('on_conflict', [''])[0]
+                conflict_cols = [c for c in conflict.split(',') if c]
+                self._handle(lambda: (201, stub.write(table, items, upsert, conflict_cols, ignore)))
+
+            def do_PATCH(self):
+                table, params = self._route()
+                body = self._body() or {}
+
+                def update():
+                    rows = stub._filtered(table, params)
+                    for row in rows:
+                        row.update(body)
+                    return 200, [dict(r) for r in rows]
+                self._handle(update)
+
+            def do_DELETE(self):
+                table, params = self._route()
+                self._body()  # drain it, or the next request on this keep-alive connection is garbled
+
+                def delete():
+                    doomed = stub._filtered(table, params)
+                    stub.tables[table] = [r for r in stub.tables.get(table, []) if r not in doomed]
+                    return 200, doomed
+                self._handle(delete)
+
+        return Handler
+
+
+# ---------------------------------------------------------------------------
+# Load driver
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def sample_context(user):
+    today = time.strftime('%Y-%m-%d')
+    return {
+        "userName": user,
+        "subjects": ["Data Mining", "Algorithms"],
+        "deadlines": [{"id": f"d{i}", "title": f"Report {i}", "subject": "Data Mining",
+                       "dueDate": today, "status": "active"} for i in range(8)],
+        "gym": {"currentStreak": 3},
+        "notes": [{"text": f"note {i}"} for i in range(5)],
+        "today": today,
+        "balance": 250,
+    }
+
+
+def make_scenarios(users):
+    """name -> callable(session, base_url) that performs one request and returns the response."""
+    def user():
+        return random.choice(users)
+
+    def chat(s, base):
+        u = user()
+        return s.post(f"{base}/api/chat", json={
+            "message": "what should I focus on today?", "context": sample_context(u),
+            "chatHistory": [{"role": "user", "content": "hi"}, {"role": "aria", "content": "Hey!"}]
+        }, timeout=120)
+
+    def chat_stream(s, base):
+        u = user()
+        r = s.post(f"{base}/api/chat/stream", json={
+            "message": "what should I focus on today?", "context": sample_context(u), "chatHistory": []
+        }, stream=True, timeout=120)
+        for _ in r.iter_content(chunk_size=None):
+            pass
+        return r
+
+    def quiz(s, base):
+        return s.post(f"{base}/api/quiz", json={"quizType": random.choice(["leetcode", "mixed"]), "count": 5}, timeout=120)
+
+    def sync_push(s, base):
+        u = user()
+        return s.post(f"{base}/api/sync/push", json={"syncKey": f"sync-{u}", "payload": {
+            "aria_notes": [{"id": uuid.uuid4().hex[:6], "text": "benchmark note"}],
+            "aria_gym": [{"date": time.strftime('%Y-%m-%d'), "didGo": True}],
+        }}, timeout=60)
+
+    def sync_pull(s, base):
+        return s.get(f"{base}/api/sync/pull", params={"syncKey": f"sync-{user()}"}, timeout=60)
+
+    def period_predict(s, base):
+        return s.get(f"{base}/api/period/predict", params={"userId": user()}, timeout=60)
+
+    def period_phases(s, base):
+        return s.get(f"{base}/api/period/phases", params={"userId": user(), "date": time.strftime('%Y-%m-%d')}, timeout=60)
+
+    def period_range(s, base):
+        return s.get(f"{base}/api/period/range", params={"userId": user(), "month": time.strftime('%Y-%m')}, timeout=60)
+
+    return {
+        "chat": chat,
+        "chat_stream": chat_stream,
+        "quiz": quiz,
+        "sync_push": sync_push,
+        "sync_pull": sync_pull,
+        "period_predict": period_predict,
+        "period_phases": period_phases,
+        "period_range": period_range,
+    }
+
+
+def seed(base, session, users):
+    """Give every benchmark user some period history and synced data."""
+    for u in users:
+        for start in ('2026-01-03', '2026-01-31', '2026-03-01', '2026-03-29'):
+            session.post(f"{base}/api/period/log-start", json={"userId": u, "date": start}, timeout=30)
+        session.post(f"{base}/api/sync/push", json={"syncKey": f"sync-{u}", "payload": {
+            "aria_user": {"name": u, "subjects": ["Data Mining"]}
+        }}, timeout=30)
+
+
+def run_scenario(name, fn, base, total, concurrency):
+    import requests
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(_):
+        nonlocal errors
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            r = fn(local.session, base)
+            ok = r.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": total,
+        "errors": errors,
+        "p50_ms": round(1000 * percentile(latencies, 50), 1),
+        "p95_ms": round(1000 * percentile(latencies, 95), 1),
+        "p99_ms": round(1000 * percentile(latencies, 99), 1),
+        "rps": round(total / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scenarios', default='chat,chat_stream,quiz,sync_push,sync_pull,period_predict,period_phases,period_range')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--llm-ttft', type=float, default=0.3, help='LLM stub time to first token (s)')
+    parser.add_argument('--llm-tps', type=float, default=300.0, help='LLM stub tokens per second')
+    parser.add_argument('--db-latency', type=float, default=0.01, help='Supabase stub latency per call (s)')
+    parser.add_argument('--json', metavar='PATH', help='also write results as JSON')
+    args = parser.parse_args()
+
+    llm = LLMStub(args.llm_ttft, args.llm_tps).start()
+    db = PostgRESTStub(args.db_latency).start()
+
+    # Point the app at the stand-ins before it is imported (clients are built at import time)
+    os.environ.update({
+        "GROK_API_KEY": "stub-key",
+        "LLM_BASE_URL": llm.url,
+        "SUPABASE_URL": db.url,
+        "SUPABASE_ANON_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.stub",
+    })
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    import app as aria
+    import requests
+
+    server = make_server('127.0.0.1', 0, aria.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    users = [f"bench-user-{i}" for i in range(args.users)]
+    seed(base, requests.Session(), users)
+
+    scenarios = make_scenarios(users)
+    results = []
+    print(f"\n⏱  {args.requests} requests/scenario · concurrency {args.concurrency} · "
+          f"LLM ttft {args.llm_ttft}s @ {args.llm_tps} tok/s · DB {args.db_latency * 1000:.0f} ms\n")
+    print(f"{'scenario':<16}{'reqs':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name in [n.strip() for n in args.scenarios.split(',') if n.strip()]:
+        if name not in scenarios:
+            print(f"{name:<16}  (unknown scenario, skipped)")
+            continue
+        r = run_scenario(name, scenarios[name], base, args.requests, args.concurrency)
+        results.append(r)
+        print(f"{name:<16}{r['requests']:>7}{r['errors']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['rps']:>9}")
+
+    print(f"\nLLM stub calls: {llm.calls} · Supabase stub calls: {db.calls}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"config": vars(args), "results": results,
+                       "llm_calls": llm.calls, "db_calls": db.calls}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    server.shutdown()
+    llm.stop()
+    db.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""Gunicorn settings — picked up automatically by `gunicorn app:app` (Procfile / render.yaml)."""
+
+import os
+
+# Chat and quiz requests spend seconds waiting on Groq. With gevent workers that
+# wait is cooperative (gunicorn monkey-patches sockets before importing the app),
+# so the OpenAI/Supabase/requests clients yield to other requests and one worker
+# can hold hundreds of in-flight LLM calls. Fall back to threaded workers when
+# gevent isn't installed.
+try:
+    import gevent  # noqa: F401
+    _default_worker_class = "gevent"
+except ImportError:
+    _default_worker_class = "gthread"
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", _default_worker_class)
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# gevent: max simultaneous clients per worker. gthread: threads per worker.
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 500))
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+
+# Streaming chat responses can legitimately stay open for a while.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
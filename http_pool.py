@@ -0,0 +1,172 @@
+"""Shared outbound HTTP connection pools for LeetCode, Groq and Supabase.
+
+Every upstream gets one long-lived, keep-alive client so repeat calls reuse
+TCP+TLS connections instead of paying a handshake each time. Pool sizes,
+timeouts and retries are configurable from the environment, and each pool
+keeps request/latency counters for /api/http/pools.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 20))
+HTTP_KEEPALIVE_SIZE = int(os.environ.get("HTTP_KEEPALIVE_SIZE", 10))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 60))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 2))
+HTTP_RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", 0.3))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_stats = {}
+
+
+class PoolStats:
+    """Request counters for one upstream."""
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, status_code, seconds):
+        metrics.observe('aria_upstream_request_seconds', seconds, upstream=self.name)
+        with self._lock:
+            self.requests += 1
+            self.total_seconds += seconds
+            if status_code >= 500 or status_code == 429:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "avg_ms": round(1000 * self.total_seconds / self.requests, 1) if self.requests else None,
+            }
+
+
+def _stats_for(name):
+    with _lock:
+        if name not in _stats:
+            _stats[name] = PoolStats(name)
+        return _stats[name]
+
+
+def session(name, pool_size=HTTP_POOL_SIZE, retries=HTTP_MAX_RETRIES):
+    """Process-wide requests.Session for `name`, with pooling and retry/backoff on 429/5xx."""
+    with _lock:
+        if name in _sessions:
+            return _sessions[name]
+
+    stats = _stats_for(name)
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=False,  # a read timeout means the user already waited; surface it instead of retrying
+        status=retries,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # GraphQL reads are POSTs
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    s.hooks['response'].append(lambda r, *a, **kw: stats.record(r.status_code, r.elapsed.total_seconds()))
+
+    with _lock:
+        return _sessions.setdefault(name, s)
+
+
+def default_timeout(read=HTTP_READ_TIMEOUT):
+    """(connect, read) timeout tuple for requests calls."""
+    return (HTTP_CONNECT_TIMEOUT, read)
+
+
+def _httpx_module(client_cls):
+    """The httpx-compatible module `client_cls` is built on (SDKs may vendor their own)."""
+    for cls in client_cls.__mro__:
+        module = sys.modules.get(cls.__module__.split('.')[0])
+        if module is not None and hasattr(module, 'Limits') and hasattr(module, 'Timeout'):
+            return module
+    return httpx
+
+
+def httpx_client(name, client_cls=httpx.Client, pool_size=HTTP_POOL_SIZE, read_timeout=HTTP_READ_TIMEOUT):
+    """Process-wide keep-alive httpx client for `name` (Groq via the OpenAI SDK, Supabase).
+
+    `client_cls` lets callers pass the SDK's own client class (e.g. openai.DefaultHttpxClient).
+    Only connection failures are retried here; status retries are left to the SDK.
+    """
+    with _lock:
+        if name in _clients:
+            return _clients[name]
+
+    stats = _stats_for(name)
+
+    def on_request(request):
+        request.extensions['aria_started'] = time.monotonic()
+
+    def on_response(response):
+        started = response.request.extensions.get('aria_started')
+        if started is not None:
+            stats.record(response.status_code, time.monotonic() - started)
+
+    hx = _httpx_module(client_cls)
+    transport = hx.HTTPTransport(
+        limits=hx.Limits(max_connections=pool_size, max_keepalive_connections=HTTP_KEEPALIVE_SIZE),
+        retries=HTTP_MAX_RETRIES,  # connection failures only; status retries belong to the SDK
+    )
+    client = client_cls(
+        transport=transport,
+        timeout=hx.Timeout(read_timeout, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks={'request': [on_request], 'response': [on_response]},
+    )
+    with _lock:
+        return _clients.setdefault(name, client)
+
+
+def _connection_counts(name):
+    """Open/idle connection counts from the underlying pool, where the library exposes them."""
+    if name in _sessions:
+        adapter = _sessions[name].get_adapter('https://')
+        opened = 0
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+        return {"connections_opened": opened}
+
+    if name in _clients:
+        pool = getattr(getattr(_clients[name], '_transport', None), '_pool', None)
+        conns = getattr(pool, 'connections', None)
+        if conns is not None:
+            return {
+                "connections_open": len(conns),
+                "connections_idle": sum(1 for c in conns if getattr(c, 'is_idle', lambda: False)()),
+            }
+    return {}
+
+
+def pool_stats():
+    """Per-upstream request counters and connection pool state."""
+    with _lock:
+        names = list(_stats)
+    return {name: {**_stats[name].snapshot(), **_connection_counts(name)} for name in names}
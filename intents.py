@@ -0,0 +1,171 @@
+"""Rule-based fast path for unambiguous one-line commands.
+
+Messages like "went to the gym today" or "I spent $12 on lunch" don't need a
+70B model. `match()` recognises them locally and returns the same
+{message, action} reply the LLM would. Anything it isn't sure about returns
+None and goes to the LLM as usual.
+"""
+
+import os
+import re
+from datetime import date, timedelta
+
+FAST_INTENTS_ENABLED = os.environ.get("ARIA_FAST_INTENTS", "1") != "0"
+
+# Longer or compound messages ("...and also remind me...") go to the LLM
+MAX_WORDS = 14
+_COMPOUND = re.compile(r"\b(?:and|but|then|also|because|if|unless)\b|;|,\s", re.I)
+
+_AMOUNT = r"\$?\s*(?P<amount>\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)\s*(?:dollars|bucks|usd)?"
+_WHEN = r"(?:\s+(?P<when>today|yesterday|last night|this morning))?"
+_DESC = r"(?P<desc>[a-z][\w'&\- ]{0,40}?)"
+# Lookahead that requires the amount to be marked as money ("$5", "5 bucks"), for ambiguous verbs
+_CASH = r"(?=\$|[\d,.]+\s*(?:dollars|bucks|usd)\b)"
+
+
+def _today(context):
+    try:
+        return date.fromisoformat((context or {}).get('today', ''))
+    except (TypeError, ValueError):
+        return date.today()
+
+
+def _resolve_date(when, context):
+    day = _today(context)
+    if when in ('yesterday', 'last night'):
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+
+def _amount(match):
+    return float(match.group('amount').replace(',', ''))
+
+
+def _money(amount):
+    return f"${amount:,.2f}"
+
+
+def _when_phrase(when):
+    return when or 'today'
+
+
+# --- Handlers: (match, context) -> {message, action} ---
+
+def _gym(went):
+    def handler(m, context):
+        when = m.groupdict().get('when')
+        day = _resolve_date(when, context)
+        if went:
+            message = f"💪 Logged your gym session for {_when_phrase(when)}! Keep that streak going."
+        else:
+            message = f"No worries, rest days count too. I've logged {_when_phrase(when)} as a skip."
+        return {"message": message, "action": {"type": "LOG_GYM", "data": {"date": day, "didGo": went}}}
+    return handler
+
+
+def _transaction(kind):
+    def handler(m, context):
+        amount = _amount(m)
+        desc = (m.groupdict().get('desc') or ('income' if kind == 'income' else 'expense')).strip()
+        day = _resolve_date(m.groupdict().get('when'), context)
+        if kind == 'income':
+            message = f"Nice! I've logged {_money(amount)} of income from {desc}."
+        else:
+            message = f"Got it — logged a {_money(amount)} expense for {desc}."
+        return {"message": message, "action": {"type": "ADD_TRANSACTION", "data": {
+            "amount": amount, "description": desc, "type": kind, "date": day
+        }}}
+    return handler
+
+
+def _set_balance(m, context):
+    amount = _amount(m)
+    return {"message": f"Got it! I've set your balance to {_money(amount)}.",
+            "action": {"type": "SET_BALANCE", "data": {"amount": amount}}}
+
+
+def _splitwise(m, context):
+    amount = _amount(m)
+    desc = m.group('desc').strip()
+    return {"message": f"I've added a {_money(amount)} Splitwise reminder for {desc}.",
+            "action": {"type": "ADD_SPLITWISE", "data": {
+                "amount": amount, "description": desc, "date": _today(context).isoformat()
+            }}}
+
+
+def _period_start(m, context):
+    when = m.groupdict().get('when')
+    return {"message": f"Logged your period start for {_when_phrase(when)}. Take it easy and stay hydrated 💧",
+            "action": {"type": "LOG_PERIOD_START", "data": {"date": _resolve_date(when, context)}}}
+
+
+def _period_end(m, context):
+    when = m.groupdict().get('when')
+    # The client closes its most recent open period, so startDate can stay null
+    return {"message": f"Got it — marked your period as ended {_when_phrase(when)}.",
+            "action": {"type": "LOG_PERIOD_END", "data": {"startDate": None, "endDate": _resolve_date(when, context)}}}
+
+
+def _list_deadlines(m, context):
+    deadlines = [d for d in (context or {}).get('deadlines', []) if d.get('status') != 'done']
+    if not deadlines:
+        return {"message": "You don't have any open deadlines right now 🎉", "action": None}
+    deadlines.sort(key=lambda d: d.get('dueDate') or '9999-12-31')
+    lines = []
+    for d in deadlines[:10]:
+        subject = f" ({d['subject']})" if d.get('subject') else ''
+        lines.append(f"• {d.get('title', 'Untitled')}{subject} — due {d.get('dueDate') or 'no date'}")
+    more = f"\n…and {len(deadlines) - 10} more." if len(deadlines) > 10 else ''
+    return {"message": "Here's what's coming up:\n" + "\n".join(lines) + more, "action": None}
+
+
+def _balance(m, context):
+    balance = (context or {}).get('balance')
+    if not isinstance(balance, (int, float)):
+        return None
+    return {"message": f"Your current balance is {_money(balance)}.", "action": None}
+
+
+# (intent name, pattern, handler). Patterns are anchored: the whole message must match.
+RULES = [
+    ("log_gym", r"(?:i\s+)?(?:went to|hit|did)\s+(?:the\s+)?gym" + _WHEN, _gym(True)),
+    ("log_gym", r"(?:i\s+)?(?:worked out|trained)" + _WHEN, _gym(True)),
+    ("log_gym", r"gym\s+(?:done|✅)" + _WHEN, _gym(True)),
+    ("skip_gym", r"(?:i\s+)?(?:skipped|missed)\s+(?:the\s+)?gym" + _WHEN, _gym(False)),
+    ("add_expense", r"(?:i\s+)?(?:spent|paid)\s+" + _AMOUNT + r"\s+(?:on|for)\s+" + _DESC + _WHEN, _transaction('expense')),
+    ("add_income", r"(?:i\s+)?(?:got paid|earned|received)\s+" + _AMOUNT + r"(?:\s+(?:from|for)\s+" + _DESC + r")?" + _WHEN, _transaction('income')),
+    # "made" also means "made 5 flashcards": only income with a currency marker or a from/for source
+    ("add_income", r"(?:i\s+)?made\s+" + _CASH + _AMOUNT + r"(?:\s+(?:from|for)\s+" + _DESC + r")?" + _WHEN, _transaction('income')),
+    ("add_income", r"(?:i\s+)?made\s+" + _AMOUNT + r"\s+(?:from|for)\s+" + _DESC + _WHEN, _transaction('income')),
+    ("set_balance", r"(?:set\s+)?(?:my\s+)?balance\s+(?:is|to|=|:)\s*" + _AMOUNT + r"(?:\s+now)?", _set_balance),
+    ("set_balance", r"set\s+(?:my\s+)?balance\s+to\s+" + _AMOUNT, _set_balance),
+    ("add_splitwise", r"(?:add\s+)?" + _AMOUNT + r"\s+(?:for\s+)?" + _DESC + r"\s+(?:to|on)\s+splitwise", _splitwise),
+    ("add_splitwise", r"splitwise\s+" + _AMOUNT + r"\s+(?:for\s+)?" + _DESC, _splitwise),
+    ("period_start", r"(?:my\s+)?period\s+(?:started|came|began|is here)" + _WHEN, _period_start),
+    ("period_start", r"i\s+(?:got|started)\s+my\s+period" + _WHEN, _period_start),
+    ("period_end", r"(?:my\s+)?period\s+(?:ended|is over|finished|stopped)" + _WHEN, _period_end),
+    ("list_deadlines", r"(?:list|show(?: me)?|what are)\s+(?:all\s+)?(?:of\s+)?my\s+(?:upcoming\s+|open\s+)?deadlines", _list_deadlines),
+    ("list_deadlines", r"(?:my\s+)?deadlines", _list_deadlines),
+    ("get_balance", r"(?:what(?:'s| is)\s+)?my\s+(?:current\s+)?balance", _balance),
+]
+
+_COMPILED = [(name, re.compile(pattern + r"[.!?\s]*", re.I), handler) for name, pattern, handler in RULES]
+
+
+def match(message, context=None):
+    """(intent name, {message, action}) for a message handled locally, else None."""
+    if not FAST_INTENTS_ENABLED or not message:
+        return None
+    # Mid-quiz answers and replies to a pending deadline question belong to that conversation
+    if context and (context.get('inQuiz') or context.get('pendingDeadline')):
+        return None
+    text = ' '.join(message.strip().split())
+    if len(text.split()) > MAX_WORDS or _COMPOUND.search(text):
+        return None
+    for name, pattern, handler in _COMPILED:
+        m = pattern.fullmatch(text)
+        if m:
+            reply = handler(m, context or {})
+            if reply is not None:
+                return name, reply
+    return None
@@ -0,0 +1,274 @@
+"""In-process background job queue for work that doesn't need to finish before the response.
+
+A fixed set of worker threads, each with its own bounded FIFO. Jobs with a
+`key` always go to the same worker, so writes for one user land in the order
+they were submitted; jobs without one go to the least busy worker. A failing
+job is retried in place with exponential backoff (so later jobs for the same
+key can't overtake it). Recent jobs are kept for /api/jobs/<id>.
+
+User-data writes (submit_write) get their own pool, so they never wait
+behind quiz pre-generation, LeetCode refreshes or push batches.
+"""
+
+import atexit
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+import metrics
+from cache import TTLCache
+
+JOB_WORKERS = int(os.environ.get("ARIA_JOB_WORKERS", 4))
+JOB_WRITE_WORKERS = int(os.environ.get("ARIA_JOB_WRITE_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.environ.get("ARIA_JOB_QUEUE_SIZE", 500))  # per worker
+# How long a keyed job waits for room in a full queue before QueueFull
+JOB_OVERFLOW_WAIT = float(os.environ.get("ARIA_JOB_OVERFLOW_WAIT", 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get("ARIA_JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_BACKOFF = float(os.environ.get("ARIA_JOB_RETRY_BACKOFF", 1.0))
+JOB_HISTORY_TTL = int(os.environ.get("ARIA_JOB_HISTORY_TTL", 60 * 60))
+# How long a shutting-down process waits for queued writes
+JOB_DRAIN_TIMEOUT = float(os.environ.get("ARIA_JOB_DRAIN_TIMEOUT", 10))
+
+
+class QueueFull(Exception):
+    """The worker a job was routed to has JOB_QUEUE_SIZE jobs waiting."""
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+class Job:
+    """One unit of background work and its status."""
+
+    def __init__(self, name, fn, args, kwargs, key=None, max_attempts=JOB_MAX_ATTEMPTS):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.max_attempts = max_attempts
+        self.status = 'queued'  # queued | running | retrying | done | failed
+        self.attempts = 0
+        self.error = None
+        self.result = None
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished (done or failed). Returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "enqueued_at": _iso(self.enqueued_at),
+            "started_at": _iso(self.started_at),
+            "finished_at": _iso(self.finished_at),
+        }
+
+
+class JobQueue:
+    """Bounded worker pool with per-key ordering, retries and de-duplication."""
+
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, backoff=JOB_RETRY_BACKOFF, name="job"):
+        self.name = name
+        self.backoff = backoff
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(1, workers))]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._queued_keys = {}  # dedupe key -> Job still waiting to start
+        self._history = TTLCache(maxsize=2000, ttl=JOB_HISTORY_TTL)
+        self._running = 0
+        self._round_robin = itertools.count()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i, q in enumerate(self._queues):
+                t = threading.Thread(target=self._work, args=(q,), name=f"aria-{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _queue_for(self, key):
+        if key is not None:
+            return self._queues[zlib.crc32(str(key).encode()) % len(self._queues)]
+        start = next(self._round_robin)
+        return min((self._queues[(start + i) % len(self._queues)] for i in range(len(self._queues))),
+                   key=lambda q: q.qsize())
+
+    def submit(self, name, fn, *args, key=None, dedupe=False, max_attempts=JOB_MAX_ATTEMPTS, wait=0, **kwargs):
+        """Queue fn(*args, **kwargs). Raises QueueFull when the target worker is backed up.
+
+        With `dedupe`, a job whose key is already waiting to start is returned
+        instead of queueing another copy (e.g. recomputing one user's stats).
+        With `wait`, a full queue is waited on for up to that many seconds.
+        """
+        self._start()
+        with self._lock:
+            if dedupe and key in self._queued_keys:
+                metrics.inc('aria_jobs_total', job=name, outcome='deduped')
+                return self._queued_keys[key]
+            job = Job(name, fn, args, kwargs, key=key, max_attempts=max_attempts)
+            target = self._queue_for(key)
+            if dedupe:
+                self._queued_keys[key] = job
+        try:
+            if wait:
+                target.put(job, timeout=wait)  # outside the lock: workers need it to finish jobs
+            else:
+                target.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                if self._queued_keys.get(key) is job:
+                    del self._queued_keys[key]
+            metrics.inc('aria_jobs_total', job=name, outcome='rejected')
+            raise QueueFull(f"job queue full, {name} not queued")
+        self._history.set(job.id, job)
+        return job
+
+    def submit_or_run(self, name, fn, *args, **kwargs):
+        """submit(), but don't drop the job when the queue is full.
+
+        A job without a key runs inline (once). A keyed job waits up to
+        JOB_OVERFLOW_WAIT for room and then raises QueueFull: run inline, it
+        could overtake its key's queued jobs and land out of order.
+        """
+        if kwargs.get('key') is not None:
+            return self.submit(name, fn, *args, wait=JOB_OVERFLOW_WAIT, **kwargs)
+        try:
+            return self.submit(name, fn, *args, **kwargs)
+        except QueueFull:
+            kwargs.pop('key', None)
+            kwargs.pop('dedupe', None)
+            kwargs.pop('max_attempts', None)
+            job = Job(name, fn, args, kwargs, max_attempts=1)
+            self._history.set(job.id, job)
+            print(f"⚠️ Job queue full, running {name} inline")
+            self._run(job)
+            return job
+
+    def _work(self, q):
+        while True:
+            job = q.get()
+            try:
+                self._run(job)
+            finally:
+                q.task_done()
+
+    def _run(self, job):
+        with self._lock:
+            if self._queued_keys.get(job.key) is job:
+                del self._queued_keys[job.key]
+            self._running += 1
+        job.started_at = time.time()
+        metrics.observe('aria_job_queue_wait_seconds', job.started_at - job.enqueued_at, job=job.name)
+        try:
+            while True:
+                job.attempts += 1
+                job.status = 'running'
+                started = time.perf_counter()
+                try:
+                    job.result = job.fn(*job.args, **job.kwargs)
+                    metrics.observe('aria_job_seconds', time.perf_counter() - started, job=job.name)
+                    job.status = 'done'
+                    job.error = None
+                    break
+                except Exception as e:
+                    metrics.observe('aria_job_seconds', time.perf_counter() - started, job=job.name)
+                    job.error = str(e)
+                    if job.attempts >= job.max_attempts:
+                        job.status = 'failed'
+                        print(f"❌ Job {job.name} ({job.id}) failed after {job.attempts} attempts: {e}")
+                        break
+                    job.status = 'retrying'
+                    delay = self.backoff * 2 ** (job.attempts - 1)
+                    metrics.inc('aria_jobs_total', job=job.name, outcome='retried')
+                    print(f"🔁 Job {job.name} ({job.id}) attempt {job.attempts} failed: {e}; retrying in {delay:.1f}s")
+                    time.sleep(delay)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running -= 1
+            metrics.inc('aria_jobs_total', job=job.name, outcome=job.status)
+            job._done.set()
+
+    def get(self, job_id):
+        return self._history.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            running = self._running
+        return {
+            "workers": len(self._queues),
+            "queued": sum(q.qsize() for q in self._queues),
+            "running": running,
+            "per_worker": [q.qsize() for q in self._queues],
+        }
+
+    def drain(self, timeout=JOB_DRAIN_TIMEOUT):
+        """Wait (up to `timeout` seconds) for every queued job to finish. Returns True if idle."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                idle = self._running == 0
+            if idle and all(q.unfinished_tasks == 0 for q in self._queues):
+                return True
+            time.sleep(0.05)
+        return False
+
+
+_default = JobQueue()
+_writes = JobQueue(workers=JOB_WRITE_WORKERS, name="write")
+_pools = (_default, _writes)
+
+
+def submit(name, fn, *args, **kwargs):
+    return _default.submit(name, fn, *args, **kwargs)
+
+
+def submit_or_run(name, fn, *args, **kwargs):
+    return _default.submit_or_run(name, fn, *args, **kwargs)
+
+
+def submit_write(name, fn, *args, **kwargs):
+    """Queue a user-data write on the write pool (keyed jobs there keep their order)."""
+    return _writes.submit_or_run(name, fn, *args, **kwargs)
+
+
+def get(job_id):
+    return _default.get(job_id) or _writes.get(job_id)
+
+
+def stats():
+    return {**_default.stats(), "writes": _writes.stats()}
+
+
+def drain(timeout=JOB_DRAIN_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    return all([pool.drain(max(0.0, deadline - time.monotonic())) for pool in _pools])
+
+
+@atexit.register
+def _drain_on_exit():
+    for pool in _pools:
+        if pool._threads and not pool.drain():
+            print(f"⚠️ Exiting with {pool.stats()['queued']} background {pool.name} jobs still queued")
+
+
+metrics.describe('aria_jobs_total', 'Background jobs by job name and outcome (done, failed, retried, deduped, rejected).')
+metrics.describe('aria_job_seconds', 'Time spent running one attempt of a background job.')
+metrics.describe('aria_job_queue_wait_seconds', 'Time background jobs waited in the queue before starting.')
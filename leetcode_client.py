@@ -0,0 +1,185 @@
+"""LeetCode GraphQL client with a per-username stale-while-revalidate cache."""
+
+import os
+import threading
+import time
+
+import requests
+
+import http_pool
+import jobs
+import metrics
+from cache import TTLCache
+
+LEETCODE_GRAPHQL_URL = os.environ.get("LEETCODE_GRAPHQL_URL", "https://leetcode.com/graphql")
+LEETCODE_TIMEOUT = float(os.environ.get("LEETCODE_TIMEOUT", 10))
+# Served straight from cache for this long...
+LEETCODE_CACHE_TTL = int(os.environ.get("LEETCODE_CACHE_TTL", 5 * 60))
+# ...then served stale while a background refresh runs, up to this age...
+LEETCODE_SWR_WINDOW = int(os.environ.get("LEETCODE_SWR_WINDOW", 60 * 60))
+# ...and kept as a fallback for when LeetCode is down or times out.
+LEETCODE_MAX_STALE = int(os.environ.get("LEETCODE_MAX_STALE", 7 * 24 * 60 * 60))
+
+PROFILE_QUERY = """
+    query getUserProfile($username: String!) {
+        matchedUser(username: $username) {
+            username
+            submitStats: submitStatsGlobal {
+                acSubmissionNum {
+                    difficulty
+                    count
+                    submissions
+                }
+            }
+            profile {
+                ranking
+                starRating
+            }
+        }
+        allQuestionsCount {
+            difficulty
+            count
+        }
+    }
+    """
+
+
+class LeetCodeError(Exception):
+    """LeetCode answered, but not with a usable profile (never cached)."""
+
+
+class UserNotFound(LeetCodeError):
+    pass
+
+
+@metrics.timed('leetcode.fetch')
+def fetch_profile(username, url=LEETCODE_GRAPHQL_URL, timeout=LEETCODE_TIMEOUT):
+    """One upstream GraphQL call.
+
+    Raises requests.exceptions.Timeout on timeout, requests.HTTPError on a
+    non-2xx status and LeetCodeError on a GraphQL error or missing user.
+    """
+    resp = http_pool.session('leetcode', retries=1).post(
+        url,
+        json={'query': PROFILE_QUERY, 'variables': {'username': username}},
+        headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Referer': f'https://leetcode.com/{username}/',
+            'Accept': 'application/json',
+            'Origin': 'https://leetcode.com',
+            'x-csrftoken': 'na'
+        },
+        timeout=(http_pool.HTTP_CONNECT_TIMEOUT, timeout)
+    )
+    resp.raise_for_status()
+    payload = resp.json()
+    errors = payload.get('errors')
+    if errors:
+        message = errors[0].get('message') if isinstance(errors, list) and isinstance(errors[0], dict) else str(errors)
+        raise (UserNotFound if 'does not exist' in str(message) else LeetCodeError)(f"LeetCode: {message}")
+    if not (payload.get('data') or {}).get('matchedUser'):
+        raise UserNotFound(f"User @{username} not found on LeetCode")
+    return payload
+
+
+class _Call:
+    """An in-flight upstream fetch that concurrent requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LeetCodeStatsCache:
+    """Per-username cache with request coalescing and stale-while-revalidate.
+
+    get() returns (payload, state) where state is one of:
+      "hit"   — fresh cached value
+      "stale" — older value served while a refresh runs (or because upstream failed)
+      "miss"  — fetched from LeetCode for this request
+    """
+
+    def __init__(self, fetch=fetch_profile, ttl=LEETCODE_CACHE_TTL, swr_window=LEETCODE_SWR_WINDOW,
+                 max_stale=LEETCODE_MAX_STALE, maxsize=1024):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.swr_window = swr_window
+        self._cache = TTLCache(maxsize=maxsize, ttl=max_stale)  # key -> (payload, fetched_at)
+        self._inflight = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        key = username.lower()
+        entry = self._cache.get(key)
+        if entry:
+            payload, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                return payload, "hit"
+            if age < self.swr_window:
+                self.refresh_async(username)
+                return payload, "stale"
+
+        try:
+            return self._fetch_coalesced(key, username), "miss"
+        except Exception:
+            if entry:
+                print(f"⚠️ LeetCode fetch failed for {username}, serving cached copy")
+                return entry[0], "stale"
+            raise
+
+    def refresh_async(self, username):
+        """Refresh in the background; one refresh per username at a time. Returns False if none was started."""
+        key = username.lower()
+        with self._lock:
+            if key in self._refreshing or key in self._inflight:
+                return False
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._fetch_coalesced(key, username)
+            except Exception as e:
+                print(f"⚠️ LeetCode background refresh failed for {username}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        try:
+            jobs.submit('leetcode_refresh', run, key=f"leetcode:{key}", max_attempts=1)
+        except jobs.QueueFull:
+            # The stale copy is still served; the next stale read tries again
+            with self._lock:
+                self._refreshing.discard(key)
+            return False
+        return True
+
+    def invalidate(self, username):
+        self._cache.pop(username.lower())
+
+    def _fetch_coalesced(self, key, username):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if leader:
+            try:
+                call.result = self.fetch(username)
+                self._cache.set(key, (call.result, time.time()))
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
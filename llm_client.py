@@ -0,0 +1,256 @@
+"""Resilient wrapper around the OpenAI-compatible LLM endpoints (Groq + fallback).
+
+ResilientLLM.create() has the same shape as client.chat.completions.create().
+- Every call has a deadline.
+- 429/5xx/connection errors are retried with exponential backoff, honouring Retry-After.
+- A non-streaming call can be hedged: if the first attempt is slower than the recent
+  p95, a second one is fired and whichever answers first wins.
+- When the primary endpoint is exhausted (or rejects the key), the call moves on to
+  the fallback endpoint, e.g. Gemini's OpenAI-compatible API when GEMINI_API_KEY is set.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+
+import openai
+from openai import OpenAI, DefaultHttpxClient
+
+import http_pool
+import metrics
+
+GEMINI_OPENAI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+# Secondary OpenAI-compatible endpoint. Defaults to Gemini when GEMINI_API_KEY is set.
+LLM_FALLBACK_API_KEY = os.environ.get("LLM_FALLBACK_API_KEY") or os.environ.get("GEMINI_API_KEY")
+LLM_FALLBACK_BASE_URL = os.environ.get("LLM_FALLBACK_BASE_URL", GEMINI_OPENAI_BASE_URL)
+LLM_FALLBACK_MODEL = os.environ.get("LLM_FALLBACK_MODEL", "gemini-2.0-flash")
+
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE", 45))
+LLM_MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", 3))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 8))
+# Hedging costs extra tokens, so it is opt-in
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", 1.0))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+
+
+class LLMError(Exception):
+    """An LLM call that could not be completed. `status` is the HTTP status to surface."""
+
+    def __init__(self, message, status=503, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Endpoint:
+    """One OpenAI-compatible API. `model`, if set, replaces whatever model the caller asked for."""
+
+    def __init__(self, name, client, model=None):
+        self.name = name
+        self.client = client
+        self.model = model
+
+    @property
+    def base_url(self):
+        return str(self.client.base_url)
+
+
+def make_client(api_key, base_url, pool_name):
+    """OpenAI SDK client on the shared keep-alive pool. SDK retries are off; ResilientLLM retries."""
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=http_pool.httpx_client(pool_name, client_cls=DefaultHttpxClient),
+        max_retries=0,
+    )
+
+
+def fallback_endpoint():
+    """The configured secondary endpoint, or None."""
+    if not LLM_FALLBACK_API_KEY:
+        return None
+    return Endpoint("fallback", make_client(LLM_FALLBACK_API_KEY, LLM_FALLBACK_BASE_URL, "llm-fallback"),
+                    model=LLM_FALLBACK_MODEL)
+
+
+def retry_after_seconds(exc):
+    """Seconds from a Retry-After / retry-after-ms header on an API error, if any."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    ms = headers.get('retry-after-ms')
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(exc):
+    """'rate_limited' | 'server_error' | 'timeout' | 'connection' | 'auth' | None (not retryable)."""
+    if isinstance(exc, (openai.APITimeoutError, TimeoutError)):
+        return 'timeout'
+    if isinstance(exc, openai.APIConnectionError):
+        return 'connection'
+    if isinstance(exc, openai.APIStatusError):
+        if exc.status_code == 429:
+            return 'rate_limited'
+        if exc.status_code >= 500:
+            return 'server_error'
+        if exc.status_code in (401, 403):
+            return 'auth'
+    return None
+
+
+class _Latency:
+    """Recent successful call durations, for the hedging delay."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientLLM:
+    """Deadline, retry/backoff, optional hedging and fallback across `endpoints` (in order)."""
+
+    def __init__(self, endpoints, deadline=LLM_DEADLINE, max_attempts=LLM_MAX_ATTEMPTS,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX, hedge=LLM_HEDGE):
+        self.endpoints = [e for e in endpoints if e is not None]
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self._latency = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge") if hedge else None
+
+    def create(self, model, messages, stream=False, deadline=None, **kwargs):
+        """chat.completions.create() with retries and fallback. Raises LLMError when out of options.
+
+        Streams are retried only while opening; once chunks flow, errors reach the caller.
+        """
+        expires = time.monotonic() + (deadline or self.deadline)
+        last = LLMError("No LLM endpoint configured", status=503)
+        for index, endpoint in enumerate(self.endpoints):
+            if index:
+                metrics.inc('aria_llm_fallback_total', endpoint=endpoint.name)
+                print(f"↪️ Falling back to {endpoint.name} LLM endpoint ({endpoint.model or model})")
+            try:
+                return self._with_retries(endpoint, endpoint.model or model, messages, stream, expires, kwargs)
+            except LLMError as e:
+                last = e
+                if e.status not in (401, 403, 429, 503, 504):
+                    break  # a bad request fails the same way everywhere
+        raise last
+
+    def _with_retries(self, endpoint, model, messages, stream, expires, kwargs):
+        latency = self._latency_for(endpoint, model)
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise LLMError(f"{endpoint.name}: deadline exceeded", status=504)
+            attempt += 1
+
+            def call():
+                started = time.monotonic()
+                result = endpoint.client.with_options(timeout=remaining).chat.completions.create(
+                    model=model, messages=messages, stream=stream, **kwargs
+                )
+                latency.add(time.monotonic() - started)
+                return result
+
+            try:
+                if self._pool and not stream:
+                    return self._hedged(call, latency, remaining)
+                return call()
+            except Exception as e:
+                reason = classify(e)
+                status = getattr(e, 'status_code', None)
+                if reason is None:
+                    raise LLMError(f"{endpoint.name}: {e}", status=status if status and status < 500 else 502)
+                if reason == 'auth':
+                    raise LLMError(f"{endpoint.name}: API key rejected", status=status)
+                retry_after = retry_after_seconds(e)
+                final_status = 429 if reason == 'rate_limited' else (504 if reason == 'timeout' else 503)
+                if attempt >= self.max_attempts:
+                    raise LLMError(f"{endpoint.name}: {reason} after {attempt} attempts", status=final_status,
+                                   retry_after=retry_after)
+                delay = retry_after if retry_after is not None else min(
+                    self.backoff_max, self.backoff_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                if delay >= expires - time.monotonic():
+                    raise LLMError(f"{endpoint.name}: {reason}, retry in {delay:.1f}s is past the deadline",
+                                   status=final_status, retry_after=retry_after)
+                metrics.inc('aria_llm_retries_total', endpoint=endpoint.name, reason=reason)
+                print(f"🔁 {endpoint.name} {reason} (attempt {attempt}/{self.max_attempts}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _hedged(self, call, latency, remaining):
+        """Run `call`; if it's slower than the recent p95, race a second copy against it."""
+        p95 = latency.quantile(0.95)
+        first = self._pool.submit(call)
+        if p95 is None:
+            return first.result(timeout=remaining)
+        done, _ = wait([first], timeout=max(LLM_HEDGE_MIN_DELAY, p95))
+        if done:
+            return first.result()
+
+        metrics.inc('aria_llm_hedges_total', outcome='fired')
+        second = self._pool.submit(call)
+        pending = {first, second}
+        error = None
+        expires = time.monotonic() + remaining
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, expires - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("hedged LLM call timed out")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        metrics.inc('aria_llm_hedges_total', outcome='won')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _latency_for(self, endpoint, model):
+        key = (endpoint.name, model)
+        with self._lock:
+            if key not in self._latency:
+                self._latency[key] = _Latency()
+            return self._latency[key]
+
+
+metrics.describe('aria_llm_retries_total', 'LLM call retries by endpoint and reason (rate_limited, server_error, timeout, connection).')
+metrics.describe('aria_llm_fallback_total', 'LLM calls that moved on to the fallback endpoint.')
+metrics.describe('aria_llm_hedges_total', 'Hedged LLM requests fired, and how many of them won.')
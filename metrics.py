@@ -0,0 +1,193 @@
+"""Request timing spans, histograms and counters, exposed at /api/metrics.
+
+Each request gets a trace. `span()` times one section of the hot path (prompt
+build, LLM call, parsing, Supabase, LeetCode). The result lands in the current
+trace and in a process-wide histogram. Metrics are per worker process; with
+several gunicorn workers every scrape sees one worker's counts.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds. Covers a cached Supabase read (~5 ms) through a slow 70B completion (~30 s).
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> Histogram
+_counters = {}    # (name, labels) -> float
+_help = {}
+_trace = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram, Prometheus style."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name, text):
+    """HELP text for a metric name."""
+    _help[name] = text
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        with _lock:
+            hist = _histograms.setdefault(key, Histogram())
+    hist.observe(value)
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+# --- Per-request traces ---
+
+def begin_trace():
+    """Start collecting spans for the current request (called from before_request)."""
+    _trace.spans = []
+    _trace.started = time.perf_counter()
+
+
+def end_trace():
+    """Stop collecting. Returns (total_seconds, [(span, seconds), ...]) or None if no trace was open."""
+    spans = getattr(_trace, 'spans', None)
+    if spans is None:
+        return None
+    total = time.perf_counter() - _trace.started
+    _trace.spans = None
+    return total, spans
+
+
+def current_spans():
+    return list(getattr(_trace, 'spans', None) or [])
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as `name` and add it to the current trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe('aria_span_duration_seconds', elapsed, span=name)
+        spans = getattr(_trace, 'spans', None)
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_usage(model, usage):
+    """Count prompt/completion tokens from an OpenAI-style `usage` object."""
+    if usage is None:
+        return
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        value = getattr(usage, kind, None)
+        if value is None and isinstance(usage, dict):
+            value = usage.get(kind)
+        if value:
+            inc('aria_llm_tokens_total', value, model=model, kind=kind.split('_')[0])
+
+
+def format_trace(total, spans):
+    """'812ms · prompt_build 2ms · llm 790ms' for the per-request log line."""
+    parts = [f"{total * 1000:.0f}ms"] + [f"{name} {seconds * 1000:.0f}ms" for name, seconds in spans]
+    return ' · '.join(parts)
+
+
+def server_timing(spans):
+    """Server-Timing header value so browser devtools show the same breakdown."""
+    return ', '.join(f"{name.replace('.', '-')};dur={seconds * 1000:.1f}" for name, seconds in spans)
+
+
+# --- Exposition ---
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+
+    lines = []
+    typed = set()
+    for (name, labels), hist in histograms:
+        if name not in typed:
+            typed.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+        counts, total, count = hist.snapshot()
+        for bound, n in zip(hist.buckets, counts):
+            lines.append(f"{name}_bucket{_labels(labels, [('le', repr(bound))])} {n}")
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(labels)} {value:g}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+describe('aria_http_request_duration_seconds', 'Time spent serving API requests.')
+describe('aria_span_duration_seconds', 'Time spent in one section of a request (prompt_build, llm, parse, supabase.*, leetcode.*).')
+describe('aria_upstream_request_seconds', 'Round-trip time of outbound HTTP calls per upstream pool.')
+describe('aria_intent_fastpath_total', 'Chat messages answered by the local intent rules instead of the LLM.')
+describe('aria_llm_tokens_total', 'Prompt and completion tokens reported by the LLM provider.')
@@ -0,0 +1,87 @@
+"""Routes each chat turn to the fast small model or the large one.
+
+Acknowledgements, single-action logging and short lookups go to FAST_MODEL.
+Planning, prioritising, milestone breakdowns, quiz grading and long messages go
+to SMART_MODEL. Every decision is counted and every call's latency is recorded
+per model/tier/reason in /api/metrics, so the thresholds can be tuned from data.
+"""
+
+import os
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import metrics
+
+FAST_MODEL = os.environ.get("ARIA_FAST_MODEL", "llama-3.1-8b-instant")
+SMART_MODEL = os.environ.get("ARIA_SMART_MODEL", "llama-3.3-70b-versatile")
+QUIZ_MODEL = os.environ.get("ARIA_QUIZ_MODEL", FAST_MODEL)
+MODEL_ROUTING_ENABLED = os.environ.get("ARIA_MODEL_ROUTING", "1") != "0"
+# Messages longer than this always go to the large model
+FAST_MAX_WORDS = int(os.environ.get("ARIA_FAST_MAX_WORDS", 16))
+
+Route = namedtuple('Route', 'tier model reason')
+
+_ACK = re.compile(
+    r"(?:ok(?:ay)?|k|kk|thanks?(?: you)?|thx|ty|cool|nice|great|awesome|got it|sure|yes|yeah|yep|no|nope|"
+    r"lol|haha|perfect|sounds good|hi|hey|hello|good (?:morning|night))[\s.!👍🙏😊]*",
+    re.I,
+)
+_COMPLEX = re.compile(
+    r"\b(?:focus|prioriti[sz]e|priorit(?:y|ies)|plan(?:ning)?|schedule|break (?:it |this |that )?down|"
+    r"milestones?|dissertation|thesis|project|strategy|explain|why|how (?:do|should|can|would)|compare|"
+    r"summari[sz]e|wrap ?up|advice|recommend|review|overwhelmed|stressed)\b",
+    re.I,
+)
+_SINGLE_ACTION = re.compile(
+    r"(?:please\s+)?(?:log|add|note|remind me|delete|remove|mark|complete|finished|done with|spent|paid|"
+    r"set|save|went|skipped|got|my period)\b",
+    re.I,
+)
+
+
+def route(message, context=None):
+    """Pick a model for this chat turn."""
+    text = ' '.join((message or '').split())
+    context = context or {}
+
+    if not MODEL_ROUTING_ENABLED:
+        decision = Route('smart', SMART_MODEL, 'routing_disabled')
+    elif context.get('inQuiz'):
+        decision = Route('smart', SMART_MODEL, 'quiz_grading')
+    elif _ACK.fullmatch(text):
+        decision = Route('fast', FAST_MODEL, 'acknowledgement')
+    elif _COMPLEX.search(text):
+        decision = Route('smart', SMART_MODEL, 'complex_request')
+    elif len(text.split()) > FAST_MAX_WORDS or (message or '').count('\n') >= 2:
+        decision = Route('smart', SMART_MODEL, 'long_message')
+    elif _SINGLE_ACTION.match(text):
+        decision = Route('fast', FAST_MODEL, 'single_action')
+    elif context.get('pendingDeadline'):
+        decision = Route('fast', FAST_MODEL, 'pending_followup')
+    else:
+        decision = Route('fast', FAST_MODEL, 'short_query')
+
+    metrics.inc('aria_model_route_total', tier=decision.tier, reason=decision.reason)
+    return decision
+
+
+@contextmanager
+def timed(decision):
+    """Time an LLM call as the 'llm' span and by model/tier/reason."""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        with metrics.span('llm'):
+            yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        metrics.observe('aria_llm_request_seconds', time.perf_counter() - started,
+                        model=decision.model, tier=decision.tier, reason=decision.reason, outcome=outcome)
+
+
+metrics.describe('aria_model_route_total', 'Chat turns routed to each model tier, by routing reason.')
+metrics.describe('aria_llm_request_seconds', 'LLM call latency by model, tier and routing reason.')
@@ -0,0 +1,476 @@
+"""System prompt construction for Aria chat requests.
+
+The prompt is split in two so the provider can reuse its prefix cache:
+an immutable instruction/schema prefix that is identical for every request,
+followed by a compact per-request USER CONTEXT suffix.
+"""
+
+import json
+import math
+import os
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+# Upper bound on tokens spent replaying earlier chat turns, and on the
+# one-line summary that stands in for turns that no longer fit.
+HISTORY_TOKEN_BUDGET = int(os.environ.get("ARIA_HISTORY_TOKEN_BUDGET", 1500))
+HISTORY_SUMMARY_TOKEN_BUDGET = int(os.environ.get("ARIA_HISTORY_SUMMARY_TOKEN_BUDGET", 150))
+
+# Upper bound on tokens spent listing deadlines, study tasks, notes and pending
+# splitwise items in USER CONTEXT; the most relevant ones to the message go in first.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("ARIA_CONTEXT_TOKEN_BUDGET", 800))
+# Items dated further back than this are dropped unless the message mentions them
+CONTEXT_PAST_DAYS = int(os.environ.get("ARIA_CONTEXT_PAST_DAYS", 14))
+
+STATIC_PROMPT = """You are Aria, a warm, witty, and smart personal AI assistant. The user's name and data are in USER CONTEXT at the end of this prompt.
+
+YOUR PERSONALITY:
+- Address the user by their name naturally (not in every sentence — just occasionally)
+- Warm, friendly, slightly witty — like a brilliant best friend, not a robot
+- Encouraging but will gently call out procrastination
+- Use emojis occasionally (1-2 per message max)
+- Keep responses SHORT and punchy unless detail is needed
+- If user asks "what should I focus on today" → give a prioritized, actionable answer based on deadlines
+
+WHAT YOU CAN DO:
+1. DEADLINES — add/update/complete/list deadlines from natural language
+2. STUDY TOPICS — track topic plans and completions per subject
+3. GYM — log gym visits/skips, analyze streaks
+4. PERIOD & CYCLE — log start/end dates, predict next period, track phases (follicular/ovulation/luteal/PMS)
+5. DAILY WRAP-UP — ask what they accomplished, then log it
+6. QUIZ — generate questions and grade answers conversationally
+7. NOTES — save and recall quick notes
+8. FINANCES — log balance, track expenses/income, manage splitwise reminders
+9. MILESTONES — break down major projects (e.g. Dissertation) into multiple deadlines with the same 'subject'.
+10. GENERAL — study advice, focus recommendations, accountability
+
+STRATEGY FOR PROJECTS:
+- When a user adds a large project (like a dissertation or thesis), suggest breaking it down into 3-5 milestones or "reports".
+- Each milestone should be added as a separate ADD_DEADLINE action with the same 'subject' (e.g., 'Dissertation').
+- This ensures they stay grouped together in the user's view.
+
+CRITICAL: YOUR RESPONSE FORMAT
+You MUST ALWAYS respond with ONLY valid JSON. No text before or after. No markdown fences.
+
+{"message": "Your natural language response", "action": null}
+
+{"message": "Your natural language response", "action": {"type": "ACTION_TYPE", "data": {}}}
+
+OR with multiple actions:
+
+{"message": "Your natural language response", "actions": [ {"type": "ACTION_TYPE", "data": {}}, {"type": "ACTION_TYPE", "data": {}} ]}
+
+AVAILABLE ACTIONS AND DATA SCHEMAS:
+
+ADD_DEADLINE:
+  data: { "title": "str", "subject": "str", "dueDate": "YYYY-MM-DD", "startDate": "YYYY-MM-DD or null", "type": "assignment|exam|project|job_application", "askingForStartDate": true/false }
+  RULE: If the user did NOT provide a start date, set startDate to null, askingForStartDate to true, and ASK for it in your message.
+  RULE: If they provided both dates, set askingForStartDate to false and save immediately.
+
+UPDATE_DEADLINE:
+  data: { "id": "str", "updates": { ... } }
+
+COMPLETE_DEADLINE:
+  data: { "id": "str", "title": "str" }
+
+DELETE_DEADLINE:
+  data: { "id": "str" }
+
+ADD_NOTE:
+  data: { "text": "str", "date": "YYYY-MM-DD or null" }
+  RULE: If the user says "remind me on [date]" or "note for [date]", include that date. This helps items reflect on the calendar.
+
+DELETE_NOTE:
+  data: { "id": "str" }
+
+LOG_GYM:
+  data: { "date": "YYYY-MM-DD", "didGo": true/false }
+
+LOG_PERIOD_START:
+  data: { "date": "YYYY-MM-DD" }
+
+LOG_PERIOD_END:
+  data: { "startDate": "YYYY-MM-DD", "endDate": "YYYY-MM-DD" }
+
+GET_CYCLE_PREDICTION:
+  data: { "action": "predict" }
+
+ADD_STUDY_TASK:
+  data: { "subject": "str", "task": "str", "startDate": "YYYY-MM-DD|null", "endDate": "YYYY-MM-DD|null" }
+  RULE: If user mentions a sub-task/report/deadline for a subject, use this.
+
+COMPLETE_STUDY_TASK:
+  data: { "subject": "str", "id": "str" }
+
+REMOVE_STUDY_TASK:
+  data: { "subject": "str", "id": "str" }
+
+LOG_DAILY_PROGRESS:
+  data: { "summary": "str", "date": "YYYY-MM-DD" }
+
+START_QUIZ:
+  data: { "quizType": "leetcode|subject|mixed", "count": 5, "subject": "optional str" }
+  NOTE: Use this ONLY for the initial quiz request. The quiz questions will be fetched separately.
+
+GRADE_QUIZ:
+  data: { "score": int, "total": int, "subject": "str" }
+
+ADD_SUBJECT:
+  data: { "subject": "str" }
+
+REMOVE_SUBJECT:
+  data: { "subject": "str" }
+
+SET_BALANCE:
+  data: { "amount": float }
+  RULE: Use when user states their current total balance
+
+ADD_TRANSACTION:
+  data: { "amount": float, "description": "str", "type": "expense|income", "date": "YYYY-MM-DD or null" }
+
+ADD_SPLITWISE:
+  data: { "amount": float, "description": "str", "date": "YYYY-MM-DD or null" }
+
+COMPLETE_SPLITWISE:
+  data: { "id": "str", "description": "str" }
+
+RULES:
+1. Return ONLY valid JSON — nothing else ever
+2. Make "message" warm, natural, conversational
+3. Never fabricate deadline data — only use what's in USER CONTEXT
+4. For "daily wrapup" → first ask what they accomplished (action: null), THEN when they tell you, return LOG_DAILY_PROGRESS
+5. Parse natural dates intelligently: "next friday", "in 2 weeks", "april 2nd" → YYYY-MM-DD based on "today" in USER CONTEXT
+6. When listing deadlines, format them nicely in the message text (not raw JSON)
+7. If the user marks a deadline complete, find its ID from the deadlines list and use COMPLETE_DEADLINE
+8. For Finance: parse implicit money updates, e.g. "I spent $20 on groceries" triggers ADD_TRANSACTION. Include the date if specified.
+9. If user says they added something to Splitwise, find it in the pending splitwise items in USER CONTEXT and trigger COMPLETE_SPLITWISE
+10. STUDY HUB: This is for tracking academic tasks (reports, labs, study sessions) with specific dates. If the user mentions a task for a subject (e.g. "Data Mining: Report, March 16"), ALWAYS trigger ADD_STUDY_TASK.
+11. PROACTIVE STUDY CHECK-IN: If `startDate` < today < `endDate` for a task in STUDY HUB, ask about progress.
+12. FOR STUDY/HOMEWORK/ASSIGNMENTS: Prefer ADD_STUDY_TASK over ADD_DEADLINE if it's related to a course subject.
+13. For PERIOD TRACKING: Use LOG_PERIOD_START/END actions.
+14. CYCLE PREDICTION: Use GET_CYCLE_PREDICTION action.
+15. CALENDAR: Ensure ALL dates use YYYY-MM-DD for consistency.
+16. SUBJECT AUTOMATION: Adding a study task automatically creates or updates the subject across all views.
+17. PERFORMANCE: Keep messages concise and direct. Do not repeat user data unnecessarily.
+"""
+
+
+@lru_cache(maxsize=1)
+def static_prompt_prefix():
+    """The user-independent part of the system prompt (built once per process)."""
+    return STATIC_PROMPT.strip()
+
+
+def compact_json(value):
+    """Minified JSON for prompt embedding."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "the and for with what when how did does have has are was were you your this that from into "
+    "about just can could should would will need want any all some my me its due today".split()
+)
+
+
+def _terms(text):
+    """Lower-cased content words, crudely singularised, for lexical overlap."""
+    terms = set()
+    for word in _WORD_RE.findall((text or '').lower()):
+        if len(word) < 3 or word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.add(word)
+    return terms
+
+
+def _as_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _days_from(value, today):
+    day = _as_date(value)
+    return (day - today).days if day else None
+
+
+def _relevance(lexical, days, mentioned):
+    """Combine lexical relevance with how close an item's date is to today.
+
+    Returns None for items that are far in the past and not mentioned.
+    """
+    if days is None:
+        proximity = 0.3
+    elif days >= 0:
+        proximity = 1 / (1 + days / 7)
+    elif days >= -CONTEXT_PAST_DAYS:
+        proximity = 0.8 / (1 + -days / 7)  # overdue: still worth a nudge
+    elif not mentioned:
+        return None
+    else:
+        proximity = 0.0
+    return 3 * lexical + proximity
+
+
+def _slim(item, drop=()):
+    return {k: v for k, v in item.items() if k not in drop and v not in (None, '', [], {})}
+
+
+def _candidates(context):
+    """(section, group, date, text, payload) for every open list item in the context."""
+    for d in context.get('deadlines') or []:
+        if not isinstance(d, dict) or d.get('status') == 'done':
+            continue
+        text = f"{d.get('title', '')} {d.get('subject', '')} {d.get('type', '')}"
+        yield 'deadlines', None, d.get('dueDate'), text, _slim(d, ('status', 'createdAt', 'midwayChecked'))
+
+    for subject, entry in (context.get('studyTasks') or {}).items():
+        tasks = entry.get('tasks', []) if isinstance(entry, dict) else entry
+        for t in tasks or []:
+            if not isinstance(t, dict) or t.get('status') == 'done':
+                continue
+            yield ('studyTasks', subject, t.get('endDate') or t.get('startDate'),
+                   f"{subject} {t.get('name', '')}", _slim(t, ('status', 'completedAt')))
+
+    for subject, topics in (context.get('topics') or {}).items():
+        yield 'topics', subject, None, f"{subject} {compact_json(topics)}", topics
+
+    for n in context.get('notes') or []:
+        if isinstance(n, dict) and n.get('text'):
+            yield 'notes', None, n.get('date'), n['text'], n['text']
+
+    for s in context.get('splitwiseReminders') or []:
+        if isinstance(s, dict) and s.get('status') == 'pending':
+            # Still owed however old, so the date doesn't count against it
+            yield 'pendingSplitwise', None, None, s.get('description', ''), _slim(s, ('status',))
+
+
+def select_context_items(context, message='', budget=None):
+    """Pick the list items for USER CONTEXT that fit the token budget, most relevant first.
+
+    Completed items and items far in the past are dropped. The rest are ranked
+    by IDF-weighted word overlap with `message` and by date proximity to `today`,
+    then packed greedily into `budget` tokens. Returns ({section: items}, {section: omitted}).
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    today = _as_date(context.get('today')) or date.today()
+    terms = _terms(message)
+    candidates = [(c, _terms(c[3])) for c in _candidates(context)]
+
+    # Rare words ("kafka") say more about what the message is after than common ones ("lab")
+    df = {}
+    for _, item_terms in candidates:
+        for term in item_terms & terms:
+            df[term] = df.get(term, 0) + 1
+    idf = {term: math.log(1 + len(candidates) / n) for term, n in df.items()}
+
+    scored = []
+    omitted = {}
+    for index, ((section, group, when, _, payload), item_terms) in enumerate(candidates):
+        overlap = item_terms & terms
+        lexical = sum(idf[t] for t in overlap) / math.sqrt(len(item_terms)) if overlap else 0.0
+        score = _relevance(lexical, _days_from(when, today), bool(overlap))
+        if score is None:
+            continue
+        scored.append((-score, index, section, group, when, payload))
+
+    picked = []
+    used = 0
+    for item in sorted(scored):
+        section, group, payload = item[2], item[3], item[5]
+        cost = estimate_tokens(compact_json(payload)) + (2 if group is None else estimate_tokens(group) + 2)
+        if used + cost > budget:
+            omitted[section] = omitted.get(section, 0) + 1
+            continue
+        picked.append(item)
+        used += cost
+
+    # Present the picks in a stable order: soonest first within each list, notes as given
+    selected = {}
+    for _, index, section, group, when, payload in sorted(
+            picked, key=lambda p: (str(p[4] or '9999'), p[1]) if p[2] != 'notes' else ('', p[1])):
+        if group is None:
+            selected.setdefault(section, []).append(payload)
+        else:
+            selected.setdefault(section, {}).setdefault(group, []).append(payload)
+    if 'topics' in selected:
+        selected['topics'] = {subject: items[0] for subject, items in selected['topics'].items()}
+    return selected, omitted
+
+
+def build_context_block(context, message=''):
+    """Render the per-request USER CONTEXT suffix, with list items pruned to the message."""
+    user_name = context.get('userName', 'friend')
+    subjects = context.get('subjects', [])
+    gym = context.get('gym', {})
+    period_ctx = context.get('periodContext', {})
+    quiz_history = context.get('quizHistory', [])
+    is_pms_week = context.get('isPmsWeek', False)
+    in_quiz = context.get('inQuiz', False)
+    today = context.get('today', datetime.now().strftime('%Y-%m-%d'))
+    pending_deadline = context.get('pendingDeadline', None)
+    balance = context.get('balance', 0)
+    items, omitted = select_context_items(context, message)
+
+    user_data = {
+        "name": user_name,
+        "today": today,
+        "subjects": subjects or None,
+        "leetcodeUsername": context.get('leetcodeUsername') or None,
+        "deadlines": items.get('deadlines'),
+        "studyTasks": items.get('studyTasks'),
+        "topics": items.get('topics'),
+        "gym": {
+            "streak": gym.get('currentStreak', 0),
+            "best": gym.get('bestStreak', 0),
+            "thisWeek": gym.get('thisWeek', 0)
+        },
+        "cycle": {
+            "length": period_ctx.get('avg_cycle_length', 28),
+            "lastStart": period_ctx.get('last_period_start'),
+            "nextPredicted": period_ctx.get('predicted_next_period'),
+            "phase": period_ctx.get('phase')
+        } if period_ctx else None,
+        "notes": items.get('notes'),
+        "quizSessions": len(quiz_history),
+        "balance": balance,
+        "pendingSplitwise": items.get('pendingSplitwise'),
+        # Tells the model the lists are partial, so it doesn't claim an item doesn't exist
+        "notShown": omitted or None,
+    }
+    user_data = {k: v for k, v in user_data.items() if v is not None}
+
+    lines = [f"USER CONTEXT (JSON): {compact_json(user_data)}"]
+    if is_pms_week:
+        lines.append(
+            "\U0001f338 IMPORTANT: The user is likely in their PMS week. "
+            "Be extra gentle, warm, and supportive. Avoid pushy or critical tone."
+        )
+    if pending_deadline:
+        lines.append(
+            f"\u26a1 PENDING DEADLINE: You asked for a start date for: "
+            f"{compact_json(pending_deadline)}. The user's next message likely contains the start date. "
+            "Extract the date and return the complete ADD_DEADLINE action with askingForStartDate: false."
+        )
+    if in_quiz:
+        lines.append(
+            "\U0001f4dd QUIZ IN PROGRESS: You are mid-quiz. Grade the user's last answer, "
+            "give brief feedback, then present the next question. When all questions are answered, "
+            "give a friendly score summary and return the GRADE_QUIZ action."
+        )
+    return '\n'.join(lines)
+
+
+def build_system_prompt(context, message=''):
+    """Static prefix followed by the per-request context suffix."""
+    return f"{static_prompt_prefix()}\n\n{build_context_block(context, message)}"
+
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text):
+    """Rough BPE-style token count (words, short digit runs and punctuation each count as one)."""
+    return len(_TOKEN_RE.findall(text or ''))
+
+
+@lru_cache(maxsize=1)
+def _static_prefix_tokens():
+    return estimate_tokens(static_prompt_prefix())
+
+
+def prompt_token_report(context, usage=None, message='', system_prompt=None):
+    """Size breakdown of the system prompt for a given context.
+
+    Pass the `system_prompt` a request already built to measure it instead of
+    building the context block again. `usage` is an optional `response.usage`
+    from the provider; when it reports cached prompt tokens they are included
+    so prefix reuse can be verified.
+    """
+    prefix = static_prompt_prefix()
+    if system_prompt is not None:
+        suffix = system_prompt[len(prefix):].lstrip('\n')
+    else:
+        suffix = build_context_block(context, message)
+    report = {
+        "static_tokens": _static_prefix_tokens(),
+        "context_tokens": estimate_tokens(suffix),
+        "static_chars": len(prefix),
+        "context_chars": len(suffix),
+    }
+    report["total_tokens"] = report["static_tokens"] + report["context_tokens"]
+    report["cacheable_ratio"] = round(report["static_tokens"] / report["total_tokens"], 3)
+
+    if usage is not None:
+        report["provider_prompt_tokens"] = getattr(usage, 'prompt_tokens', None)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', None) if details else None
+        if cached is not None:
+            report["provider_cached_tokens"] = cached
+    return report
+
+
+def _history_turns(chat_history, message):
+    """Normalize client chat history into (role, content) pairs."""
+    turns = []
+    for msg in chat_history or []:
+        content = (msg.get('content') or '').strip()
+        if not content:
+            continue
+        role = 'user' if msg.get('role') == 'user' else 'assistant'
+        turns.append((role, content))
+    # The client saves the new message before sending, so it is usually repeated last
+    if turns and turns[-1] == ('user', message.strip()):
+        turns.pop()
+    return turns
+
+
+def _summarize_turns(turns, budget):
+    """Extractive stand-in for turns dropped from the window: the user's most recent asks."""
+    snippets = []
+    used = 0
+    for role, content in reversed(turns):
+        if role != 'user':
+            continue
+        snippet = content if len(content) <= 80 else content[:77] + '...'
+        cost = estimate_tokens(snippet) + 2
+        if used + cost > budget:
+            break
+        snippets.append(snippet)
+        used += cost
+    summary = f"Earlier conversation ({len(turns)} older messages omitted)."
+    if snippets:
+        summary += " Before that the user said: " + "; ".join(compact_json(s) for s in reversed(snippets))
+    return summary
+
+
+def build_history_messages(chat_history, message, budget=None):
+    """Role-tagged history messages for a chat turn, newest first until the token budget is spent.
+
+    Assistant turns are re-wrapped in the JSON reply format so the replayed
+    history doesn't teach the model to answer in prose. Turns that don't fit are
+    replaced by a short summary message.
+    """
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    turns = _history_turns(chat_history, message)
+
+    kept = []
+    used = 0
+    for role, content in reversed(turns):
+        if role == 'assistant':
+            content = compact_json({"message": content})
+        cost = estimate_tokens(content) + 4  # per-message overhead
+        if used + cost > budget:
+            break
+        kept.append({"role": role, "content": content})
+        used += cost
+    kept.reverse()
+
+    dropped = turns[:len(turns) - len(kept)]
+    if not dropped:
+        return kept
+    return [{"role": "system", "content": _summarize_turns(dropped, HISTORY_SUMMARY_TOKEN_BUDGET)}] + kept
@@ -0,0 +1,143 @@
+"""Pooled quiz questions so repeat /api/quiz requests skip the LLM."""
+
+import os
+import random
+import re
+import threading
+import time
+
+import jobs
+from cache import TTLCache
+
+QUIZ_POOL_TTL = int(os.environ.get("QUIZ_POOL_TTL", 6 * 60 * 60))
+QUIZ_POOL_MAX_KEYS = int(os.environ.get("QUIZ_POOL_MAX_KEYS", 64))
+QUIZ_POOL_TARGET = int(os.environ.get("QUIZ_POOL_TARGET", 30))
+QUIZ_POOL_LOW_WATER = int(os.environ.get("QUIZ_POOL_LOW_WATER", 10))
+# A question is retired after being served this many times
+QUIZ_POOL_MAX_SERVES = int(os.environ.get("QUIZ_POOL_MAX_SERVES", 3))
+# Only keys requested this many times (within QUIZ_POOL_TTL) are pre-generated; a one-off
+# subject/topic combination would never be served the extra questions
+QUIZ_POOL_MIN_DEMAND = int(os.environ.get("QUIZ_POOL_MIN_DEMAND", 2))
+# Refills running at once, each a few LLM calls
+QUIZ_POOL_MAX_REFILLS = int(os.environ.get("QUIZ_POOL_MAX_REFILLS", 2))
+
+_QUESTION_START = re.compile(r'^\s*Q\d+\.\s*')
+
+
+def split_questions(text):
+    """Split "Q1. ...\\n\\nQ2. ..." model output into individual question bodies (numbering removed)."""
+    questions = []
+    current = []
+    for line in (text or '').split('\n'):
+        if not line.strip():
+            if current:
+                current.append('')
+            continue
+        if _QUESTION_START.match(line):
+            if current:
+                questions.append('\n'.join(current).strip())
+            current = [_QUESTION_START.sub('', line, count=1)]
+        elif current:
+            current.append(line)
+    if current:
+        questions.append('\n'.join(current).strip())
+    return [q for q in questions if q]
+
+
+def join_questions(questions):
+    """Render question bodies back into the numbered format the client parses."""
+    return '\n\n'.join(f"Q{i}. {q}" for i, q in enumerate(questions, 1))
+
+
+def pool_key(quiz_type, subject='', focus=()):
+    """Normalized cache key. Only subject quizzes depend on the user's subject/topics."""
+    if quiz_type != 'subject':
+        return (quiz_type,)
+    return (quiz_type, subject.strip().lower(), tuple(sorted({t.strip().lower() for t in focus if t})))
+
+
+class QuizPool:
+    """TTL/LRU pool of generated questions per key, topped up in the background."""
+
+    def __init__(self, ttl=QUIZ_POOL_TTL, max_keys=QUIZ_POOL_MAX_KEYS, target=QUIZ_POOL_TARGET,
+                 low_water=QUIZ_POOL_LOW_WATER, max_serves=QUIZ_POOL_MAX_SERVES,
+                 min_demand=QUIZ_POOL_MIN_DEMAND, max_refills=QUIZ_POOL_MAX_REFILLS):
+        self.ttl = ttl
+        self.target = target
+        self.low_water = low_water
+        self.max_serves = max_serves
+        self.min_demand = min_demand
+        self.max_refills = max_refills
+        self._pools = TTLCache(maxsize=max_keys, ttl=ttl)
+        self._demand = TTLCache(maxsize=max_keys * 16, ttl=ttl)  # key -> requests seen
+        self._lock = threading.Lock()
+        self._refilling = set()
+
+    def _live(self, key):
+        """Questions for `key` that are neither expired nor retired (call with the lock held)."""
+        now = time.time()
+        return [e for e in self._pools.get(key, []) if now - e['created'] < self.ttl and e['serves'] < self.max_serves]
+
+    def take(self, key, count):
+        """Random sample of `count` pooled questions, or None if the pool can't cover it."""
+        with self._lock:
+            entries = self._live(key)
+            if len(entries) < count:
+                return None
+            picked = random.sample(entries, count)
+            for e in picked:
+                e['serves'] += 1
+            self._pools.set(key, entries)
+            return [e['text'] for e in picked]
+
+    def add(self, key, questions, serves=0):
+        """Add freshly generated questions; pass serves=1 for ones already shown to a user."""
+        now = time.time()
+        with self._lock:
+            entries = self._live(key)
+            known = {e['text'] for e in entries}
+            entries.extend({'text': q, 'created': now, 'serves': serves} for q in questions if q not in known)
+            self._pools.set(key, entries)
+
+    def size(self, key):
+        with self._lock:
+            return len(self._live(key))
+
+    def refill_async(self, key, generate, batch=10):
+        """Count a request for `key`; top its pool up to `target` in the background if it has
+        run low, has been asked for at least `min_demand` times, and fewer than
+        `max_refills` refills are running.
+
+        `generate(n)` must return a list of up to `n` question bodies.
+        """
+        with self._lock:
+            demand = (self._demand.get(key) or 0) + 1
+            self._demand.set(key, demand)
+            if (demand < self.min_demand or key in self._refilling
+                    or len(self._refilling) >= self.max_refills or len(self._live(key)) >= self.low_water):
+                return False
+            self._refilling.add(key)
+
+        def run():
+            try:
+                for _ in range(self.target // batch + 1):
+                    if self.size(key) >= self.target:
+                        break
+                    questions = generate(batch)
+                    if not questions:
+                        break
+                    self.add(key, questions)
+            except Exception as e:
+                print(f"⚠️ Quiz pool refill failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refilling.discard(key)
+
+        try:
+            jobs.submit('quiz_refill', run, max_attempts=1)
+        except jobs.QueueFull:
+            # Pre-generation is optional; try again on the next request
+            with self._lock:
+                self._refilling.discard(key)
+            return False
+        return True
@@ -0,0 +1,440 @@
+"""Server-side reminders, delivered as Web Push.
+
+Deadline and period reminders for every push subscriber are kept in a heap
+ordered by fire time. One scheduler thread per host sleeps until the earliest
+reminder is due. That thread lives in whichever gunicorn worker holds the lock
+file. Due reminders go to the job queue in batches. A delta sweep of
+push_subscriptions, user_sync and cycle_stats keeps the index current, so
+writes made through any worker are picked up.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+import http_pool
+import jobs
+import metrics
+from cache import TTLCache
+from supabase_client import (
+    calculate_cycle_stats, delete_push_subscription, forget_cycle_stats,
+    get_cycle_stats_updates, get_push_endpoints, get_push_subscriptions, get_sync_blobs
+)
+
+try:
+    from pywebpush import webpush, WebPushException
+except ImportError:  # optional: without it reminders go to the local sender
+    webpush = None
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): assume a single process
+    fcntl = None
+
+VAPID_PUBLIC_KEY = os.environ.get("VAPID_PUBLIC_KEY")
+VAPID_PRIVATE_KEY = os.environ.get("VAPID_PRIVATE_KEY")
+VAPID_SUBJECT = os.environ.get("VAPID_SUBJECT", "mailto:aria@example.com")
+
+REMINDERS_ENABLED = os.environ.get("ARIA_REMINDERS", "1") != "0"
+# 'webpush' needs the VAPID keys and pywebpush; 'local' only logs and records (dev and tests)
+PUSH_SENDER = os.environ.get("ARIA_PUSH_SENDER") or ("webpush" if VAPID_PRIVATE_KEY else "local")
+# Local hour at which date-based reminders fire
+REMINDER_HOUR = int(os.environ.get("ARIA_REMINDER_HOUR", 9))
+REMINDER_SWEEP_INTERVAL = float(os.environ.get("ARIA_REMINDER_SWEEP_INTERVAL", 60))
+REMINDER_REINDEX_INTERVAL = float(os.environ.get("ARIA_REMINDER_REINDEX_INTERVAL", 60 * 60))
+REMINDER_BATCH_SIZE = int(os.environ.get("ARIA_REMINDER_BATCH_SIZE", 100))
+# Reminders that came due this recently are still sent after a restart
+REMINDER_GRACE = float(os.environ.get("ARIA_REMINDER_GRACE", 15 * 60))
+REMINDER_LOCK_FILE = os.environ.get("ARIA_REMINDER_LOCK_FILE",
+                                    os.path.join(tempfile.gettempdir(), "aria-reminders.lock"))
+PUSH_TTL = 24 * 60 * 60
+
+DEADLINE_DAYS_BEFORE = (2, 0)
+PERIOD_DAYS_BEFORE = (3, 1, 0)
+
+Reminder = namedtuple('Reminder', 'fire_at sync_key tag title body')
+
+
+def _as_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def fire_time(day, tz_offset=0):
+    """Epoch seconds for REMINDER_HOUR on `day` in the subscriber's time zone.
+
+    `tz_offset` is JavaScript's getTimezoneOffset(): minutes to add to local time to get UTC.
+    """
+    local = datetime(day.year, day.month, day.day, REMINDER_HOUR, tzinfo=timezone.utc)
+    return (local + timedelta(minutes=tz_offset)).timestamp()
+
+
+def deadline_reminders(sync_key, deadlines, tz_offset=0):
+    """Due-soon, due-today and midway check-in reminders for open deadlines."""
+    reminders = []
+    for d in deadlines or []:
+        if not isinstance(d, dict) or d.get('status') == 'done':
+            continue
+        due = _as_date(d.get('dueDate'))
+        if not due:
+            continue
+        title = d.get('title') or 'Untitled'
+        for days in DEADLINE_DAYS_BEFORE:
+            body = f'"{title}" is due TODAY!' if days == 0 else f'"{title}" is due in {days} day{"s" if days > 1 else ""}'
+            reminders.append(Reminder(fire_time(due - timedelta(days=days), tz_offset), sync_key,
+                                      f"{d.get('id')}_due_{days}", 'Aria — Deadline Alert', body))
+        start = _as_date(d.get('startDate'))
+        if start and start < due and not d.get('midwayChecked'):
+            midway = start + (due - start) / 2
+            reminders.append(Reminder(fire_time(midway, tz_offset), sync_key, f"{d.get('id')}_mid",
+                                      'Aria — Midway Check-in', f'Did you actually start "{title}"?'))
+    return reminders
+
+
+_PERIOD_MESSAGES = {
+    3: '🌸 Your period is expected in 3 days. Get ready!',
+    1: '🌸 Your period is expected tomorrow. Stay prepared!',
+    0: '🌸 Your period might start today or soon. Take it easy!',
+}
+
+
+def period_reminders(sync_key, stats, tz_offset=0):
+    """Reminders ahead of the next predicted period from calculate_cycle_stats()."""
+    predicted = _as_date((stats or {}).get('predicted_next_period'))
+    if not predicted:
+        return []
+    return [
+        Reminder(fire_time(predicted - timedelta(days=days), tz_offset), sync_key,
+                 f"period_{predicted.isoformat()}_{days}", 'Aria — Period Reminder',
+                 _PERIOD_MESSAGES.get(days, f'🌸 Your period is expected in {days} days.'))
+        for days in PERIOD_DAYS_BEFORE
+    ]
+
+
+def build_reminders(sync_key, deadlines, period_user_id, tz_offset=0):
+    reminders = deadline_reminders(sync_key, deadlines, tz_offset)
+    if period_user_id:
+        reminders += period_reminders(sync_key, calculate_cycle_stats(period_user_id), tz_offset)
+    return reminders
+
+
+def payload_for(reminder):
+    return {"title": reminder.title, "body": reminder.body, "tag": reminder.tag}
+
+
+# --- Senders ---
+
+class LocalSender:
+    """Records pushes instead of sending them, for development and tests."""
+
+    def __init__(self):
+        self.sent = deque(maxlen=500)
+
+    def send(self, subscription, payload):
+        self.sent.append((subscription.get('endpoint'), payload))
+        print(f"🔔 [local push] {payload.get('title')}: {payload.get('body')}")
+        return 201
+
+
+class WebPushSender:
+    """VAPID-signed Web Push through pywebpush, on a pooled HTTP session."""
+
+    def send(self, subscription, payload):
+        try:
+            response = webpush(
+                subscription_info={
+                    "endpoint": subscription['endpoint'],
+                    "keys": {"p256dh": subscription.get('p256dh'), "auth": subscription.get('auth')},
+                },
+                data=json.dumps(payload),
+                vapid_private_key=VAPID_PRIVATE_KEY,
+                vapid_claims={"sub": VAPID_SUBJECT},
+                ttl=PUSH_TTL,
+                requests_session=http_pool.session("webpush"),
+            )
+            return response.status_code
+        except WebPushException as e:
+            status = getattr(e.response, 'status_code', None)
+            if status in (404, 410):
+                return status
+            raise
+
+
+def make_sender():
+    if PUSH_SENDER == 'webpush':
+        if webpush is None or not VAPID_PRIVATE_KEY:
+            print("⚠️ ARIA_PUSH_SENDER=webpush needs pywebpush and VAPID_PRIVATE_KEY; using the local sender")
+            return LocalSender()
+        return WebPushSender()
+    return LocalSender()
+
+
+# --- Index + scheduler ---
+
+class ReminderIndex:
+    """Reminders ordered by fire time, replaced per sync key.
+
+    Replacing a user's reminders bumps their generation; older heap entries
+    are skipped when they surface instead of being searched for and removed.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._generation = {}
+        self._sent = TTLCache(maxsize=50000, ttl=2 * 24 * 60 * 60)
+        self._lock = threading.Lock()
+        self.changed = threading.Condition(self._lock)
+
+    def replace(self, sync_key, reminders, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            generation = self._generation.get(sync_key, 0) + 1
+            self._generation[sync_key] = generation
+            earliest = self._heap[0][0] if self._heap else None
+            for r in reminders:
+                if r.fire_at < now - REMINDER_GRACE or self._sent.get((sync_key, r.tag)):
+                    continue
+                heapq.heappush(self._heap, (r.fire_at, next(self._seq), generation, r))
+            if self._heap and (earliest is None or self._heap[0][0] < earliest):
+                self.changed.notify_all()
+
+    def drop(self, sync_key):
+        with self._lock:
+            self._generation[sync_key] = self._generation.get(sync_key, 0) + 1
+
+    def pop_due(self, now=None):
+        """Remove and return every live reminder whose fire time has passed."""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, generation, r = heapq.heappop(self._heap)
+                if generation == self._generation.get(r.sync_key) and not self._sent.get((r.sync_key, r.tag)):
+                    self._sent.set((r.sync_key, r.tag), True)
+                    due.append(r)
+        return due
+
+    def next_fire_at(self):
+        with self._lock:
+            while self._heap and self._heap[0][2] != self._generation.get(self._heap[0][3].sync_key):
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class Scheduler:
+    """Keeps the reminder index current and sends reminders as they come due."""
+
+    def __init__(self, sender=None):
+        self.index = ReminderIndex()
+        self.sender = sender or make_sender()
+        self.leader = False
+        self._subs = {}  # sync_key -> {endpoint: subscription row}
+        self._cursor = None
+        self._next_sweep = 0.0
+        self._next_reindex = 0.0
+        self._lock_fd = None
+        self._thread = None
+
+    def start(self):
+        if not REMINDERS_ENABLED or self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name="aria-reminders", daemon=True)
+        self._thread.start()
+
+    def _acquire_leadership(self):
+        if fcntl is None:
+            return True
+        try:
+            fd = open(REMINDER_LOCK_FILE, 'w')
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._lock_fd = fd  # held for the life of the process
+        print(f"🔔 Reminder scheduler running in pid {os.getpid()} ({type(self.sender).__name__})")
+        return True
+
+    def _loop(self):
+        while not self.leader:
+            self.leader = self._acquire_leadership()
+            if not self.leader:
+                time.sleep(REMINDER_SWEEP_INTERVAL * 5)
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ Reminder scheduler error: {e}")
+            next_fire = self.index.next_fire_at()
+            wait = min(next_fire or float('inf'), self._next_sweep) - time.time()
+            if wait > 0:
+                with self.index.changed:  # woken early when an earlier reminder is indexed
+                    self.index.changed.wait(min(wait, REMINDER_SWEEP_INTERVAL))
+
+    def tick(self, now=None):
+        """One scheduler step: refresh the index if it's time, then dispatch due reminders."""
+        now = time.time() if now is None else now
+        if now >= self._next_reindex:
+            self.reindex_all()
+            self._next_reindex = now + REMINDER_REINDEX_INTERVAL
+            self._next_sweep = now + REMINDER_SWEEP_INTERVAL
+        elif now >= self._next_sweep:
+            self.sweep()
+            self._next_sweep = now + REMINDER_SWEEP_INTERVAL
+        return self.dispatch(now)
+
+    def _index_users(self, sync_keys, deadlines_by_key=None):
+        if deadlines_by_key is None:
+            rows = get_sync_blobs('aria_deadlines', sync_keys)
+            deadlines_by_key = {row['user_id']: row.get('data_blob') for row in rows}
+        for sync_key in sync_keys:
+            subs = list(self._subs.get(sync_key, {}).values())
+            if not subs:
+                self.index.drop(sync_key)
+                continue
+            period_user_id = next((s.get('period_user_id') for s in subs if s.get('period_user_id')), None)
+            try:
+                reminders = build_reminders(sync_key, deadlines_by_key.get(sync_key), period_user_id,
+                                            subs[0].get('tz_offset') or 0)
+            except Exception as e:  # keep their current reminders; the hourly reindex tries again
+                print(f"⚠️ Could not index reminders for {sync_key}: {e}")
+                continue
+            self.index.replace(sync_key, reminders)
+
+    def reindex_all(self):
+        """Rebuild everything from Supabase (also rolls predictions forward)."""
+        started = datetime.now(timezone.utc)
+        subs = {}
+        for row in get_push_subscriptions():
+            subs.setdefault(row['user_id'], {})[row['endpoint']] = row
+        for sync_key in set(self._subs) - set(subs):
+            self.index.drop(sync_key)
+        self._subs = subs
+        self._index_users(list(subs))
+        self._cursor = (started - timedelta(seconds=5)).isoformat()
+        metrics.inc('aria_reminder_index_total', kind='full')
+
+    def sweep(self):
+        """Re-index only the users whose subscriptions, deadlines or cycle stats changed since the last look."""
+        if self._cursor is None:
+            return self.reindex_all()
+        started = datetime.now(timezone.utc)
+        since = self._cursor
+        changed = set()
+        live = get_push_endpoints()
+        if live is not None:  # unsubscribed through another worker, or deleted by hand
+            for sync_key, subs in list(self._subs.items()):
+                if any(endpoint not in live for endpoint in subs):
+                    self._forget(sync_key, [e for e in subs if e not in live])
+                    changed.add(sync_key)
+        for row in get_push_subscriptions(since):
+            self._subs.setdefault(row['user_id'], {})[row['endpoint']] = row
+            changed.add(row['user_id'])
+
+        deadlines = {row['user_id']: row.get('data_blob')
+                     for row in get_sync_blobs('aria_deadlines', list(self._subs), since)}
+        changed.update(deadlines)
+
+        by_period_user = {}
+        for sync_key, subs in self._subs.items():
+            for s in subs.values():
+                if s.get('period_user_id'):
+                    by_period_user.setdefault(s['period_user_id'], set()).add(sync_key)
+        for row in get_cycle_stats_updates(list(by_period_user), since):
+            forget_cycle_stats(row['user_id'])  # may have been written by another worker
+            changed.update(by_period_user.get(row['user_id'], ()))
+
+        if changed:
+            missing = [k for k in changed if k not in deadlines]
+            if missing:
+                deadlines.update({row['user_id']: row.get('data_blob') for row in get_sync_blobs('aria_deadlines', missing)})
+            self._index_users(list(changed), deadlines)
+        self._cursor = (started - timedelta(seconds=5)).isoformat()
+        metrics.inc('aria_reminder_index_total', kind='sweep')
+
+    def _forget(self, sync_key, endpoints):
+        subs = self._subs.get(sync_key, {})
+        for endpoint in endpoints:
+            subs.pop(endpoint, None)
+        if not subs:
+            self._subs.pop(sync_key, None)
+            self.index.drop(sync_key)
+
+    def forget(self, endpoint):
+        """Stop pushing to an unsubscribed endpoint; a user with no devices left loses their reminders."""
+        for sync_key, subs in list(self._subs.items()):
+            if endpoint in subs:
+                self._forget(sync_key, [endpoint])
+
+    def dispatch(self, now=None):
+        """Hand due reminders to the job queue, REMINDER_BATCH_SIZE at a time."""
+        due = self.index.pop_due(now)
+        for i in range(0, len(due), REMINDER_BATCH_SIZE):
+            batch = due[i:i + REMINDER_BATCH_SIZE]
+            try:
+                jobs.submit('push_batch', self.deliver, batch, max_attempts=1)
+            except jobs.QueueFull:
+                self.deliver(batch)
+        return len(due)
+
+    def deliver(self, batch):
+        """Send each reminder to every device subscribed under its sync key."""
+        sent = 0
+        for reminder in batch:
+            payload = payload_for(reminder)
+            for sub in list(self._subs.get(reminder.sync_key, {}).values()):
+                sent += send_one(self.sender, sub, payload, self._subs)
+        return sent
+
+    def upcoming(self, sync_key):
+        """The reminders that would be scheduled for `sync_key` right now (computed fresh)."""
+        subs = get_push_subscriptions(sync_key=sync_key)
+        if not subs:
+            return []
+        rows = get_sync_blobs('aria_deadlines', [sync_key])
+        period_user_id = next((s.get('period_user_id') for s in subs if s.get('period_user_id')), None)
+        reminders = build_reminders(sync_key, rows[0].get('data_blob') if rows else None,
+                                    period_user_id, subs[0].get('tz_offset') or 0)
+        now = time.time()
+        return sorted((r for r in reminders if r.fire_at >= now), key=lambda r: r.fire_at)
+
+
+def send_one(sender, subscription, payload, known=None):
+    """Push one payload; forget the subscription if the push service says it's gone. Returns 1 if sent."""
+    try:
+        status = sender.send(subscription, payload)
+    except Exception as e:
+        metrics.inc('aria_push_total', outcome='error')
+        print(f"⚠️ Push to {subscription.get('endpoint', '')[:40]}… failed: {e}")
+        return 0
+    if status in (404, 410):
+        metrics.inc('aria_push_total', outcome='gone')
+        delete_push_subscription(subscription['endpoint'])
+        if known is not None:
+            known.get(subscription.get('user_id'), {}).pop(subscription['endpoint'], None)
+        return 0
+    metrics.inc('aria_push_total', outcome='sent')
+    return 1
+
+
+def send_test(sync_key):
+    """Send a test notification to every device subscribed under `sync_key` now."""
+    payload = {"title": "Aria", "body": "✦ Notifications are on! Reminders will arrive here.", "tag": "aria-test"}
+    subs = get_push_subscriptions(sync_key=sync_key)
+    return {"devices": len(subs), "sent": sum(send_one(scheduler.sender, s, payload) for s in subs)}
+
+
+scheduler = Scheduler()
+
+metrics.describe('aria_push_total', 'Web Push deliveries by outcome (sent, gone, error).')
+metrics.describe('aria_reminder_index_total', 'Reminder index rebuilds (full) and delta sweeps.')
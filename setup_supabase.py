@@ -16,11 +16,45 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+# Schema changes for projects created before the matching feature shipped.
+# Every statement is idempotent, so it's safe to re-run the whole block.
+MIGRATIONS = """
+-- Delta sync: per-key content hashes + `since` cursor pulls
+ALTER TABLE user_sync ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE INDEX IF NOT EXISTS idx_user_sync_updated ON user_sync(user_id, updated_at);
+
+-- Server-sent reminders (Web Push)
+CREATE TABLE IF NOT EXISTS push_subscriptions (
+  endpoint TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  period_user_id TEXT,
+  p256dh TEXT NOT NULL,
+  auth TEXT NOT NULL,
+  tz_offset INT DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_push_subscriptions_updated ON push_subscriptions(updated_at);
+
+-- Server-side chat history (append-only, paged by timestamp)
+CREATE TABLE IF NOT EXISTS chat_messages (
+  id BIGSERIAL PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  client_id TEXT NOT NULL,
+  role TEXT NOT NULL,
+  content TEXT NOT NULL,
+  ts TIMESTAMPTZ NOT NULL,
+  UNIQUE(user_id, client_id)
+);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user_ts ON chat_messages(user_id, ts, client_id);
+"""
+
 print("🔗 Connecting to Supabase...")
 try:
     # Test connection
     response = supabase.table("period_logs").select("*").limit(1).execute()
     print("✅ Tables already exist! Supabase is ready.")
+    print("\nIf this project predates recent updates, run these in the Supabase SQL Editor:")
+    print(MIGRATIONS)
 except Exception as e:
     if "does not exist" in str(e):
         print("📋 Creating period_logs table...")
@@ -48,8 +82,40 @@ CREATE TABLE cycle_stats (
   updated_at TIMESTAMP DEFAULT NOW()
 );
 
+CREATE TABLE user_sync (
+  user_id TEXT NOT NULL,
+  data_key TEXT NOT NULL,
+  data_blob JSONB,
+  content_hash TEXT,
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  PRIMARY KEY (user_id, data_key)
+);
+
+CREATE TABLE push_subscriptions (
+  endpoint TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  period_user_id TEXT,
+  p256dh TEXT NOT NULL,
+  auth TEXT NOT NULL,
+  tz_offset INT DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE chat_messages (
+  id BIGSERIAL PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  client_id TEXT NOT NULL,
+  role TEXT NOT NULL,
+  content TEXT NOT NULL,
+  ts TIMESTAMPTZ NOT NULL,
+  UNIQUE(user_id, client_id)
+);
+
 CREATE INDEX idx_period_logs_user ON period_logs(user_id);
 CREATE INDEX idx_cycle_stats_user ON cycle_stats(user_id);
+CREATE INDEX idx_user_sync_updated ON user_sync(user_id, updated_at);
+CREATE INDEX idx_push_subscriptions_updated ON push_subscriptions(updated_at);
+CREATE INDEX idx_chat_messages_user_ts ON chat_messages(user_id, ts, client_id);
 """)
     else:
         print(f"❌ Error: {str(e)}")
@@ -18,9 +18,14 @@ const K = {
   NOTIFIED: 'aria_notified',
   EMAILED: 'aria_emailed',
   FINANCE: 'aria_finance', // { balance: 0, transactions: [], splitwise: [] }
-  SYNC_KEY: 'aria_sync_key'
+  SYNC_KEY: 'aria_sync_key',
+  SYNC_STATE: 'aria_sync_state', // { syncKey, cursor, version, hashes: { storageKey: hash }, versions, remote }
+  PUSH: 'aria_push' // this device's Web Push endpoint, once the server has it
 };
 
+// Keys that never go to /api/sync/push (chat has its own server-side log, /api/chat/messages)
+const NO_SYNC = ['SYNC_KEY', 'CHAT', 'SYNC_STATE', 'PUSH'];
+
 // ===== STORAGE HELPERS =====
 const get = (k, fallback = []) => { try { return JSON.parse(localStorage.getItem(k)) ?? fallback; } catch { return fallback; } };
 const getObj = (k) => { try { return JSON.parse(localStorage.getItem(k)); } catch { return null; } };
@@ -183,39 +188,124 @@ async function initCloudSync() {
   }
 }
 
+// cyrb53 — fast 53-bit string hash, used only to spot which keys changed
+function hashString(str) {
+  let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+  for (let i = 0; i < str.length; i++) {
+    const ch = str.charCodeAt(i);
+    h1 = Math.imul(h1 ^ ch, 2654435761);
+    h2 = Math.imul(h2 ^ ch, 1597334677);
+  }
+  h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+  h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+  return (4294967296 * (2097151 & h2) + (h1 >>> 0)).toString(36);
+}
+
+// Per-sync-key delta state: the pull cursor, the hash of each key as last pushed/pulled,
+// and the server's updated_at (versions) and content hash (remote) of each key as last seen
+function getSyncState(syncKey) {
+  const state = getObj(K.SYNC_STATE);
+  if (state && state.syncKey === syncKey) return { versions: {}, remote: {}, ...state };
+  return { syncKey, cursor: null, hashes: {}, versions: {}, remote: {} };
+}
+
+function saveSyncState(state) {
+  localStorage.setItem(K.SYNC_STATE, JSON.stringify(state));
+}
+
+// Resolves true when the cloud has everything this device has (nothing to push, or the push succeeded)
 async function pushToCloud() {
   const syncKey = getObj(K.SYNC_KEY);
-  if (!syncKey) return;
+  if (!syncKey) return false;
 
+  // Only send keys whose content changed since they were last synced
+  const state = getSyncState(syncKey);
   const payload = {};
+  const sent = {};
   Object.keys(K).forEach(key => {
-    if (key === 'SYNC_KEY' || key === 'CHAT') return; // Don't sync the key itself or large chat history for now
+    if (NO_SYNC.includes(key)) return; // Don't sync the key itself, sync bookkeeping or chat (appended to its own log)
+    const raw = localStorage.getItem(K[key]);
     const val = getObj(K[key]);
-    if (val) payload[K[key]] = val;
+    if (!val) return;
+    const hash = hashString(raw);
+    if (state.hashes[K[key]] === hash) return;
+    payload[K[key]] = val;
+    sent[K[key]] = hash;
   });
+  if (!Object.keys(payload).length) return true;
 
   try {
-    await fetch('/api/sync/push', {
+    const res = await fetch('/api/sync/push', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ syncKey, payload })
     });
-    console.log("☁️ Data pushed to cloud");
+    const result = await res.json();
+    if (result.queued) {
+      // Offline: the service worker holds it and replays it, so don't resend these keys
+      const latest = getSyncState(syncKey);
+      Object.assign(latest.hashes, sent);
+      Object.keys(sent).forEach(storageKey => { delete latest.remote[storageKey]; });
+      saveSyncState(latest);
+      console.log(`☁️ Offline — ${Object.keys(sent).length} changed key(s) queued for sync`);
+      updateSyncStatus(false);
+      return false; // the server doesn't have it yet, so chat must send the full context
+    }
+    if (res.ok && result.success) {
+      const latest = getSyncState(syncKey);
+      Object.assign(latest.hashes, sent);
+      Object.keys(sent).forEach(storageKey => {
+        delete latest.remote[storageKey]; // the cloud now holds this device's copy
+        if (result.cursor) latest.versions[storageKey] = result.cursor;
+      });
+      if (result.cursor && (!latest.version || result.cursor > latest.version)) latest.version = result.cursor;
+      saveSyncState(latest);
+      console.log(`☁️ Pushed ${Object.keys(sent).length} changed key(s) to cloud`);
+      return true;
+    }
   } catch (e) { console.error("Sync push failed", e); }
+  return false;
+}
+
+// Newest server timestamp this device has pushed or pulled; the server's context snapshot must be at least this new
+function contextVersion(syncKey) {
+  const state = getSyncState(syncKey);
+  return [state.cursor, state.version].filter(Boolean).sort().pop() || null;
 }
 
 async function pullFromCloud() {
   const syncKey = getObj(K.SYNC_KEY);
   if (!syncKey) return;
 
+  const state = getSyncState(syncKey);
   try {
-    const res = await fetch(`/api/sync/pull?syncKey=${encodeURIComponent(syncKey)}`);
+    let url = `/api/sync/pull?syncKey=${encodeURIComponent(syncKey)}`;
+    if (state.cursor) url += `&since=${encodeURIComponent(state.cursor)}`;
+    const res = await fetch(url, { cache: 'no-store' });
+    if (res.status === 304) {
+      updateSyncStatus(true);
+      return true;
+    }
     const result = await res.json();
     if (result.success && result.data) {
+      const versions = result.versions || {};
+      const remote = result.hashes || {};
+      let applied = 0;
       Object.keys(result.data).forEach(storageKey => {
-        localStorage.setItem(storageKey, JSON.stringify(result.data[storageKey]));
+        // Pulls overlap their cursor, so skip rows already seen or older than this device's own push
+        const version = versions[storageKey];
+        if (remote[storageKey] && remote[storageKey] === state.remote[storageKey]) return;
+        if (version && state.versions[storageKey] && version <= state.versions[storageKey]) return;
+        const raw = JSON.stringify(result.data[storageKey]);
+        localStorage.setItem(storageKey, raw);
+        state.hashes[storageKey] = hashString(raw); // already in the cloud, don't push it back
+        if (version) state.versions[storageKey] = version;
+        if (remote[storageKey]) state.remote[storageKey] = remote[storageKey];
+        applied++;
       });
-      console.log("☁️ Data pulled from cloud");
+      if (result.cursor) state.cursor = result.cursor;
+      saveSyncState(state);
+      if (applied) console.log(`☁️ Pulled ${applied} key(s) from cloud`);
       updateSyncStatus(true);
       return true;
     }
@@ -288,6 +378,7 @@ function startApp() {
   document.getElementById('onboarding-modal').classList.add('hidden');
   document.getElementById('app').classList.remove('hidden');
   loadChatHistory();
+  registerServiceWorker();
   requestNotifPermission();
   checkEmailReminders();
   // Show welcome back message if no chat history
@@ -441,22 +532,116 @@ function closeSidebar() {
 }
 
 // ===== CHAT =====
+// With a sync key the full chat log lives on the server (/api/chat/messages). localStorage
+// only keeps the latest CHAT_PAGE_SIZE messages, and older pages load as the user scrolls up.
+const CHAT_PAGE_SIZE = 50;
+let chatBefore = null;          // cursor for the next older page; null when there isn't one
+let loadingOlderChat = false;
+let pendingChat = [];
+let chatUploadTimer = null;
+
 function loadChatHistory() {
-  const hist = get(K.CHAT, []);
+  renderChatPage(get(K.CHAT, []));
+  const container = document.getElementById('chat-messages');
+  container.onscroll = () => { if (container.scrollTop < 80) loadOlderChat(); };
+  refreshChatFromServer();
+}
+
+function renderChatPage(messages) {
   const container = document.getElementById('chat-messages');
   container.innerHTML = '';
-  hist.slice(-40).forEach(m => renderMessageDOM(m.role, m.content, m.ts));
+  messages.forEach(m => renderMessageDOM(m.role, m.content, m.ts));
   scrollToBottom();
 }
 
+// Replace the local page with the server's latest one (it may have messages from other devices)
+async function refreshChatFromServer() {
+  const syncKey = getObj(K.SYNC_KEY);
+  if (!syncKey) return;
+  try {
+    const res = await fetch(`/api/chat/messages?syncKey=${encodeURIComponent(syncKey)}&limit=${CHAT_PAGE_SIZE}`, { cache: 'no-store' });
+    const result = await res.json();
+    if (!result.success) return;
+
+    // Local messages the server doesn't have yet (made offline, before sync was set up, or
+    // before the server kept chat) are uploaded; the id makes a repeat upload harmless
+    const known = new Set(result.messages.map(m => m.id));
+    const oldest = result.messages.length ? new Date(result.messages[0].ts) : null;
+    const local = get(K.CHAT, []);
+    const missing = local.filter(m => !known.has(m.id) && (!result.before || new Date(m.ts) >= oldest));
+    missing.forEach(m => { m.id = m.id || uid(); queueChatUpload(m); });
+
+    const merged = result.messages.concat(missing).sort((a, b) => new Date(a.ts) - new Date(b.ts));
+    chatBefore = result.before;
+    localStorage.setItem(K.CHAT, JSON.stringify(merged.slice(-CHAT_PAGE_SIZE)));
+    const shown = local.map(m => m.id).join();
+    if (!isSending && merged.map(m => m.id).join() !== shown) renderChatPage(merged);
+  } catch (e) { console.warn('Chat history unavailable, showing the local copy', e); }
+}
+
+async function loadOlderChat() {
+  const syncKey = getObj(K.SYNC_KEY);
+  if (!syncKey || !chatBefore || loadingOlderChat) return;
+  loadingOlderChat = true;
+  try {
+    const res = await fetch(`/api/chat/messages?syncKey=${encodeURIComponent(syncKey)}&before=${encodeURIComponent(chatBefore)}&limit=${CHAT_PAGE_SIZE}`);
+    const result = await res.json();
+    if (result.success) {
+      const container = document.getElementById('chat-messages');
+      const first = container.firstChild;
+      const height = container.scrollHeight;
+      result.messages.forEach(m => renderMessageDOM(m.role, m.content, m.ts, first));
+      // Keep the message the user was looking at in place
+      container.scrollTop += container.scrollHeight - height;
+      chatBefore = result.before;
+    }
+  } catch (e) { console.error('Loading older messages failed', e); }
+  loadingOlderChat = false;
+}
+
+function queueChatUpload(msg) {
+  if (!getObj(K.SYNC_KEY)) return;
+  pendingChat.push(msg);
+  if (chatUploadTimer) clearTimeout(chatUploadTimer);
+  chatUploadTimer = setTimeout(flushChatUploads, 1000);
+}
+
+async function flushChatUploads(keepalive = false) {
+  chatUploadTimer = null;
+  const syncKey = getObj(K.SYNC_KEY);
+  while (syncKey && pendingChat.length) {
+    const messages = pendingChat.splice(0, 100);
+    try {
+      await fetch('/api/chat/messages', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ syncKey, messages }),
+        keepalive
+      });
+    } catch (e) {
+      console.error('Chat upload failed', e); // re-sent by refreshChatFromServer on the next load
+      return;
+    }
+  }
+}
+
+window.addEventListener('pagehide', () => {
+  if (chatUploadTimer) {
+    clearTimeout(chatUploadTimer);
+    flushChatUploads(true);
+  }
+});
+
 function saveChat(role, content) {
+  const msg = { id: uid(), role, content, ts: new Date().toISOString() };
   const hist = get(K.CHAT, []);
-  hist.push({ role, content, ts: new Date().toISOString() });
-  if (hist.length > 80) hist.splice(0, hist.length - 80);
+  hist.push(msg);
+  if (hist.length > CHAT_PAGE_SIZE) hist.splice(0, hist.length - CHAT_PAGE_SIZE);
   set(K.CHAT, hist);
+  queueChatUpload(msg);
 }
 
-function renderMessageDOM(role, content, ts) {
+function renderMessageDOM(role, content, ts, before = null) {
   const container = document.getElementById('chat-messages');
   const wrap = document.createElement('div');
   wrap.className = `message ${role}`;
@@ -475,7 +660,8 @@ function renderMessageDOM(role, content, ts) {
         <div class="msg-time" style="text-align:right">${time}</div>
       </div>`;
   }
-  container.appendChild(wrap);
+  container.insertBefore(wrap, before);
+  return wrap.querySelector('.msg-bubble');
 }
 
 function escapeHtml(s) {
@@ -544,24 +730,85 @@ window.sendMessage = async function () {
   showTyping();
 
   try {
-    const ctx = buildContext();
-    const hist = get(K.CHAT, []).slice(-20);
-    const res = await fetch('/api/chat', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message: text, context: ctx, chatHistory: hist })
-    });
-    console.log("Chat fetch status:", res.status);
-    if (!res.ok) {
-      const errorText = await res.text();
-      console.error("Chat fetch error body:", errorText);
+    // The server trims history to its token budget, so send a generous window
+    const hist = get(K.CHAT, []).slice(-40);
+    const fullBody = () => JSON.stringify({ message: text, context: buildContext(), chatHistory: hist });
+
+    // With cloud sync on, flush pending changes and let the server use its copy of our data
+    // instead of uploading the whole context on every message
+    const syncKey = getObj(K.SYNC_KEY);
+    let synced = false;
+    if (syncKey) {
+      if (syncTimeout) { clearTimeout(syncTimeout); syncTimeout = null; }
+      synced = await pushToCloud();
+    }
+    let body = synced
+      ? JSON.stringify({ message: text, syncKey, contextVersion: contextVersion(syncKey), live: { today: today() }, chatHistory: hist })
+      : fullBody();
+
+    let bubble = null;
+    let streamed = '';
+    const onDelta = (delta) => {
+      if (!bubble) {
+        hideTyping();
+        bubble = renderMessageDOM('aria', '', new Date().toISOString());
+      }
+      streamed += delta;
+      bubble.innerHTML = escapeHtml(streamed);
+      scrollToBottom();
+    };
+    let data = await streamChat(body, onDelta);
+    if (data && data.needContext) {
+      body = fullBody();
+      data = await streamChat(body, onDelta);
+    }
+
+    if (data && data.cutOff) {
+      // Keep what arrived rather than paying for a second completion; the user can retry
+      hideTyping();
+      document.getElementById('aria-status').textContent = 'Online';
+      const partial = streamed.trim();
+      const msg = (partial ? partial + '\n\n' : '') + "⚠️ My reply got cut off — tap Retry to ask again.";
+      if (bubble) {
+        bubble.innerHTML = escapeHtml(msg);
+        saveChat('aria', msg);
+      } else {
+        addAriaMessage(msg);
+      }
+      addRetryChip(text);
+      return;
+    }
+
+    if (!data) {
+      // Streaming couldn't be opened — fall back to the blocking endpoint
+      const post = () => fetch('/api/chat', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body
+      });
+      let res = await post();
+      if (res.status === 409) {
+        body = fullBody();
+        res = await post();
+      }
+      console.log("Chat fetch status:", res.status);
+      if (!res.ok) {
+        const errorText = await res.text();
+        console.error("Chat fetch error body:", errorText);
+      }
+      data = await res.json();
     }
-    const data = await res.json();
     hideTyping();
     document.getElementById('aria-status').textContent = 'Online';
 
     const msg = data.message || 'Sorry, I had a brain glitch. Try again?';
-    addAriaMessage(msg);
+    if (bubble) {
+      bubble.innerHTML = escapeHtml(msg);
+      saveChat('aria', msg);
+      scrollToBottom();
+    } else {
+      addAriaMessage(msg);
+    }
 
     // Support both single action and multiple actions
     if (data.action) {
@@ -583,6 +830,67 @@ window.sendMessage = async function () {
   }
 }
 
+// Reads /api/chat/stream (Server-Sent Events). Calls onDelta with message text as it
+// arrives and resolves with the final {message, action} payload, {needContext: true} if
+// the server has no copy of our synced data (resend with the full context), {cutOff: true}
+// if the stream ended before its `done` event, or null if the stream could not be opened
+// and the caller should fall back to /api/chat.
+async function streamChat(body, onDelta) {
+  let res;
+  try {
+    res = await fetch('/api/chat/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+      body
+    });
+  } catch (e) {
+    console.warn("Chat stream failed, falling back", e);
+    return null;
+  }
+  if (res.status === 409) return { needContext: true };
+  if (!res.ok || !res.body || !res.body.getReader) return null;
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let final = null;
+  try {
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = 'message', payload = '';
+        frame.split('\n').forEach(line => {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) payload += line.slice(5).trim();
+        });
+        if (!payload) continue;
+        const parsed = JSON.parse(payload);
+        if (event === 'delta' && parsed.text) onDelta(parsed.text);
+        else if (event === 'done') final = parsed;
+      }
+    }
+  } catch (e) {
+    console.warn("Chat stream interrupted", e);
+  }
+  // Opened but ended without `done`: the model already ran, so don't ask /api/chat for another reply
+  return final || { cutOff: true };
+}
+
+// Offered under a reply that was cut off mid-stream
+function addRetryChip(text) {
+  const btn = document.createElement('button');
+  btn.className = 'quick-chip';
+  btn.textContent = '↻ Retry';
+  btn.onclick = () => { btn.remove(); quickSend(text); };
+  document.getElementById('chat-messages').appendChild(btn);
+  scrollToBottom();
+}
+
 window.showDeadlinesSummary = function () {
   quickSend('list all my current deadlines');
 }
@@ -717,20 +1025,57 @@ function handleLogGym(d) {
 }
 
 // ===== PERIOD ACTIONS =====
+// Period starts/ends are batched into one /api/period/bulk call, so entering a
+// year of history is a single round trip instead of one request per date.
+let pendingPeriods = {};
+let periodUploadTimer = null;
+
+function queuePeriodUpload(entry) {
+  pendingPeriods[entry.startDate] = Object.assign({}, pendingPeriods[entry.startDate], entry);
+  if (periodUploadTimer) clearTimeout(periodUploadTimer);
+  periodUploadTimer = setTimeout(flushPeriodUploads, 1500);
+}
+
+async function flushPeriodUploads(keepalive = false) {
+  periodUploadTimer = null;
+  const periods = Object.values(pendingPeriods);
+  if (!periods.length) return;
+  pendingPeriods = {};
+  const user = getObj(K.USER) || {};
+  try {
+    const res = await fetch('/api/period/bulk', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ userId: user.name || 'default_user', periods }),
+      keepalive
+    });
+    const result = await res.json();
+    if (result.success) {
+      // Server-side phases now reflect the upload; refetch them on the next render
+      clearPhaseCache();
+      if (currentView === 'progress') renderProgress();
+    }
+  } catch (e) { console.error('Period upload failed', e); }
+}
+
+// Don't lose a batch still waiting on its debounce when the tab closes
+window.addEventListener('pagehide', () => {
+  if (periodUploadTimer) {
+    clearTimeout(periodUploadTimer);
+    flushPeriodUploads(true);
+  }
+});
+
 function handlePeriodStart(d) {
   const log = get(K.PERIOD, []);
   const existing = log.findIndex(e => e.startDate === d.date);
   if (existing !== -1) return;
   log.unshift({ id: uid(), startDate: d.date, endDate: null });
   set(K.PERIOD, log);
+  clearPhaseCache();
 
   // Also save to Supabase
-  const user = getObj(K.USER) || {};
-  fetch('/api/period/log-start', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ userId: user.name || 'default_user', date: d.date, notes: 'Period started' })
-  }).catch(() => { });
+  queuePeriodUpload({ startDate: d.date, notes: 'Period started' });
 
   showToast('🌸 Period start logged', 'info');
   if (currentView === 'progress') renderProgress();
@@ -742,18 +1087,10 @@ function handlePeriodEnd(d) {
     log[0].endDate = d.endDate || today();
 
     // Also save to Supabase
-    const user = getObj(K.USER) || {};
-    fetch('/api/period/log-end', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        userId: user.name || 'default_user',
-        startDate: log[0].startDate,
-        endDate: d.endDate || today()
-      })
-    }).catch(() => { });
+    queuePeriodUpload({ startDate: log[0].startDate, endDate: log[0].endDate });
 
     set(K.PERIOD, log);
+    clearPhaseCache();
   }
   showToast('Period end logged ✓', 'info');
 }
@@ -1102,52 +1439,63 @@ function getWeekStart(d) {
   return ws;
 }
 
-function entriesForDate(dateStr) {
-  const all = [];
+// Date -> calendar entries across every local store, built in one pass per store.
+// Rebuilt only when one of the stores (or today's date, which deadline colours
+// depend on) changes, so rendering a month costs one lookup per cell.
+const CALENDAR_SOURCES = [K.DEADLINES, K.NOTES, K.GYM, K.PERIOD, K.FINANCE, K.QUIZ, K.PROGRESS];
+let calendarIndexCache = null; // { raws, day, index }
+
+function calendarIndex() {
+  const raws = CALENDAR_SOURCES.map(k => localStorage.getItem(k));
+  const day = today();
+  const cached = calendarIndexCache;
+  if (cached && cached.day === day && raws.every((raw, i) => raw === cached.raws[i])) return cached.index;
+
+  const index = new Map();
+  const add = (dateStr, entry) => {
+    if (!dateStr) return;
+    if (!index.has(dateStr)) index.set(dateStr, []);
+    index.get(dateStr).push(entry);
+  };
 
   // Deadlines
   get(K.DEADLINES, []).forEach(d => {
-    if (d.dueDate === dateStr) all.push({ type: 'deadline_due', color: deadlineColor(d), title: d.title, subject: d.subject });
-    if (d.startDate === dateStr) all.push({ type: 'deadline_start', color: 'purple', title: `Start: ${d.title}`, subject: d.subject });
+    add(d.dueDate, { type: 'deadline_due', color: deadlineColor(d), title: d.title, subject: d.subject });
+    add(d.startDate, { type: 'deadline_start', color: 'purple', title: `Start: ${d.title}`, subject: d.subject });
   });
 
   // Notes/Reminders
-  get(K.NOTES, []).forEach(n => {
-    if (n.date === dateStr) all.push({ type: 'note', color: 'blue', title: n.text });
-  });
+  get(K.NOTES, []).forEach(n => add(n.date, { type: 'note', color: 'blue', title: n.text }));
 
   // Gym
-  get(K.GYM, []).forEach(g => {
-    if (g.date === dateStr) all.push({ type: 'gym', color: g.didGo ? 'green' : 'red', title: g.didGo ? 'Went to Gym 💪' : 'Skipped Gym 😴' });
-  });
+  get(K.GYM, []).forEach(g => add(g.date, { type: 'gym', color: g.didGo ? 'green' : 'red', title: g.didGo ? 'Went to Gym 💪' : 'Skipped Gym 😴' }));
 
   // Period
   get(K.PERIOD, []).forEach(p => {
-    if (p.startDate === dateStr) all.push({ type: 'period', color: 'pink', title: 'Period Started 🌸' });
-    if (p.endDate === dateStr) all.push({ type: 'period', color: 'pink', title: 'Period Ended 🌸' });
+    add(p.startDate, { type: 'period', color: 'pink', title: 'Period Started 🌸' });
+    add(p.endDate, { type: 'period', color: 'pink', title: 'Period Ended 🌸' });
   });
 
   // Finance
   const f = getFinance();
   f.transactions.forEach(tx => {
     const txDate = tx.date || (tx.createdAt ? tx.createdAt.split('T')[0] : null);
-    if (txDate === dateStr) all.push({ type: 'finance', color: 'orange', title: `${tx.type === 'income' ? 'Received' : 'Spent'} ${tx.amount.toLocaleString()}: ${tx.description}` });
-  });
-  f.splitwise.forEach(s => {
-    if (s.date === dateStr) all.push({ type: 'finance', color: 'orange', title: `Splitwise ${s.status === 'done' ? 'Paid' : 'Due'}: ${s.description}` });
+    add(txDate, { type: 'finance', color: 'orange', title: `${tx.type === 'income' ? 'Received' : 'Spent'} ${tx.amount.toLocaleString()}: ${tx.description}` });
   });
+  f.splitwise.forEach(s => add(s.date, { type: 'finance', color: 'orange', title: `Splitwise ${s.status === 'done' ? 'Paid' : 'Due'}: ${s.description}` }));
 
   // Quizzes
-  get(K.QUIZ, []).forEach(q => {
-    if (q.date === dateStr) all.push({ type: 'quiz', color: 'yellow', title: `Quiz: ${q.score}/${q.total} (${q.subject})` });
-  });
+  get(K.QUIZ, []).forEach(q => add(q.date, { type: 'quiz', color: 'yellow', title: `Quiz: ${q.score}/${q.total} (${q.subject})` }));
 
   // Daily Progress
-  get(K.PROGRESS, []).forEach(p => {
-    if (p.date === dateStr) all.push({ type: 'progress', color: 'green', title: `Log: ${p.summary.substring(0, 30)}...` });
-  });
+  get(K.PROGRESS, []).forEach(p => add(p.date, { type: 'progress', color: 'green', title: `Log: ${p.summary.substring(0, 30)}...` }));
 
-  return all;
+  calendarIndexCache = { raws, day, index };
+  return index;
+}
+
+function entriesForDate(dateStr) {
+  return calendarIndex().get(dateStr) || [];
 }
 
 function renderMonthView() {
@@ -1156,6 +1504,7 @@ function renderMonthView() {
   const firstDay = new Date(y, m, 1).getDay();
   const daysInMonth = new Date(y, m + 1, 0).getDate();
   const todayStr = today();
+  const index = calendarIndex();
 
   let html = '<div class="cal-month-grid">';
   DAYS.forEach(d => { html += `<div class="cal-day-header">${d}</div>`; });
@@ -1169,11 +1518,11 @@ function renderMonthView() {
   for (let day = 1; day <= daysInMonth; day++) {
     const dateStr = `${y}-${String(m + 1).padStart(2, '0')}-${String(day).padStart(2, '0')}`;
     const isToday = dateStr === todayStr;
-    const entries = entriesForDate(dateStr);
+    const entries = index.get(dateStr) || [];
     const dots = entries.slice(0, 4).map(e => `<span class="cal-dot ${e.color}" title="${e.title}"></span>`).join('');
     const plusMore = entries.length > 4 ? `<span style="font-size:8px;color:var(--text3);margin-left:2px">+${entries.length - 4}</span>` : '';
 
-    html += `<div class="cal-day${isToday ? ' today' : ''}" onclick="showDayDetail('${dateStr}')">
+    html += `<div class="cal-day${isToday ? ' today' : ''}" data-date="${dateStr}" onclick="showDayDetail('${dateStr}')">
       <div class="cal-day-num">${day}</div>
       <div class="cal-dot-row">${dots}${plusMore}</div>
     </div>`;
@@ -1188,19 +1537,47 @@ function renderMonthView() {
 
   html += '</div>';
   grid.innerHTML = html;
+  decorateCyclePhases(y, m);
+}
+
+// ===== CYCLE PHASES (calendar) =====
+// 'YYYY-MM' -> day-by-day phases from /api/period/range; cleared whenever a period is logged
+let phaseCache = {};
+
+function clearPhaseCache() { phaseCache = {}; }
+
+async function decorateCyclePhases(y, m) {
+  if (!get(K.PERIOD, []).length) return;
+  const month = `${y}-${String(m + 1).padStart(2, '0')}`;
+  if (!phaseCache[month]) {
+    const user = getObj(K.USER) || {};
+    try {
+      const res = await fetch(`/api/period/range?userId=${encodeURIComponent(user.name || 'default_user')}&month=${month}`);
+      const result = await res.json();
+      if (!result.success) return;
+      phaseCache[month] = result.data.days;
+    } catch (e) { return; }
+  }
+  phaseCache[month].forEach(d => {
+    const num = document.querySelector(`.cal-day[data-date="${d.date}"] .cal-day-num`);
+    if (!num || num.querySelector('.cal-phase')) return;
+    const label = `${d.phase}${d.predicted ? ' (predicted)' : ''} · day ${d.day_in_cycle}`;
+    num.insertAdjacentHTML('beforeend', `<span class="cal-phase" title="${label}">${d.emoji}</span>`);
+  });
 }
 
 function renderWeekView() {
   const grid = document.getElementById('calendar-grid');
   const ws = getWeekStart(calendarDate);
   const todayStr = today();
+  const index = calendarIndex();
 
   let html = '<div class="cal-week-grid">';
   for (let i = 0; i < 7; i++) {
     const d = new Date(ws); d.setDate(d.getDate() + i);
     const dateStr = d.toISOString().split('T')[0];
     const isToday = dateStr === todayStr;
-    const entries = entriesForDate(dateStr);
+    const entries = index.get(dateStr) || [];
     const items = entries.map(e => {
       const label = e.type === 'deadline_due' ? '[DUE]' : e.type === 'deadline_start' ? '[START]' : e.type.toUpperCase();
       return `<div class="cal-deadline-item ${e.color}" style="font-size:10px;margin-bottom:2px;" title="${e.title}">${label} ${e.title}</div>`;
@@ -1614,17 +1991,14 @@ function addHistoricalPeriod() {
     return;
   }
 
-  log.push({ id: uid(), startDate: input.value, endDate: null });
+  const startDate = input.value;
+  log.push({ id: uid(), startDate, endDate: null });
   log.sort((a, b) => b.startDate.localeCompare(a.startDate)); // Keep chronological
   set(K.PERIOD, log);
+  clearPhaseCache();
   input.value = '';
 
-  const user = getObj(K.USER) || {};
-  fetch('/api/period/log-start', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ userId: user.name || 'default_user', date: input.value, notes: 'Historical data' })
-  }).catch(() => { });
+  queuePeriodUpload({ startDate, notes: 'Historical data' });
 
   showToast('📅 Period date added!', 'success');
   renderProgress();
@@ -1922,26 +2296,101 @@ function confirmClearData() {
   }
 }
 
+// ===== SERVICE WORKER =====
+// Serves the app shell from cache (so Aria opens while the backend is cold) and queues
+// sync pushes / period logs made offline, replaying them once the network is back.
+let swRegistration = null;
+
+function registerServiceWorker() {
+  if (!('serviceWorker' in navigator) || swRegistration) return;
+  swRegistration = navigator.serviceWorker.register('/service-worker.js', { scope: '/' })
+    .then(reg => {
+      // Workers registered from /static/ before this one have the wrong scope and never served the page
+      navigator.serviceWorker.getRegistrations().then(regs => regs
+        .filter(r => r.scope !== reg.scope)
+        .forEach(r => r.unregister()));
+      return reg;
+    })
+    .catch((err) => {
+      console.log('Service Worker registration failed:', err);
+      return null;
+    });
+
+  window.addEventListener('online', () => {
+    if (navigator.serviceWorker.controller) navigator.serviceWorker.controller.postMessage('replay-outbox');
+  });
+  navigator.serviceWorker.addEventListener('message', (event) => {
+    if (event.data && event.data.type === 'outbox-replayed') {
+      console.log(`☁️ Sent ${event.data.sent} request(s) queued while offline`);
+      updateSyncStatus(true);
+    }
+  });
+}
+
 // ===== BROWSER NOTIFICATIONS =====
+// With a sync key, deadline and period reminders are sent by the server as Web Push
+// and arrive even when Aria is closed. The in-page checks below cover devices without it.
 function requestNotifPermission() {
   if (!('Notification' in window)) return;
-  if (Notification.permission === 'default') {
-    Notification.requestPermission();
-  }
-
-  // Register service worker for push notifications
-  if ('serviceWorker' in navigator) {
-    navigator.serviceWorker.register('/static/service-worker.js').catch((err) => {
-      console.log('Service Worker registration failed:', err);
-    });
+  const permission = Notification.permission === 'default'
+    ? Promise.resolve(Notification.requestPermission())
+    : Promise.resolve(Notification.permission);
+
+  if (swRegistration) {
+    swRegistration
+      .then(reg => reg && permission.then(() => subscribeToPush(reg)))
+      .catch(() => { });
   }
 
   // Check for period reminders on load
   schedulePeriodNotifs();
 }
 
+function urlBase64ToUint8Array(base64) {
+  const padding = '='.repeat((4 - base64.length % 4) % 4);
+  const raw = atob((base64 + padding).replace(/-/g, '+').replace(/_/g, '/'));
+  return Uint8Array.from(raw, c => c.charCodeAt(0));
+}
+
+async function subscribeToPush(registration) {
+  const syncKey = getObj(K.SYNC_KEY);
+  if (!syncKey || !('PushManager' in window) || Notification.permission !== 'granted') return false;
+  try {
+    const { publicKey } = await (await fetch('/api/push/key')).json();
+    if (!publicKey) throw new Error('server has no VAPID key');
+    const subscription = await registration.pushManager.getSubscription() ||
+      await registration.pushManager.subscribe({
+        userVisibleOnly: true,
+        applicationServerKey: urlBase64ToUint8Array(publicKey)
+      });
+    const user = getObj(K.USER) || {};
+    const res = await fetch('/api/push/subscribe', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        syncKey,
+        userId: user.name || 'default_user',
+        subscription: subscription.toJSON(),
+        tzOffset: new Date().getTimezoneOffset()
+      })
+    });
+    const result = await res.json();
+    if (!result.success) throw new Error(result.error || 'subscribe failed');
+    // Device-local, so not through set() (which would schedule a sync push)
+    localStorage.setItem(K.PUSH, JSON.stringify(subscription.endpoint));
+    return true;
+  } catch (e) {
+    console.warn('Web Push unavailable, using in-page reminders:', e);
+    localStorage.removeItem(K.PUSH);
+    return false;
+  }
+}
+
+// The server sends this device's reminders, so the page shouldn't show them too
+const serverPushActive = () => !!getObj(K.PUSH) && !!getObj(K.SYNC_KEY);
+
 function scheduleDeadlineNotifs() {
-  if (Notification.permission !== 'granted') return;
+  if (Notification.permission !== 'granted' || serverPushActive()) return;
   const notified = get(K.NOTIFIED, []);
   const todayStr = today();
   const deadlines = get(K.DEADLINES, []).filter(d => d.status !== 'done');
@@ -1974,7 +2423,7 @@ function scheduleDeadlineNotifs() {
 }
 
 function schedulePeriodNotifs() {
-  if (Notification.permission !== 'granted') return;
+  if (Notification.permission !== 'granted' || serverPushActive()) return;
   const notified = get(K.NOTIFIED, []);
   const ctx = calcPeriodContext();
   if (!ctx.nextPredicted) return;
@@ -1,11 +1,218 @@
-// Service Worker for Aria Push Notifications
+// Service Worker for Aria: offline app shell, queued write replay, push notifications.
+// Served from /service-worker.js (scope '/'); the server prepends CACHE_VERSION and
+// PRECACHE_URLS (the page plus the current content-hashed /assets/ URLs).
 
+const SHELL_CACHE = `aria-shell-${CACHE_VERSION}`;
+
+// Writes that are safe to send later: failed ones are queued in IndexedDB and replayed in order
+const REPLAYABLE = ['/api/sync/push', '/api/chat/messages', '/api/period/bulk', '/api/period/log-start', '/api/period/log-end'];
+const OUTBOX_DB = 'aria-sw';
+const OUTBOX = 'outbox';
+const SYNC_TAG = 'aria-replay';
+const MAX_REPLAY_ATTEMPTS = 20;
+
+// ===== APP SHELL =====
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(SHELL_CACHE)
+      .then(cache => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(
+        keys.filter(k => k.startsWith('aria-shell-') && k !== SHELL_CACHE).map(k => caches.delete(k))
+      ))
+      .then(() => self.clients.claim())
+      .then(() => replayOutbox())
+  );
+});
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (request.method === 'POST' && REPLAYABLE.includes(url.pathname)) {
+    event.respondWith(sendOrQueue(request));
+    return;
+  }
+  if (request.method !== 'GET') return;
+
+  if (request.mode === 'navigate' && url.pathname === '/') {
+    // Open instantly from cache (even while the backend is cold), refresh the copy behind the scenes
+    event.respondWith(staleWhileRevalidate(event, '/'));
+    event.waitUntil(replayOutbox());
+  } else if (url.pathname.startsWith('/assets/')) {
+    // Content-hashed URLs never change, so a cached copy is always right
+    event.respondWith(cacheFirst(request));
+  }
+});
+
+async function cacheFirst(request) {
+  const cached = await caches.match(request);
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(SHELL_CACHE);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+async function staleWhileRevalidate(event, cacheKey) {
+  const cache = await caches.open(SHELL_CACHE);
+  const cached = await cache.match(cacheKey);
+  const refresh = fetch(event.request)
+    .then(response => {
+      if (response.ok) cache.put(cacheKey, response.clone());
+      return response;
+    });
+  if (cached) {
+    event.waitUntil(refresh.catch(() => { }));
+    return cached;
+  }
+  return refresh;
+}
+
+// ===== OUTBOX (IndexedDB) =====
+function openOutbox() {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(OUTBOX_DB, 1);
+    req.onupgradeneeded = () => req.result.createObjectStore(OUTBOX, { keyPath: 'id', autoIncrement: true });
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+async function outboxTx(mode, fn) {
+  const db = await openOutbox();
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction(OUTBOX, mode);
+    const result = fn(tx.objectStore(OUTBOX));
+    tx.oncomplete = () => { db.close(); resolve(result && 'result' in result ? result.result : undefined); };
+    tx.onerror = () => { db.close(); reject(tx.error); };
+  });
+}
+
+const outboxEntries = () => outboxTx('readonly', store => store.getAll());
+const outboxDelete = (id) => outboxTx('readwrite', store => store.delete(id));
+const outboxPut = (entry) => outboxTx('readwrite', store => store.put(entry));
+
+async function enqueue(entry) {
+  const entries = await outboxEntries();
+  if (entry.url === '/api/sync/push') {
+    // Only user_data rows are touched by a sync push, so a queued one for the same key can absorb this one
+    const body = JSON.parse(entry.body);
+    const queued = entries.find(e => e.url === entry.url && JSON.parse(e.body).syncKey === body.syncKey);
+    if (queued) {
+      const merged = JSON.parse(queued.body);
+      merged.payload = Object.assign({}, merged.payload, body.payload);
+      queued.body = JSON.stringify(merged);
+      queued.queuedAt = entry.queuedAt;
+      return outboxPut(queued);
+    }
+  }
+  await outboxPut(entry);
+  if (self.registration.sync) {
+    self.registration.sync.register(SYNC_TAG).catch(() => { });
+  }
+}
+
+// 5xx, timeouts and rate limits can succeed later; other 4xx never will
+const retryable = (status) => status >= 500 || status === 408 || status === 429;
+
+function send(entry) {
+  return fetch(entry.url, {
+    method: 'POST',
+    headers: { 'Content-Type': entry.contentType || 'application/json' },
+    body: entry.body
+  });
+}
+
+let replaying = null;
+
+// Send queued writes oldest first, stopping at the first one that still can't get through
+function replayOutbox() {
+  if (!replaying) {
+    replaying = (async () => {
+      let sent = 0;
+      for (const entry of await outboxEntries()) {
+        let response;
+        try {
+          response = await send(entry);
+        } catch (e) {
+          return sent; // still offline
+        }
+        if (retryable(response.status)) {
+          entry.attempts = (entry.attempts || 0) + 1;
+          if (entry.attempts < MAX_REPLAY_ATTEMPTS) {
+            await outboxPut(entry);
+            return sent;
+          }
+          console.warn(`Dropping queued ${entry.url} after ${entry.attempts} attempts`);
+        } else if (!response.ok) {
+          console.warn(`Dropping queued ${entry.url}: HTTP ${response.status}`);
+        }
+        await outboxDelete(entry.id);
+        sent++;
+      }
+      if (sent) notifyClients({ type: 'outbox-replayed', sent });
+      return sent;
+    })().finally(() => { replaying = null; });
+  }
+  return replaying;
+}
+
+async function sendOrQueue(request) {
+  const entry = {
+    url: new URL(request.url).pathname,
+    contentType: request.headers.get('Content-Type'),
+    body: await request.clone().text(),
+    queuedAt: new Date().toISOString(),
+    attempts: 0
+  };
+  // Earlier queued writes go first, so this one can't overtake them
+  await replayOutbox();
+  if (!(await outboxEntries()).length) {
+    try {
+      const response = await fetch(request);
+      if (!retryable(response.status)) return response;
+    } catch (e) { /* offline: queue it */ }
+  }
+  await enqueue(entry);
+  return new Response(JSON.stringify({ success: true, queued: true }), {
+    status: 202,
+    headers: { 'Content-Type': 'application/json' }
+  });
+}
+
+async function notifyClients(message) {
+  const clientList = await self.clients.matchAll({ type: 'window' });
+  clientList.forEach(client => client.postMessage(message));
+}
+
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) {
+    // Rejecting makes the browser retry the sync later
+    event.waitUntil(replayOutbox().then(() => outboxEntries()).then(left => {
+      if (left.length) throw new Error(`${left.length} queued request(s) still pending`);
+    }));
+  }
+});
+
+self.addEventListener('message', (event) => {
+  if (event.data === 'replay-outbox') event.waitUntil(replayOutbox());
+});
+
+// ===== PUSH NOTIFICATIONS =====
 self.addEventListener('push', (event) => {
   const data = event.data.json();
   const options = {
     body: data.body,
-    icon: '✦',
-    badge: '✦',
     tag: data.tag || 'aria-notification',
     requireInteraction: data.requireInteraction || false,
   };
@@ -20,7 +227,7 @@ self.addEventListener('notificationclick', (event) => {
     clients.matchAll({ type: 'window', includeUncontrolled: true }).then((clientList) => {
       for (let i = 0; i < clientList.length; i++) {
         const client = clientList[i];
-        if (client.url === '/' && 'focus' in client) {
+        if (new URL(client.url).pathname === '/' && 'focus' in client) {
           return client.focus();
         }
       }
@@ -1,16 +1,33 @@
 """Supabase client and period tracking utilities."""
 
+import hashlib
+import json
 import os
-from datetime import datetime, timedelta
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+
+import http_pool
+import jobs
+import metrics
+from cache import TTLCache
 
 load_dotenv()
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY) if SUPABASE_URL and SUPABASE_ANON_KEY else None
+
+def _client_options():
+    """Route Supabase traffic through the shared keep-alive pool."""
+    try:
+        return ClientOptions(httpx_client=http_pool.httpx_client("supabase"))
+    except TypeError:  # supabase-py without httpx_client support
+        return None
+
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY, options=_client_options()) if SUPABASE_URL and SUPABASE_ANON_KEY else None
 
 
 def init_supabase():
@@ -35,6 +52,7 @@ def init_supabase():
         return False
 
 
+@metrics.timed('supabase.log_period_start')
 def log_period_start(user_id: str, date: str, notes: str = None) -> dict:
     """Log period start date."""
     if not supabase:
@@ -47,11 +65,13 @@ def log_period_start(user_id: str, date: str, notes: str = None) -> dict:
             "notes": notes or "Period started"
         }
         response = supabase.table("period_logs").insert(data).execute()
+        schedule_cycle_stats_refresh(user_id)
         return {"success": True, "data": response.data}
     except Exception as e:
         return {"error": str(e)}
 
 
+@metrics.timed('supabase.log_period_end')
 def log_period_end(user_id: str, start_date: str, end_date: str) -> dict:
     """Update period end date."""
     if not supabase:
@@ -65,49 +85,117 @@ def log_period_end(user_id: str, start_date: str, end_date: str) -> dict:
             .eq("start_date", start_date)
             .execute()
         )
+        schedule_cycle_stats_refresh(user_id)
         return {"success": True, "data": response.data}
     except Exception as e:
         return {"error": str(e)}
 
 
-def get_period_history(user_id: str) -> list:
-    """Get all logged periods for a user."""
+# Upper bound on start/end pairs accepted by one /api/period/bulk call
+MAX_BULK_PERIODS = int(os.environ.get("ARIA_MAX_BULK_PERIODS", 500))
+
+
+@metrics.timed('supabase.log_periods_bulk')
+def log_periods_bulk(user_id: str, periods: list) -> dict:
+    """Upsert many periods in one statement and return the recomputed cycle stats.
+
+    `periods` are {"start_date", "end_date", "notes"} dicts, one per start date.
+    Pairs already logged with the same end date are skipped; a known start with
+    a different (non-empty) end date updates that row and keeps its notes.
+    """
+    if not supabase:
+        return {"error": "Supabase not configured"}
+
+    try:
+        # Read directly rather than via get_period_history(), which hides a failed read as "no history"
+        logged = supabase.table("period_logs").select("*").eq("user_id", user_id).execute().data or []
+        existing = {p["start_date"]: p for p in logged if p.get("start_date")}
+        rows = []
+        inserted = updated = 0
+        for p in periods:
+            known = existing.get(p["start_date"])
+            if known is None:
+                inserted += 1
+            elif p["end_date"] and p["end_date"] != known.get("end_date"):
+                updated += 1
+            else:
+                continue
+            row = {"user_id": user_id, "start_date": p["start_date"],
+                   "end_date": p["end_date"] or None,
+                   "notes": (known or {}).get("notes") or p.get("notes") or "Period started"}
+            rows.append(row)
+            existing[p["start_date"]] = row
+        if rows:
+            supabase.table("period_logs").upsert(rows, on_conflict="user_id,start_date").execute()
+
+        # The merged rows are the new history, so the stats come from memory rather than a re-fetch
+        history = list(existing.values())
+        stats = compute_cycle_stats(history)
+        _cycle_cache.set(user_id, {
+            "stats": stats,
+            "starts": sorted({p["start_date"] for p in history if _parse_date(p.get("start_date"))}),
+        })
+        if rows:
+            try:
+                jobs.submit_write('cycle_stats', store_cycle_stats, user_id, stats, key=f"cycle_stats:{user_id}")
+            except jobs.QueueFull:
+                print(f"⚠️ Write queue full, cycle_stats for {user_id} not stored")
+        return {"success": True, "inserted": inserted, "updated": updated,
+                "skipped": len(periods) - len(rows), "stats": dict(stats)}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _fetch_period_history(user_id: str) -> list:
+    """All logged periods for a user, newest first; raises if the read fails."""
     if not supabase:
         return []
-    
+    response = (
+        supabase.table("period_logs")
+        .select("*")
+        .eq("user_id", user_id)
+        .order("start_date", desc=True)
+        .execute()
+    )
+    return response.data or []
+
+
+@metrics.timed('supabase.get_period_history')
+def get_period_history(user_id: str) -> list:
+    """Get all logged periods for a user."""
     try:
-        response = (
-            supabase.table("period_logs")
-            .select("*")
-            .eq("user_id", user_id)
-            .order("start_date", desc=True)
-            .execute()
-        )
-        return response.data or []
+        return _fetch_period_history(user_id)
     except Exception:
         return []
 
 
-def calculate_cycle_stats(user_id: str) -> dict:
-    """Calculate average cycle length and predict next period."""
-    periods = get_period_history(user_id)
-    
+DEFAULT_CYCLE_STATS = {
+    "avg_cycle_length": 28,
+    "avg_period_length": 5,
+    "last_period_start": None,
+    "predicted_next_period": None
+}
+
+# user_id -> {"stats": ..., "starts": [...]}. Dropped by log_period_start/end in
+# this process; the TTL bounds staleness from writes made by other workers.
+CYCLE_STATS_CACHE_TTL = int(os.environ.get("CYCLE_STATS_CACHE_TTL", 10 * 60))
+_cycle_cache = TTLCache(maxsize=1024, ttl=CYCLE_STATS_CACHE_TTL)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_cycle_stats(periods: list) -> dict:
+    """Average cycle/period length and next-period prediction from period_logs rows (no I/O)."""
     if not periods:
-        return {
-            "avg_cycle_length": 28,
-            "avg_period_length": 5,
-            "last_period_start": None,
-            "predicted_next_period": None
-        }
+        return dict(DEFAULT_CYCLE_STATS)
     
     # Convert date strings to datetime objects
-    period_dates = []
-    for p in periods:
-        try:
-            start = datetime.strptime(p["start_date"], "%Y-%m-%d")
-            period_dates.append(start)
-        except:
-            pass
+    period_dates = sorted(d for d in (_parse_date(p.get("start_date")) for p in periods) if d)
     
     if len(period_dates) < 2:
         # Not enough data to calculate cycle
@@ -121,9 +209,6 @@ def calculate_cycle_stats(user_id: str) -> dict:
             "confidence": "low"
         }
     
-    # Sort dates
-    period_dates.sort()
-    
     # Calculate cycle lengths
     cycle_lengths = []
     for i in range(1, len(period_dates)):
@@ -137,15 +222,12 @@ def calculate_cycle_stats(user_id: str) -> dict:
     # Calculate period length (using end_date if available)
     period_lengths = []
     for p in periods:
-        if p.get("end_date"):
-            try:
-                start = datetime.strptime(p["start_date"], "%Y-%m-%d")
-                end = datetime.strptime(p["end_date"], "%Y-%m-%d")
-                length = (end - start).days + 1
-                if 2 <= length <= 10:
-                    period_lengths.append(length)
-            except:
-                pass
+        start = _parse_date(p.get("start_date"))
+        end = _parse_date(p.get("end_date"))
+        if start and end:
+            length = (end - start).days + 1
+            if 2 <= length <= 10:
+                period_lengths.append(length)
     
     avg_period_length = sum(period_lengths) / len(period_lengths) if period_lengths else 5
     
@@ -153,18 +235,6 @@ def calculate_cycle_stats(user_id: str) -> dict:
     last_period_start = period_dates[-1]
     predicted_next = last_period_start + timedelta(days=int(avg_cycle_length))
     
-    # Save to cycle_stats table
-    try:
-        supabase.table("cycle_stats").upsert({
-            "user_id": user_id,
-            "avg_cycle_length": avg_cycle_length,
-            "avg_period_length": avg_period_length,
-            "last_period_start": str(last_period_start.date()),
-            "predicted_next_period": str(predicted_next.date())
-        }).execute()
-    except:
-        pass
-    
     return {
         "avg_cycle_length": round(avg_cycle_length, 1),
         "avg_period_length": round(avg_period_length, 1),
@@ -174,88 +244,468 @@ def calculate_cycle_stats(user_id: str) -> dict:
     }
 
 
-def predict_cycle_phases(user_id: str, target_date: str = None) -> dict:
-    """Predict cycle phases for a given date."""
-    target = datetime.strptime(target_date, "%Y-%m-%d") if target_date else datetime.now()
-    stats = calculate_cycle_stats(user_id)
-    
-    if not stats["last_period_start"]:
-        return {"error": "No period data available"}
-    
-    last_start = datetime.strptime(stats["last_period_start"], "%Y-%m-%d")
-    cycle_length = int(stats["avg_cycle_length"])
-    period_length = int(stats["avg_period_length"])
-    
-    # Calculate day in current cycle
-    days_into_cycle = (target - last_start).days % cycle_length
-    
-    # Determine phase
+def _cycle_data(user_id: str) -> dict:
+    """Memoized stats plus sorted period start dates for a user.
+
+    A failed period_logs read raises rather than passing for "no history", so
+    default stats are never cached or materialized over a user's real ones.
+    """
+    cached = _cycle_cache.get(user_id)
+    if cached is not None:
+        return cached
+    periods = _fetch_period_history(user_id)
+    data = {
+        "stats": compute_cycle_stats(periods),
+        "starts": sorted({p["start_date"] for p in periods if _parse_date(p.get("start_date"))}),
+    }
+    _cycle_cache.set(user_id, data)
+    return data
+
+
+def calculate_cycle_stats(user_id: str) -> dict:
+    """Calculate average cycle length and predict next period (memoized per user)."""
+    return dict(_cycle_data(user_id)["stats"])
+
+
+@metrics.timed('supabase.refresh_cycle_stats')
+def refresh_cycle_stats(user_id: str) -> dict:
+    """Recompute a user's stats after a period_logs write and materialize them to cycle_stats.
+
+    Runs as a background job; a failed read or upsert raises so the job is retried.
+    """
+    _cycle_cache.pop(user_id)
+    return store_cycle_stats(user_id, calculate_cycle_stats(user_id))
+
+
+def store_cycle_stats(user_id: str, stats: dict) -> dict:
+    """Materialize already-computed stats to cycle_stats (raises on failure, for job retries)."""
+    if supabase and stats["last_period_start"]:
+        supabase.table("cycle_stats").upsert({
+            "user_id": user_id,
+            "avg_cycle_length": stats["avg_cycle_length"],
+            "avg_period_length": stats["avg_period_length"],
+            "last_period_start": stats["last_period_start"],
+            "predicted_next_period": stats["predicted_next_period"],
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }, on_conflict="user_id").execute()
+    return stats
+
+
+def schedule_cycle_stats_refresh(user_id: str):
+    """Drop the memoized stats now and rebuild/materialize them off the request path."""
+    _cycle_cache.pop(user_id)
+    try:
+        return jobs.submit_write('cycle_stats', refresh_cycle_stats, user_id,
+                                 key=f"cycle_stats:{user_id}", dedupe=True)
+    except jobs.QueueFull:
+        # The period write itself succeeded; cycle_stats catches up on this user's next write
+        print(f"⚠️ Write queue full, cycle_stats for {user_id} not refreshed")
+        return None
+
+
+def cycle_phase(days_into_cycle: int, period_length: int) -> tuple:
+    """(phase, emoji) for a 0-based day within a cycle."""
     if days_into_cycle < period_length:
-        phase = "Menstruation"
-        emoji = "🔴"
+        return "Menstruation", "🔴"
     elif days_into_cycle < 14:
-        phase = "Follicular"
-        emoji = "🟡"
+        return "Follicular", "🟡"
     elif days_into_cycle < 16:
-        phase = "Ovulation"
-        emoji = "🟠"
+        return "Ovulation", "🟠"
     elif days_into_cycle < 22:
-        phase = "Luteal"
-        emoji = "🟣"
-    else:
-        phase = "PMS Week"
-        emoji = "🌙"
-    
+        return "Luteal", "🟣"
+    return "PMS Week", "🌙"
+
+
+MAX_PHASE_RANGE_DAYS = 400
+
+
+def predict_cycle_phase_range(user_id: str, start_date: str, end_date: str) -> dict:
+    """Phase for every day in [start_date, end_date] from a single stats lookup.
+
+    Days inside logged history are anchored on the actual logged start before
+    them; days after the last logged start walk forward through successive
+    predicted cycles (last start + k * cycle length).
+    """
+    start = _parse_date(start_date)
+    end = _parse_date(end_date)
+    if not start or not end or end < start:
+        return {"error": "start and end must be YYYY-MM-DD with start <= end"}
+    if (end - start).days >= MAX_PHASE_RANGE_DAYS:
+        return {"error": f"Range too large (max {MAX_PHASE_RANGE_DAYS} days)"}
+
+    data = _cycle_data(user_id)
+    stats = data["stats"]
+    if not stats["last_period_start"]:
+        return {"error": "No period data available"}
+
+    cycle_length = int(stats["avg_cycle_length"])
+    period_length = int(stats["avg_period_length"])
+    starts = [_parse_date(s) for s in data["starts"]]
+    first, last = starts[0], starts[-1]
+
+    days = []
+    predicted_starts = []
+    day = start
+    idx = bisect_right(starts, day) - 1
+    while day <= end:
+        while idx + 1 < len(starts) and starts[idx + 1] <= day:
+            idx += 1
+        if day >= last:
+            anchor = last + timedelta(days=((day - last).days // cycle_length) * cycle_length)
+            predicted = anchor > last
+        elif idx >= 0:
+            anchor = starts[idx]
+            predicted = False
+        else:
+            # Before the first logged period: project cycles backwards
+            anchor = first - timedelta(days=-((day - first).days // cycle_length) * cycle_length)
+            predicted = True
+
+        if predicted and anchor == day:
+            predicted_starts.append(str(day.date()))
+        days_into_cycle = (day - anchor).days
+        phase, emoji = cycle_phase(days_into_cycle, period_length)
+        days.append({
+            "date": str(day.date()),
+            "phase": phase,
+            "emoji": emoji,
+            "day_in_cycle": days_into_cycle + 1,
+            "predicted": predicted
+        })
+        day += timedelta(days=1)
+
     return {
-        "date": target_date or datetime.now().strftime("%Y-%m-%d"),
-        "phase": phase,
-        "emoji": emoji,
-        "day_in_cycle": days_into_cycle + 1,
+        "start": str(start.date()),
+        "end": str(end.date()),
         "cycle_length": cycle_length,
-        "stats": stats
+        "period_length": period_length,
+        "predicted_starts": predicted_starts,
+        "days": days,
+        "stats": dict(stats)
+    }
+
+
+def predict_cycle_phases(user_id: str, target_date: str = None) -> dict:
+    """Predict cycle phases for a given date."""
+    target = target_date or datetime.now().strftime("%Y-%m-%d")
+    result = predict_cycle_phase_range(user_id, target, target)
+    if "error" in result:
+        return result
+
+    day = result["days"][0]
+    return {
+        "date": target,
+        "phase": day["phase"],
+        "emoji": day["emoji"],
+        "day_in_cycle": day["day_in_cycle"],
+        "cycle_length": result["cycle_length"],
+        "stats": result["stats"]
     }
 
 
+# Pulls re-read this far behind their cursor. A deferred push is stamped when it is queued
+# but can commit later (on another worker), after a pull has already moved past its time.
+SYNC_PULL_OVERLAP = float(os.environ.get("ARIA_SYNC_PULL_OVERLAP", 120))
+
+
+def parse_timestamp(value):
+    """UTC datetime for an ISO/Postgres timestamp (any fractional digits), or None."""
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def format_timestamp(moment: datetime) -> str:
+    """Fixed-width UTC ISO string, so cursors also order correctly as plain strings (the client compares them)."""
+    return moment.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def content_hash(blob) -> str:
+    """Stable hash of a synced blob; pulls return it so callers can skip keys they already hold."""
+    canonical = json.dumps(blob, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@metrics.timed('supabase.save_user_data')
 def save_user_data(sync_key: str, data: dict) -> dict:
-    """Save all user data to Supabase."""
+    """Save changed user data blobs to Supabase.
+
+    The client sends only the keys it changed, and every one is written: a
+    process-local record of what's stored goes stale as soon as another
+    worker writes the same sync key, so it can't be trusted to skip a write.
+    The write completes before this returns, so a successful result means
+    the data is in the table; the cursor is the updated_at it was written
+    with (pulls overlap by SYNC_PULL_OVERLAP, so one that raced it still
+    sees it).
+    """
     if not supabase:
         return {"error": "Supabase not configured"}
     
     try:
         # data is a dict of { key: value_blob }
-        rows = []
-        for key, blob in data.items():
-            rows.append({
-                "user_id": sync_key,
-                "data_key": key,
-                "data_blob": blob,
-                "updated_at": datetime.now().isoformat()
-            })
+        now = format_timestamp(datetime.now(timezone.utc))
+        rows = [{
+            "user_id": sync_key,
+            "data_key": key,
+            "data_blob": blob,
+            "content_hash": content_hash(blob),
+            "updated_at": now
+        } for key, blob in data.items()]
         
+        result = {
+            "success": True,
+            "count": len(rows),
+            "cursor": now if rows else None
+        }
         if rows:
-            response = supabase.table("user_sync").upsert(rows).execute()
-            return {"success": True, "count": len(rows)}
-        return {"success": True, "count": 0}
+            supabase.table("user_sync").upsert(rows).execute()
+        return result
     except Exception as e:
         return {"error": str(e)}
 
 
-def get_all_user_data(sync_key: str) -> dict:
-    """Get all synced data for a user."""
+@metrics.timed('supabase.get_all_user_data')
+def get_all_user_data(sync_key: str, since: str = None) -> dict:
+    """Get synced data for a user.
+
+    With `since` (a cursor from an earlier pull) only keys updated after
+    SYNC_PULL_OVERLAP seconds before it are returned. Rows near the cursor are
+    sent again, so callers skip a key whose `versions`/`hashes` entry they
+    already have. The response cursor is the newest updated_at seen.
+    """
     if not supabase:
         return {"error": "Supabase not configured"}
     
     try:
-        response = (
+        newest = None
+        query = (
             supabase.table("user_sync")
-            .select("data_key, data_blob")
+            .select("data_key, data_blob, content_hash, updated_at")
             .eq("user_id", sync_key)
-            .execute()
         )
+        if since:
+            newest = parse_timestamp(since)
+            if newest is None:
+                return {"error": "Invalid since cursor"}
+            query = query.gt("updated_at", format_timestamp(newest - timedelta(seconds=SYNC_PULL_OVERLAP)))
+        response = query.execute()
+
         # Convert list of rows to a dict
-        result = {}
+        result, versions, hashes = {}, {}, {}
         for row in response.data:
-            result[row["data_key"]] = row["data_blob"]
-        return {"success": True, "data": result}
+            key = row["data_key"]
+            result[key] = row["data_blob"]
+            hashes[key] = row.get("content_hash")
+            updated = parse_timestamp(row.get("updated_at"))
+            if updated:
+                versions[key] = format_timestamp(updated)
+                if newest is None or updated > newest:
+                    newest = updated
+        return {"success": True, "data": result, "versions": versions, "hashes": hashes,
+                "cursor": format_timestamp(newest) if newest else None}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def save_push_subscription(sync_key: str, subscription: dict, user_id: str = None, tz_offset: int = 0) -> dict:
+    """Store (or refresh) a Web Push subscription for a sync key, keyed by its endpoint."""
+    if not supabase:
+        return {"error": "Supabase not configured"}
+    
+    try:
+        keys = subscription.get("keys") or {}
+        row = {
+            "endpoint": subscription["endpoint"],
+            "user_id": sync_key,
+            "period_user_id": user_id,
+            "p256dh": keys.get("p256dh"),
+            "auth": keys.get("auth"),
+            "tz_offset": int(tz_offset or 0),
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        response = supabase.table("push_subscriptions").upsert(row, on_conflict="endpoint").execute()
+        return {"success": True, "data": response.data}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def delete_push_subscription(endpoint: str) -> dict:
+    """Remove a subscription (unsubscribed, or the push service reported it gone)."""
+    if not supabase:
+        return {"error": "Supabase not configured"}
+    
+    try:
+        supabase.table("push_subscriptions").delete().eq("endpoint", endpoint).execute()
+        return {"success": True}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_push_endpoints():
+    """Every subscribed endpoint, so the scheduler can drop ones deleted elsewhere (None if the read failed)."""
+    if not supabase:
+        return None
+    
+    try:
+        return {row["endpoint"] for row in supabase.table("push_subscriptions").select("endpoint").execute().data or []}
+    except Exception:
+        return None
+
+
+def get_push_subscriptions(since: str = None, sync_key: str = None) -> list:
+    """All push subscriptions (or one sync key's), optionally only those added/refreshed after `since`."""
+    if not supabase:
+        return []
+    
+    try:
+        query = supabase.table("push_subscriptions").select("*")
+        if sync_key:
+            query = query.eq("user_id", sync_key)
+        if since:
+            query = query.gt("updated_at", since)
+        return query.execute().data or []
+    except Exception:
+        return []
+
+
+# Keys per `in_` filter: PostgREST puts the list in the URL, which proxies cap at a few KB
+IN_FILTER_BATCH_SIZE = int(os.environ.get("ARIA_IN_FILTER_BATCH_SIZE", 100))
+
+
+def _batches(values):
+    values = list(values)
+    for i in range(0, len(values), IN_FILTER_BATCH_SIZE):
+        yield values[i:i + IN_FILTER_BATCH_SIZE]
+
+
+def get_sync_blobs(data_key: str, sync_keys: list, since: str = None) -> list:
+    """One data_key's blob for many sync keys: [{user_id, data_blob, updated_at}]."""
+    if not supabase or not sync_keys:
+        return []
+    
+    try:
+        rows = []
+        for batch in _batches(sync_keys):
+            query = (
+                supabase.table("user_sync")
+                .select("user_id, data_blob, updated_at")
+                .eq("data_key", data_key)
+                .in_("user_id", batch)
+            )
+            if since:
+                query = query.gt("updated_at", since)
+            rows.extend(query.execute().data or [])
+        return rows
+    except Exception:
+        return []
+
+
+def get_cycle_stats_updates(user_ids: list, since: str) -> list:
+    """cycle_stats rows for `user_ids` materialized after `since`."""
+    if not supabase or not user_ids:
+        return []
+    
+    try:
+        rows = []
+        for batch in _batches(user_ids):
+            response = (
+                supabase.table("cycle_stats")
+                .select("user_id, updated_at")
+                .in_("user_id", batch)
+                .gt("updated_at", since)
+                .execute()
+            )
+            rows.extend(response.data or [])
+        return rows
+    except Exception:
+        return []
+
+
+def forget_cycle_stats(user_id: str):
+    """Drop this process's memoized stats (another worker has written newer ones)."""
+    _cycle_cache.pop(user_id)
+
+
+# Chat log pages: newest first by (ts, client_id), so equal timestamps still page cleanly
+CHAT_PAGE_SIZE = int(os.environ.get("ARIA_CHAT_PAGE_SIZE", 50))
+MAX_CHAT_PAGE_SIZE = 200
+
+
+def _write_chat_rows(rows: list):
+    # client_id makes appends idempotent: a replayed or retried batch doesn't duplicate messages
+    supabase.table("chat_messages").upsert(rows, on_conflict="user_id,client_id", ignore_duplicates=True).execute()
+    return len(rows)
+
+
+@metrics.timed('supabase.append_chat_messages')
+def append_chat_messages(sync_key: str, messages: list, defer: bool = False) -> dict:
+    """Append {id, role, content, ts} messages to a sync key's chat log.
+
+    With `defer`, the insert is queued as a background job (same worker as the
+    key's other chat writes, so they land in order) and the result carries its id.
+    """
+    if not supabase:
+        return {"error": "Supabase not configured"}
+
+    try:
+        rows = [{
+            "user_id": sync_key,
+            "client_id": m["id"],
+            "role": m["role"],
+            "content": m["content"],
+            "ts": m["ts"],
+        } for m in messages]
+        result = {"success": True, "count": len(rows)}
+        if defer:
+            try:
+                job = jobs.submit_write('chat_append', _write_chat_rows, rows, key=f"chat:{sync_key}")
+            except jobs.QueueFull as e:  # nothing was queued, so report it rather than claim success
+                return {"error": str(e)}
+            result["job"] = job.id
+        else:
+            _write_chat_rows(rows)
+        return result
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def chat_cursor(row: dict) -> str:
+    return f"{row['ts']}|{row['client_id']}"
+
+
+@metrics.timed('supabase.get_chat_messages')
+def get_chat_messages(sync_key: str, before: str = None, limit: int = CHAT_PAGE_SIZE) -> dict:
+    """One page of a sync key's chat log, oldest first.
+
+    Without `before` this is the latest page; pass the returned `before` cursor
+    to get the page preceding it. `before` is None once the start is reached.
+    """
+    if not supabase:
+        return {"error": "Supabase not configured"}
+
+    try:
+        limit = max(1, min(int(limit), MAX_CHAT_PAGE_SIZE))
+        query = (
+            supabase.table("chat_messages")
+            .select("client_id, role, content, ts")
+            .eq("user_id", sync_key)
+        )
+        if before:
+            ts, _, client_id = before.rpartition('|')
+            query = query.or_(f'ts.lt."{ts}",and(ts.eq."{ts}",client_id.lt."{client_id}")')
+        # One extra row tells us whether there is an older page
+        rows = query.order("ts", desc=True).order("client_id", desc=True).limit(limit + 1).execute().data or []
+        page = rows[:limit]
+        page.reverse()
+        return {
+            "success": True,
+            "messages": [{"id": r["client_id"], "role": r["role"], "content": r["content"], "ts": r["ts"]}
+                         for r in page],
+            "before": chat_cursor(page[0]) if len(rows) > limit else None,
+        }
     except Exception as e:
         return {"error": str(e)}
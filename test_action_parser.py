@@ -0,0 +1,99 @@
+"""Table-driven checks for parse_reply() and MessageEmitter in action_parser.py.
+
+Run with `python test_action_parser.py` (or `python -m pytest test_action_parser.py`).
+"""
+
+import json
+
+from action_parser import DEFAULT_CONFIRMATION, MessageEmitter, parse_reply
+
+NOTE = '{"type": "ADD_NOTE", "data": {"text": "buy milk"}}'
+
+# (raw model output, expected message, expected action type or None)
+REPLIES = [
+    ('{"message": "Hi!", "action": null}', "Hi!", None),
+    ('```json\n{"message": "Fenced", "action": ' + NOTE + '}\n```', "Fenced", "ADD_NOTE"),
+    ('```\n{"message": "Bare fence"}\n```', "Bare fence", None),
+    ('Sure thing! {"message": "Inner", "action": ' + NOTE + '} Hope that helps.', "Inner", "ADD_NOTE"),
+    # Truncated mid-string, mid-key and after a separator
+    ('{"message": "Cut off mid-sent', "Cut off mid-sent", None),
+    ('{"message": "Noted", "action": ' + NOTE + ', "acti', "Noted", "ADD_NOTE"),
+    ('{"message": "Trailing comma",', "Trailing comma", None),
+    ('{"message": "Nested cut", "action": {"type": "ADD_NOTE", "data": {"text": "x"', "Nested cut", "ADD_NOTE"),
+    # Braces and quotes inside strings don't end the object early
+    ('{"message": "Use {curly} and \\"quotes\\"", "action": null}', 'Use {curly} and "quotes"', None),
+    # Missing message: prose, then a confirmation for an action, then the raw text
+    ('All set. {"action": ' + NOTE + '}', "All set.", "ADD_NOTE"),
+    ('{"action": ' + NOTE + '}', DEFAULT_CONFIRMATION, "ADD_NOTE"),
+    ('{"mood": "happy"}', '{"mood": "happy"}', None),
+    ('{"message": "", "action": null}', '{"message": "", "action": null}', None),
+    # No JSON at all
+    ('Just plain text.', "Just plain text.", None),
+    ('', "", None),
+]
+
+# (action, expected normalized action or None)
+ACTIONS = [
+    ({"type": "add_transaction", "data": {"amount": "$1,200.50", "type": "Expense"}},
+     {"type": "ADD_TRANSACTION", "data": {"amount": 1200.5, "type": "expense"}}),
+    ({"type": "LOG_GYM", "data": {"date": "2026-03-10T08:00:00", "didGo": "true"}},
+     {"type": "LOG_GYM", "data": {"date": "2026-03-10", "didGo": True}}),
+    ({"type": "ADD_DEADLINE", "data": {"title": "Essay", "dueDate": "next week"}},
+     {"type": "ADD_DEADLINE", "data": {"title": "Essay"}}),
+    ({"type": "COMPLETE_DEADLINE", "data": {"title": "Essay"}},
+     {"type": "COMPLETE_DEADLINE", "data": {"title": "Essay"}}),
+    ({"type": "GET_CYCLE_PREDICTION"}, {"type": "GET_CYCLE_PREDICTION", "data": {}}),
+    ({"type": "LAUNCH_ROCKET", "data": {}}, None),
+    ({"type": "LOG_GYM", "data": {"date": "yesterday", "didGo": True}}, None),
+    ({"type": "COMPLETE_DEADLINE", "data": {}}, None),
+    ({"type": "SET_BALANCE", "data": {"amount": True}}, None),
+    ({"type": "ADD_NOTE", "data": "buy milk"}, None),
+]
+
+
+def test_parse_reply_table():
+    for raw, message, action_type in REPLIES:
+        reply = parse_reply(raw)
+        assert reply["message"] == message, (raw, reply["message"])
+        got = reply["action"]["type"] if reply["action"] else None
+        assert got == action_type, (raw, reply["action"])
+
+
+def test_action_validation_table():
+    for action, expected in ACTIONS:
+        reply = parse_reply('{"message": "ok", "action": %s}' % json.dumps(action))
+        assert reply["action"] == expected, (action, reply["action"])
+
+
+def test_actions_list_keeps_only_valid_entries():
+    reply = parse_reply('{"message": "Two things", "actions": [' + NOTE + ', {"type": "NOPE"}]}')
+    assert reply["actions"] == [{"type": "ADD_NOTE", "data": {"text": "buy milk"}}]
+
+
+def test_emitter_streams_message_across_chunk_boundaries():
+    raw = '{"action": {"message": "nested"}, "message": "Caf\\u00e9 \\ud83d\\ude00 \\"ok\\"\\n", "x": 1}'
+    for size in (1, 2, 3, 7, len(raw)):
+        emitter = MessageEmitter()
+        out = ''.join(emitter.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+        assert out == 'Café 😀 "ok"\n', (size, out)
+        assert emitter.done
+        assert emitter.buffer == raw
+
+
+def test_emitter_stops_on_non_string_message():
+    emitter = MessageEmitter()
+    assert emitter.feed('{"message": null, "action": null}') == ''
+    assert emitter.done
+
+
+if __name__ == '__main__':
+    tests = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    exit(1 if failed else 0)
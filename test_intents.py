@@ -0,0 +1,104 @@
+"""Table-driven checks for the rule-based fast path in intents.py.
+
+Run with `python test_intents.py` (or `python -m pytest test_intents.py`).
+"""
+
+import intents
+
+CONTEXT = {"today": "2026-03-10", "balance": 420.5, "deadlines": [
+    {"title": "Essay", "subject": "History", "dueDate": "2026-03-12"},
+    {"title": "Lab report", "dueDate": "2026-03-11"},
+    {"title": "Old quiz", "dueDate": "2026-03-01", "status": "done"},
+]}
+
+# (message, expected intent, expected action type, expected action data subset)
+HITS = [
+    ("went to the gym today", "log_gym", "LOG_GYM", {"date": "2026-03-10", "didGo": True}),
+    ("I worked out yesterday", "log_gym", "LOG_GYM", {"date": "2026-03-09", "didGo": True}),
+    ("gym done!", "log_gym", "LOG_GYM", {"didGo": True}),
+    ("skipped the gym last night", "skip_gym", "LOG_GYM", {"date": "2026-03-09", "didGo": False}),
+    ("I spent $12 on lunch", "add_expense", "ADD_TRANSACTION",
+     {"amount": 12.0, "description": "lunch", "type": "expense"}),
+    ("paid 1,250.50 for rent yesterday", "add_expense", "ADD_TRANSACTION",
+     {"amount": 1250.5, "description": "rent", "date": "2026-03-09"}),
+    ("got paid $300 from tutoring", "add_income", "ADD_TRANSACTION",
+     {"amount": 300.0, "description": "tutoring", "type": "income"}),
+    ("I made $5", "add_income", "ADD_TRANSACTION", {"amount": 5.0, "description": "income"}),
+    ("made 20 bucks", "add_income", "ADD_TRANSACTION", {"amount": 20.0}),
+    ("I made 40 from babysitting", "add_income", "ADD_TRANSACTION",
+     {"amount": 40.0, "description": "babysitting"}),
+    ("set my balance to $900", "set_balance", "SET_BALANCE", {"amount": 900.0}),
+    ("balance is 75", "set_balance", "SET_BALANCE", {"amount": 75.0}),
+    ("add $30 for pizza to splitwise", "add_splitwise", "ADD_SPLITWISE",
+     {"amount": 30.0, "description": "pizza", "date": "2026-03-10"}),
+    ("my period started today", "period_start", "LOG_PERIOD_START", {"date": "2026-03-10"}),
+    ("I got my period yesterday", "period_start", "LOG_PERIOD_START", {"date": "2026-03-09"}),
+    ("period ended", "period_end", "LOG_PERIOD_END", {"startDate": None, "endDate": "2026-03-10"}),
+    ("show me my deadlines", "list_deadlines", None, None),
+    ("what's my balance?", "get_balance", None, None),
+]
+
+# Messages that must go to the LLM
+MISSES = [
+    ("I made 5", None),                                   # 5 of what? flashcards, pancakes...
+    ("I made 5 flashcards", None),
+    ("went to the gym and spent $12 on lunch", None),     # compound
+    ("spent $12 on lunch, then went to the gym", None),
+    ("I spent $12 on lunch because I forgot mine at home", None),
+    ("remind me to call mom", None),
+    ("", None),
+    ("went to the gym today " + "really " * 12, None),   # too long
+    ("went to the gym today", {"inQuiz": True}),          # quiz answer
+    ("I spent $12 on lunch", {"pendingDeadline": {"title": "Essay"}}),
+    ("what's my balance", {"today": "2026-03-10"}),       # no balance known
+]
+
+
+def test_fast_path_hits():
+    for message, name, action_type, data in HITS:
+        result = intents.match(message, CONTEXT)
+        assert result is not None, message
+        got_name, reply = result
+        assert got_name == name, (message, got_name)
+        assert reply["message"], message
+        if action_type is None:
+            assert reply["action"] is None, message
+            continue
+        assert reply["action"]["type"] == action_type, message
+        for key, value in data.items():
+            assert reply["action"]["data"][key] == value, (message, key, reply["action"]["data"])
+
+
+def test_fast_path_misses():
+    for message, context in MISSES:
+        assert intents.match(message, context) is None, message
+
+
+def test_list_deadlines_skips_done_and_sorts_by_due_date():
+    _, reply = intents.match("my deadlines", CONTEXT)
+    lines = reply["message"].splitlines()[1:]
+    assert lines[0].startswith("• Lab report"), lines
+    assert lines[1].startswith("• Essay (History)"), lines
+    assert not any("Old quiz" in line for line in lines)
+
+
+def test_disabled_fast_path():
+    enabled = intents.FAST_INTENTS_ENABLED
+    intents.FAST_INTENTS_ENABLED = False
+    try:
+        assert intents.match("went to the gym today", CONTEXT) is None
+    finally:
+        intents.FAST_INTENTS_ENABLED = enabled
+
+
+if __name__ == '__main__':
+    tests = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    exit(1 if failed else 0)
@@ -0,0 +1,176 @@
+"""Checks for the background job queue in jobs.py: keyed ordering, retries and overflow.
+
+Run with `python test_jobs.py` (or `python -m pytest test_jobs.py`).
+"""
+
+import random
+import threading
+import time
+
+import jobs
+from jobs import JobQueue, QueueFull
+
+
+def blocked_queue(**kwargs):
+    """A one-worker queue whose worker is parked on the returned event."""
+    q = JobQueue(workers=1, backoff=0.01, **kwargs)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def park():
+        started.set()
+        gate.wait(5)
+
+    q.submit('park', park)
+    assert started.wait(2)
+    return q, gate
+
+
+def test_keyed_jobs_run_in_submission_order():
+    q = JobQueue(workers=4, backoff=0.01)
+    seen = {}
+    lock = threading.Lock()
+
+    def write(key, n):
+        time.sleep(random.random() / 500)
+        with lock:
+            seen.setdefault(key, []).append(n)
+
+    keys = [f"user-{i}" for i in range(6)]
+    for n in range(30):
+        for key in keys:
+            q.submit('write', write, key, n, key=key)
+    assert q.drain(10)
+    for key in keys:
+        assert seen[key] == list(range(30)), (key, seen[key])
+
+
+# (failures before success, max_attempts, expected status, expected attempts)
+RETRIES = [
+    (0, 3, 'done', 1),
+    (1, 3, 'done', 2),
+    (2, 3, 'done', 3),
+    (3, 3, 'failed', 3),
+    (5, 1, 'failed', 1),
+]
+
+
+def test_retry_table():
+    q = JobQueue(workers=2, backoff=0.01)
+    for failures, max_attempts, status, attempts in RETRIES:
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise RuntimeError("boom")
+            return "ok"
+
+        job = q.submit('flaky', flaky, max_attempts=max_attempts)
+        assert job.wait(5)
+        assert (job.status, job.attempts) == (status, attempts), (failures, max_attempts, job.to_dict())
+        assert job.error == (None if status == 'done' else "boom")
+        assert q.get(job.id) is job
+
+
+def test_retry_holds_back_later_jobs_for_the_same_key():
+    q = JobQueue(workers=3, backoff=0.02)
+    order = []
+    attempts = []
+
+    def first():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("not yet")
+        order.append('first')
+
+    q.submit('first', first, key='user-1')
+    q.submit('second', order.append, 'second', key='user-1')
+    assert q.drain(5)
+    assert order == ['first', 'second']
+
+
+def test_dedupe_returns_the_waiting_job():
+    q, gate = blocked_queue()
+    try:
+        a = q.submit('stats', lambda: None, key='user-1', dedupe=True)
+        b = q.submit('stats', lambda: None, key='user-1', dedupe=True)
+        c = q.submit('stats', lambda: None, key='user-2', dedupe=True)
+        assert a is b and a is not c
+    finally:
+        gate.set()
+    assert q.drain(5)
+    # Once started, the key can be queued again
+    assert q.submit('stats', lambda: None, key='user-1', dedupe=True) is not a
+
+
+def test_full_queue_raises_and_releases_dedupe_key():
+    q, gate = blocked_queue(queue_size=1)
+    try:
+        q.submit('fill', lambda: None)
+        for kwargs in ({}, {'key': 'user-1', 'dedupe': True}):
+            try:
+                q.submit('extra', lambda: None, **kwargs)
+            except QueueFull:
+                pass
+            else:
+                raise AssertionError(f"expected QueueFull for {kwargs}")
+        assert 'user-1' not in q._queued_keys
+    finally:
+        gate.set()
+    assert q.drain(5)
+
+
+def test_submit_or_run_overflow():
+    wait = jobs.JOB_OVERFLOW_WAIT
+    jobs.JOB_OVERFLOW_WAIT = 0.1
+    q, gate = blocked_queue(queue_size=1)
+    try:
+        q.submit('fill', lambda: None)
+        # Unkeyed: runs inline on the caller's thread
+        caller = []
+        job = q.submit_or_run('inline', lambda: caller.append(threading.current_thread()))
+        assert job.status == 'done' and caller == [threading.current_thread()]
+        # Keyed: waits for room, then gives up rather than overtaking its key
+        started = time.monotonic()
+        try:
+            q.submit_or_run('keyed', lambda: None, key='user-1')
+        except QueueFull:
+            assert time.monotonic() - started >= 0.1
+        else:
+            raise AssertionError("expected QueueFull for a keyed overflow")
+    finally:
+        jobs.JOB_OVERFLOW_WAIT = wait
+        gate.set()
+    assert q.drain(5)
+
+
+def test_keyed_overflow_succeeds_when_room_frees_up():
+    q, gate = blocked_queue(queue_size=1)
+    q.submit('fill', lambda: None)
+    threading.Timer(0.1, gate.set).start()
+    job = q.submit_or_run('keyed', lambda: 'ok', key='user-1')
+    assert job.wait(5) and job.result == 'ok'
+
+
+def test_drain_times_out_while_busy():
+    q, gate = blocked_queue()
+    try:
+        assert not q.drain(0.1)
+        assert q.stats()['running'] == 1
+    finally:
+        gate.set()
+    assert q.drain(5)
+
+
+if __name__ == '__main__':
+    tests = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    exit(1 if failed else 0)
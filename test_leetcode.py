@@ -0,0 +1,215 @@
+"""Checks for the LeetCode stats cache against a local stand-in GraphQL server.
+
+Run with `python test_leetcode.py` (or `python -m pytest test_leetcode.py`).
+"""
+
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from leetcode_client import LeetCodeError, LeetCodeStatsCache, UserNotFound, fetch_profile
+
+
+class StandInLeetCode:
+    """Minimal GraphQL endpoint that answers getUserProfile and counts calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.delay = 0.0
+        self.solved = 100
+        self.status = 200
+        self.errors = None  # GraphQL errors to answer with instead of the profile
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stand_in.calls += 1
+                time.sleep(stand_in.delay)
+                username = body['variables']['username']
+                payload = {"data": {
+                    "matchedUser": {
+                        "username": username,
+                        "submitStats": {"acSubmissionNum": [{"difficulty": "All", "count": stand_in.solved, "submissions": 200}]},
+                        "profile": {"ranking": 1234, "starRating": 3}
+                    },
+                    "allQuestionsCount": [{"difficulty": "All", "count": 3000}]
+                }}
+                if stand_in.errors:
+                    payload = {"errors": stand_in.errors, "data": {"matchedUser": None}}
+                data = json.dumps(payload).encode()
+                self.send_response(stand_in.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except BrokenPipeError:
+                    pass  # client gave up (timeout tests)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/graphql"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_cache(stand_in, timeout=2, **kwargs):
+    return LeetCodeStatsCache(fetch=partial(fetch_profile, url=stand_in.url, timeout=timeout), **kwargs)
+
+
+def solved(payload):
+    return payload["data"]["matchedUser"]["submitStats"]["acSubmissionNum"][0]["count"]
+
+
+def test_fresh_hit_skips_upstream():
+    stand_in = StandInLeetCode()
+    try:
+        cache = make_cache(stand_in)
+        payload, state = cache.get("alice")
+        assert state == "miss" and solved(payload) == 100
+        payload, state = cache.get("Alice")
+        assert state == "hit"
+        assert stand_in.calls == 1
+    finally:
+        stand_in.close()
+
+
+def test_concurrent_requests_are_coalesced():
+    stand_in = StandInLeetCode()
+    stand_in.delay = 0.3
+    try:
+        cache = make_cache(stand_in)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("bob"))) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(results) == 10
+        assert stand_in.calls == 1
+    finally:
+        stand_in.close()
+
+
+def test_stale_value_served_while_revalidating():
+    stand_in = StandInLeetCode()
+    try:
+        cache = make_cache(stand_in, ttl=0.1, swr_window=60)
+        cache.get("carol")
+        stand_in.solved = 101
+        stand_in.delay = 0.3
+        time.sleep(0.15)
+
+        started = time.time()
+        payload, state = cache.get("carol")
+        assert state == "stale" and solved(payload) == 100
+        assert time.time() - started < 0.2
+
+        time.sleep(0.5)
+        cache.ttl = 60
+        payload, state = cache.get("carol")
+        assert state == "hit" and solved(payload) == 101
+        assert stand_in.calls == 2
+    finally:
+        stand_in.close()
+
+
+def test_concurrent_stale_reads_start_one_refresh():
+    stand_in = StandInLeetCode()
+    try:
+        cache = make_cache(stand_in, ttl=0.1, swr_window=60)
+        cache.get("cora")
+        stand_in.delay = 0.3
+        time.sleep(0.15)
+        states = [cache.get("cora")[1] for _ in range(10)]
+        assert states == ["stale"] * 10
+        time.sleep(0.5)
+        assert stand_in.calls == 2
+    finally:
+        stand_in.close()
+
+
+def test_error_responses_are_not_cached():
+    stand_in = StandInLeetCode()
+    try:
+        cache = make_cache(stand_in)
+        stand_in.status = 429
+        try:
+            cache.get("fay")
+        except requests.exceptions.HTTPError:
+            pass
+        else:
+            raise AssertionError("expected an HTTP error")
+
+        stand_in.status = 200
+        stand_in.errors = [{"message": "rate limited"}]
+        try:
+            cache.get("fay")
+        except LeetCodeError:
+            pass
+        else:
+            raise AssertionError("expected a GraphQL error")
+
+        stand_in.errors = [{"message": "That user does not exist."}]
+        try:
+            cache.get("fay")
+        except UserNotFound:
+            pass
+        else:
+            raise AssertionError("expected UserNotFound")
+
+        stand_in.errors = None
+        payload, state = cache.get("fay")
+        assert state == "miss" and solved(payload) == 100
+    finally:
+        stand_in.close()
+
+
+def test_stale_value_served_when_upstream_times_out():
+    stand_in = StandInLeetCode()
+    try:
+        cache = make_cache(stand_in, timeout=0.2, ttl=0, swr_window=0)
+        cache.get("dave")
+        stand_in.delay = 0.5
+        payload, state = cache.get("dave")
+        assert state == "stale" and solved(payload) == 100
+    finally:
+        stand_in.close()
+
+
+def test_timeout_without_cached_copy_raises():
+    stand_in = StandInLeetCode()
+    stand_in.delay = 0.5
+    try:
+        cache = make_cache(stand_in, timeout=0.2)
+        try:
+            cache.get("erin")
+        except requests.exceptions.Timeout:
+            pass
+        else:
+            raise AssertionError("expected a timeout")
+    finally:
+        stand_in.close()
+
+
+if __name__ == '__main__':
+    tests = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    exit(1 if failed else 0)
@@ -0,0 +1,152 @@
+"""Table-driven checks for the token-budgeted prompt pieces in prompts.py.
+
+Run with `python test_prompts.py` (or `python -m pytest test_prompts.py`).
+"""
+
+import json
+
+from prompts import build_history_messages, compact_json, estimate_tokens, select_context_items
+
+CONTEXT = {
+    "today": "2026-03-10",
+    "deadlines": [
+        {"title": "Kafka streams assignment", "subject": "Distributed Systems", "dueDate": "2026-03-20"},
+        {"title": "Lab report", "subject": "Chemistry", "dueDate": "2026-03-11"},
+        {"title": "Essay draft", "subject": "History", "dueDate": "2026-03-09"},
+        {"title": "Ancient lab", "subject": "Chemistry", "dueDate": "2025-12-01"},
+        {"title": "Finished thing", "dueDate": "2026-03-12", "status": "done"},
+    ],
+    "studyTasks": {"Chemistry": {"tasks": [
+        {"id": "t1", "name": "Titration practice", "endDate": "2026-03-13"},
+        {"id": "t2", "name": "Done task", "endDate": "2026-03-13", "status": "done"},
+    ]}},
+    "notes": [{"text": "Call the landlord about the heater", "date": "2026-03-10"}],
+    "splitwiseReminders": [
+        {"description": "Pizza night", "amount": 30, "status": "pending", "date": "2025-01-01"},
+        {"description": "Settled", "amount": 5, "status": "paid"},
+    ],
+}
+
+
+def titles(selected):
+    return [d["title"] for d in selected.get("deadlines", [])]
+
+
+# (message, budget, titles expected, titles not expected)
+SELECTION = [
+    ("what's due?", 10_000,
+     ["Lab report", "Essay draft", "Kafka streams assignment"], ["Ancient lab", "Finished thing"]),
+    # Far in the past, but asked about by name
+    ("did I ever finish the ancient lab?", 10_000, ["Ancient lab"], ["Finished thing"]),
+    # Tight budget: the rare word wins over date proximity
+    ("help me with kafka", 40, ["Kafka streams assignment"], ["Lab report", "Essay draft"]),
+    # Tight budget, no hint: the soonest items win (today's note, then the lab report)
+    ("hi", 45, ["Lab report"], ["Kafka streams assignment", "Essay draft"]),
+    ("hi", 0, [], ["Lab report"]),
+]
+
+
+def selection_cost(selected):
+    """Tokens charged for `selected`, mirroring select_context_items' accounting."""
+    cost = 0
+    for section, items in selected.items():
+        if isinstance(items, list):
+            cost += sum(estimate_tokens(compact_json(p)) + 2 for p in items)
+        else:
+            for group, payloads in items.items():
+                payloads = [payloads] if section == 'topics' else payloads
+                cost += sum(estimate_tokens(compact_json(p)) + estimate_tokens(group) + 2 for p in payloads)
+    return cost
+
+
+def test_context_selection_table():
+    for message, budget, present, absent in SELECTION:
+        selected, omitted = select_context_items(CONTEXT, message, budget=budget)
+        got = titles(selected)
+        for title in present:
+            assert title in got, (message, budget, got)
+        for title in absent:
+            assert title not in got, (message, budget, got)
+        assert selection_cost(selected) <= budget, (message, budget)
+
+
+def test_context_selection_counts_omissions():
+    selected, omitted = select_context_items(CONTEXT, "hi", budget=0)
+    assert selected == {}
+    # Done items and the stale deadline are filtered out, not omitted for budget
+    assert omitted == {"deadlines": 3, "studyTasks": 1, "notes": 1, "pendingSplitwise": 1}, omitted
+
+
+def test_context_selection_orders_and_filters():
+    selected, omitted = select_context_items(CONTEXT, "", budget=10_000)
+    assert omitted == {}
+    assert titles(selected) == ["Essay draft", "Lab report", "Kafka streams assignment"]
+    assert [t["id"] for t in selected["studyTasks"]["Chemistry"]] == ["t1"]
+    assert selected["notes"] == ["Call the landlord about the heater"]
+    # Old but still owed
+    assert [s["description"] for s in selected["pendingSplitwise"]] == ["Pizza night"]
+    assert "status" not in selected["deadlines"][0]
+
+
+def history(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message number {i}"} for i in range(n)]
+
+
+# (history length, budget, expected kept turns, summary expected)
+HISTORY = [
+    (0, 1500, 0, False),
+    (4, 1500, 4, False),
+    (20, 1500, 20, False),
+    (20, 44, 4, True),
+    (20, 0, 0, True),
+]
+
+
+def test_history_budget_table():
+    for length, budget, kept, summary in HISTORY:
+        messages = build_history_messages(history(length), "new question", budget=budget)
+        turns = [m for m in messages if m["role"] != "system"]
+        assert len(turns) == kept, (length, budget, len(turns))
+        assert sum(estimate_tokens(m["content"]) + 4 for m in turns) <= budget
+        has_summary = bool(messages) and messages[0]["role"] == "system"
+        assert has_summary == summary, (length, budget, messages[:1])
+        if kept:
+            # Newest turns survive
+            assert turns[-1]["content"] == compact_json({"message": f"message number {length - 1}"})
+
+
+def test_history_wraps_replies_and_skips_repeated_message():
+    chat = [
+        {"role": "user", "content": "add a note"},
+        {"role": "assistant", "content": "Done! ✅"},
+        {"role": "user", "content": "  "},
+        {"role": "user", "content": "thanks"},
+    ]
+    messages = build_history_messages(chat, "thanks")
+    assert messages == [
+        {"role": "user", "content": "add a note"},
+        {"role": "assistant", "content": compact_json({"message": "Done! ✅"})},
+    ]
+    assert json.loads(messages[1]["content"]) == {"message": "Done! ✅"}
+
+
+def test_history_summary_quotes_recent_user_asks():
+    chat = [{"role": "user", "content": "remember my bike code"}, {"role": "assistant", "content": "Sure"}]
+    chat += history(10)
+    messages = build_history_messages(chat, "what was it?", budget=30)
+    assert messages[0]["role"] == "system"
+    assert "older messages omitted" in messages[0]["content"]
+    assert "remember my bike code" in messages[0]["content"]
+
+
+if __name__ == '__main__':
+    tests = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    exit(1 if failed else 0)
@@ -0,0 +1,185 @@
+"""Checks for reminder building, the reminder index and the scheduler in reminders.py.
+
+Supabase calls are swapped for in-memory stand-ins, so these run offline.
+Run with `python test_reminders.py` (or `python -m pytest test_reminders.py`).
+"""
+
+from datetime import date, datetime, timezone
+
+import reminders
+from reminders import LocalSender, Reminder, ReminderIndex, Scheduler, deadline_reminders, fire_time
+
+HOUR = reminders.REMINDER_HOUR
+
+
+def at(day, hour=HOUR, minute=0):
+    return datetime(*map(int, day.split('-')), hour, minute, tzinfo=timezone.utc).timestamp()
+
+
+# (day, tz_offset minutes, expected UTC time)
+FIRE_TIMES = [
+    ("2026-03-10", 0, at("2026-03-10")),
+    ("2026-03-10", 300, at("2026-03-10", HOUR + 5)),       # UTC-5: fires later in UTC
+    ("2026-03-10", -330, at("2026-03-10", HOUR - 6, 30)),  # UTC+5:30
+]
+
+
+def test_fire_time_table():
+    for day, offset, expected in FIRE_TIMES:
+        assert fire_time(date.fromisoformat(day), offset) == expected, (day, offset)
+
+
+# (deadline, expected tags)
+DEADLINES = [
+    ({"id": "d1", "title": "Essay", "dueDate": "2026-03-20"}, ["d1_due_2", "d1_due_0"]),
+    ({"id": "d2", "title": "Lab", "dueDate": "2026-03-20", "startDate": "2026-03-10"},
+     ["d2_due_2", "d2_due_0", "d2_mid"]),
+    ({"id": "d3", "dueDate": "2026-03-20", "startDate": "2026-03-10", "midwayChecked": True},
+     ["d3_due_2", "d3_due_0"]),
+    ({"id": "d4", "dueDate": "2026-03-20", "status": "done"}, []),
+    ({"id": "d5", "title": "Someday"}, []),
+    ({"id": "d6", "dueDate": "not a date"}, []),
+    ("garbage", []),
+]
+
+
+def test_deadline_reminder_table():
+    for deadline, tags in DEADLINES:
+        got = deadline_reminders("key", [deadline])
+        assert [r.tag for r in got] == tags, (deadline, got)
+
+
+def test_deadline_reminder_content():
+    due_in_two, due_today, midway = deadline_reminders(
+        "key", [{"id": "d", "title": "Lab", "dueDate": "2026-03-20", "startDate": "2026-03-10"}])
+    assert due_in_two.fire_at == at("2026-03-18") and due_in_two.body == '"Lab" is due in 2 days'
+    assert due_today.body == '"Lab" is due TODAY!'
+    assert midway.fire_at == at("2026-03-15")
+
+
+def test_period_reminders_follow_prediction():
+    got = reminders.period_reminders("key", {"predicted_next_period": "2026-04-01"})
+    assert [r.tag for r in got] == ["period_2026-04-01_3", "period_2026-04-01_1", "period_2026-04-01_0"]
+    assert got[0].fire_at == at("2026-03-29")
+    assert reminders.period_reminders("key", {}) == []
+    assert reminders.period_reminders("key", None) == []
+
+
+def reminder(key, tag, fire_at):
+    return Reminder(fire_at, key, tag, "title", "body")
+
+
+def test_index_pops_due_reminders_in_order_once():
+    index = ReminderIndex()
+    now = 1_000_000.0
+    index.replace("a", [reminder("a", "late", now + 10), reminder("a", "early", now - 10)], now=now)
+    index.replace("b", [reminder("b", "middle", now)], now=now)
+    assert index.next_fire_at() == now - 10
+    assert [r.tag for r in index.pop_due(now)] == ["early", "middle"]
+    assert [r.tag for r in index.pop_due(now + 10)] == ["late"]
+    # Already sent: re-indexing the same tag doesn't send it twice
+    index.replace("a", [reminder("a", "late", now + 10)], now=now)
+    assert index.pop_due(now + 20) == []
+
+
+def test_index_replace_and_drop_supersede_old_entries():
+    index = ReminderIndex()
+    now = 1_000_000.0
+    index.replace("a", [reminder("a", "old", now + 5)], now=now)
+    index.replace("a", [reminder("a", "new", now + 50)], now=now)
+    assert index.next_fire_at() == now + 50  # the superseded entry is skipped
+    assert [r.tag for r in index.pop_due(now + 60)] == ["new"]
+
+    index.replace("b", [reminder("b", "gone", now + 5)], now=now)
+    index.drop("b")
+    assert index.next_fire_at() is None
+    assert index.pop_due(now + 60) == []
+
+
+def test_index_skips_reminders_past_the_grace_window():
+    index = ReminderIndex()
+    now = 1_000_000.0
+    index.replace("a", [reminder("a", "stale", now - reminders.REMINDER_GRACE - 1),
+                        reminder("a", "recent", now - reminders.REMINDER_GRACE + 1)], now=now)
+    assert [r.tag for r in index.pop_due(now)] == ["recent"]
+
+
+class Stubbed:
+    """Swap module attributes of reminders for the duration of a with-block."""
+
+    def __init__(self, **replacements):
+        self.replacements = replacements
+        self.saved = {}
+
+    def __enter__(self):
+        for name, value in self.replacements.items():
+            self.saved[name] = getattr(reminders, name)
+            setattr(reminders, name, value)
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            setattr(reminders, name, value)
+
+
+def sub(key, endpoint, **extra):
+    return {"user_id": key, "endpoint": endpoint, "p256dh": "p", "auth": "a", **extra}
+
+
+def test_index_users_keeps_reminders_when_a_build_fails():
+    scheduler = Scheduler(sender=LocalSender())
+    scheduler._subs = {"a": {"e1": sub("a", "e1", period_user_id="p1")}}
+    deadlines = {"a": [{"id": "d", "title": "Far off", "dueDate": "2100-01-10"}]}
+    with Stubbed(calculate_cycle_stats=lambda user_id: {}):
+        scheduler._index_users(["a"], deadlines)
+    first = scheduler.index.next_fire_at()
+    assert first is not None
+
+    def broken(user_id):
+        raise RuntimeError("cycle_stats unavailable")
+
+    with Stubbed(calculate_cycle_stats=broken):
+        scheduler._index_users(["a"], {"a": []})
+    assert scheduler.index.next_fire_at() == first
+
+
+def test_forget_drops_reminders_with_the_last_device():
+    scheduler = Scheduler(sender=LocalSender())
+    scheduler._subs = {"a": {"e1": sub("a", "e1"), "e2": sub("a", "e2")}}
+    scheduler._index_users(["a"], {"a": [{"id": "d", "dueDate": "2100-01-10"}]})
+    scheduler.forget("e1")
+    assert list(scheduler._subs["a"]) == ["e2"] and scheduler.index.next_fire_at() is not None
+    scheduler.forget("e2")
+    assert "a" not in scheduler._subs and scheduler.index.next_fire_at() is None
+
+
+def test_deliver_fans_out_and_prunes_gone_devices():
+    deleted = []
+
+    class Sender(LocalSender):
+        def send(self, subscription, payload):
+            if subscription['endpoint'] == "gone":
+                return 410
+            return super().send(subscription, payload)
+
+    scheduler = Scheduler(sender=Sender())
+    scheduler._subs = {"a": {"e1": sub("a", "e1"), "gone": sub("a", "gone")}, "b": {"e3": sub("b", "e3")}}
+    with Stubbed(delete_push_subscription=deleted.append):
+        sent = scheduler.deliver([reminder("a", "t1", 0), reminder("b", "t2", 0)])
+    assert sent == 2
+    assert deleted == ["gone"]
+    assert list(scheduler._subs["a"]) == ["e1"]
+    assert [endpoint for endpoint, _ in scheduler.sender.sent] == ["e1", "e3"]
+
+
+if __name__ == '__main__':
+    tests = [v for k, v in sorted(globals().items()) if k.startswith('test_')]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    exit(1 if failed else 0)
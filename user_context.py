@@ -0,0 +1,177 @@
+"""Server-held chat context per sync key.
+
+The data behind the client's buildContext() already lives in user_sync. A chat
+request can therefore send just {syncKey, contextVersion, live} instead of the
+whole context. The server keeps one snapshot per sync key. It is loaded from
+Supabase once, patched in place by /api/sync/push, and topped up with a delta
+pull when a client reports a newer version than the snapshot has. The derived
+context is memoized per snapshot version; build_system_prompt() then picks the
+list items that are relevant to each message.
+"""
+
+import os
+import threading
+from datetime import date, timedelta
+
+from cache import TTLCache
+from supabase_client import get_all_user_data, parse_timestamp
+
+USER_CONTEXT_TTL = int(os.environ.get("USER_CONTEXT_TTL", 30 * 60))
+_snapshots = TTLCache(maxsize=1024, ttl=USER_CONTEXT_TTL)
+
+# Per-request fields the client still sends (they aren't synced)
+LIVE_FIELDS = ('today', 'pendingDeadline', 'inQuiz', 'isPmsWeek')
+
+
+def _as_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def gym_streak(log, today):
+    """Consecutive gym days ending today, as calcGymStats() counts them."""
+    went = {e.get('date'): e.get('didGo') for e in log or [] if isinstance(e, dict)}
+    streak = 0
+    day = today
+    for _ in range(60):
+        status = went.get(day.isoformat())
+        if status:
+            streak += 1
+        elif status is False or day <= today:
+            break
+        day -= timedelta(days=1)
+    return streak
+
+
+def days_until_next_period(log, today):
+    """calcPeriodContext().daysUntilNext: average of the last 3 cycle lengths from the latest start."""
+    starts = sorted((_as_date(p.get('startDate')) for p in log or [] if isinstance(p, dict)), reverse=True)
+    starts = [s for s in starts if s]
+    if not starts:
+        return None
+    diffs = [(starts[i] - starts[i + 1]).days for i in range(min(len(starts) - 1, 3))]
+    diffs = [d for d in diffs if 10 < d < 60]
+    avg_cycle = round(sum(diffs) / len(diffs)) if diffs else 28
+    return (starts[0] + timedelta(days=avg_cycle) - today).days
+
+
+def build_context(blobs, today):
+    """Same shape as the client's buildContext(), from synced storage blobs.
+
+    Lists aren't capped here: build_system_prompt() selects what fits its token budget.
+    """
+    user = blobs.get('aria_user') or {}
+    finance = blobs.get('aria_finance') or {}
+    deadlines = [d for d in blobs.get('aria_deadlines') or [] if d.get('status') != 'done']
+    period = {}
+    days_until = days_until_next_period(blobs.get('aria_period'), today)
+    if days_until is not None:
+        period['daysUntilNext'] = days_until
+    return {
+        "userName": user.get('name') or 'friend',
+        "subjects": user.get('subjects') or [],
+        "leetcodeUsername": user.get('leetcodeUsername') or '',
+        "deadlines": deadlines,
+        "studyTasks": blobs.get('aria_study') or {},
+        "gym": {"currentStreak": gym_streak(blobs.get('aria_gym'), today)},
+        "periodContext": period,
+        "notes": blobs.get('aria_notes') or [],
+        "today": today.isoformat(),
+        "balance": finance.get('balance', 0),
+        "splitwiseReminders": finance.get('splitwise') or [],
+    }
+
+
+class Snapshot:
+    """Synced blobs for one sync key plus the memoized derived context."""
+
+    def __init__(self, blobs, version, versions=None):
+        self.blobs = dict(blobs)
+        self.version = version
+        self._versions = {k: parse_timestamp(v) for k, v in (versions or {}).items()}  # data key -> updated_at
+        self._lock = threading.Lock()
+        self._memo = {}
+        self._generation = 0
+
+    def is_older_than(self, version):
+        mine, theirs = parse_timestamp(self.version), parse_timestamp(version)
+        return theirs is not None and (mine is None or theirs > mine)
+
+    def apply(self, data, version, versions=None):
+        """Merge blobs stamped `version` (or per key by `versions`), skipping any older than what's held.
+
+        Delta pulls re-send rows near their cursor, and a row can land after a newer
+        push to the same key was already applied here.
+        """
+        with self._lock:
+            changed = False
+            for key, blob in data.items():
+                stamp = parse_timestamp((versions or {}).get(key, version))
+                held = self._versions.get(key)
+                if stamp and held and stamp <= held:
+                    continue
+                self.blobs[key] = blob
+                self._versions[key] = stamp
+                changed = True
+            if self.is_older_than(version):
+                self.version = version
+            if changed:
+                self._generation += 1
+                self._memo.clear()
+
+    def _key(self, live):
+        return tuple((k, repr(live.get(k))) for k in LIVE_FIELDS)
+
+    def render(self, live):
+        """Chat context for this snapshot with the request's live fields applied."""
+        key = self._key(live)
+        with self._lock:
+            hit = self._memo.get(key)
+            if hit is not None:
+                return hit
+            blobs = dict(self.blobs)
+            generation = self._generation
+        today = _as_date(live.get('today')) or date.today()
+        context = build_context(blobs, today)
+        context.update({k: live[k] for k in LIVE_FIELDS if live.get(k) not in (None, False, '')})
+        with self._lock:
+            if generation == self._generation:  # don't cache a render of blobs a push just replaced
+                if len(self._memo) > 8:
+                    self._memo.clear()
+                self._memo[key] = context
+        return context
+
+
+def get_snapshot(sync_key, min_version=None):
+    """Snapshot for `sync_key`, at least as new as `min_version`. None if Supabase can't provide it."""
+    snap = _snapshots.get(sync_key)
+    if snap is None:
+        result = get_all_user_data(sync_key)
+        if not result.get('success') or not result.get('data'):
+            return None
+        snap = Snapshot(result['data'], result.get('cursor'), result.get('versions'))
+        _snapshots.set(sync_key, snap)
+        return snap
+
+    if min_version and snap.is_older_than(min_version):
+        # Pushed through another worker (or before this process started): fetch just the delta
+        result = get_all_user_data(sync_key, since=snap.version)
+        if not result.get('success'):
+            return None
+        # Only advance to what was actually read: a push queued on another worker may not have
+        # landed yet, and the next request will look again
+        snap.apply(result.get('data') or {}, result.get('cursor'), result.get('versions'))
+    return snap
+
+
+def apply_push(sync_key, data, version):
+    """Patch a cached snapshot with blobs that were just pushed (no-op if none is cached)."""
+    snap = _snapshots.get(sync_key)
+    if snap is not None:
+        snap.apply(data, version)
+
+
+def invalidate(sync_key):
+    _snapshots.pop(sync_key)